@@ -0,0 +1,70 @@
+"""Benchmark: /api/voice/speak response size and CPU, JSON/base64 vs raw audio
+
+Run from backend/:  python benchmarks/bench_audio_response.py
+TTS is replaced by a fixed MP3-sized payload so only response encoding is measured.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:27017")
+os.environ.setdefault("DB_NAME", "smartspeak_bench")
+
+
+async def measure(http, audio_size: int, binary: bool, repeat: int) -> dict:
+    headers = {"Accept": "audio/mpeg"} if binary else {"Accept": "application/json"}
+    await http.post("/api/voice/speak", json={"text": "benchmark"}, headers=headers)  # warm-up
+    size = 0
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        response = await http.post("/api/voice/speak", json={"text": "benchmark"}, headers=headers)
+        response.raise_for_status()
+        size = len(response.content)
+    return {
+        "mode": "binary" if binary else "json_base64",
+        "audio_bytes": audio_size,
+        "response_bytes": size,
+        "overhead_pct": round((size - audio_size) / audio_size * 100, 1),
+        "cpu_ms_per_request": round((time.process_time() - cpu_start) / repeat * 1000, 3),
+        "wall_ms_per_request": round((time.perf_counter() - wall_start) / repeat * 1000, 3),
+    }
+
+
+async def run(sizes, repeat: int) -> list:
+    import httpx
+    from server import app
+    from services.container import container
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for audio_size in sizes:
+            # MP3 frame header so the binary path labels it audio/mpeg
+            audio = b"ID3" + os.urandom(audio_size - 3)
+
+            async def fake_tts(text, voice="nova"):
+                return audio
+
+            container.tts_service.text_to_speech = fake_tts
+            for binary in (False, True):
+                results.append(await measure(http, audio_size, binary, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="16384,131072,1048576")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(json.dumps(asyncio.run(run(sizes, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark: /process/batch and /speak/batch against one call per item
+
+Run from backend/:  python benchmarks/bench_batch.py --items 1000 --duplicates 0.2
+The app is served by uvicorn in-process (httpx's ASGI transport would buffer
+the streamed response) against the stub provider in a child process. A batch
+should take about (distinct items x stub latency / concurrency): bound by
+provider concurrency, not by round trips. The per-item baseline sends the
+same items as individual requests from --client-concurrency clients.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import socket
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_provider import StubProcess
+
+
+def make_items(count: int, duplicates: float, seed: int) -> list:
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        if items and rng.random() < duplicates:
+            items.append(rng.choice(items))
+        else:
+            items.append(f"FAQ {i}: how do I rotate the API key for service {i}?")
+    return items
+
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+    from server import app
+    from services.container import container
+
+    container.conversation_store.db = None
+    items = make_items(args.items, args.duplicates, args.seed)
+    results = {"items": len(items), "distinct": len(set(items))}
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    limits = httpx.Limits(max_connections=args.client_concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600, limits=limits) as http:
+        for endpoint in ("process", "speak"):
+            start = time.perf_counter()
+            lines = []
+            async with http.stream("POST", f"/api/voice/{endpoint}/batch", json={"items": items}) as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        lines.append(json.loads(line))
+                        if len(lines) == 1:
+                            first = time.perf_counter() - start
+            elapsed = time.perf_counter() - start
+            results[f"{endpoint}_batch"] = {
+                "wall_s": round(elapsed, 3),
+                "first_result_s": round(first, 3),
+                "items_per_s": round(len(items) / elapsed, 1),
+                "errors": lines[-1]["errors"],
+            }
+
+            if args.client_concurrency:
+                pending = iter(enumerate(items))
+
+                async def client():
+                    for i, text in pending:
+                        if endpoint == "process":
+                            await http.post("/api/voice/process", json={"text": text, "session_id": f"bench-{i}"})
+                        else:
+                            await http.post("/api/voice/speak", json={"text": text})
+
+                start = time.perf_counter()
+                await asyncio.gather(*(client() for _ in range(args.client_concurrency)))
+                elapsed = time.perf_counter() - start
+                results[f"{endpoint}_per_item"] = {
+                    "wall_s": round(elapsed, 3),
+                    "items_per_s": round(len(items) / elapsed, 1),
+                    "client_concurrency": args.client_concurrency,
+                }
+    server.should_exit = True
+    await serving
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="fraction of items repeating an earlier one")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub latency per call (s)")
+    parser.add_argument("--client-concurrency", type=int, default=4, help="per-item baseline clients; 0 skips it")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with StubProcess(latency={"llm": args.latency, "tts": args.latency}) as stub:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            # Caches would make the per-item baseline replay the batch's answers
+            "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+        })
+        os.environ.pop("EMERGENT_LLM_KEY", None)
+        results = asyncio.run(run(args))
+        results["stub_calls"] = stub.stats()["calls"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
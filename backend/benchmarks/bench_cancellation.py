@@ -0,0 +1,131 @@
+"""Benchmark: provider time given back when users abandon or interrupt /ask turns
+
+Run from backend/:  python benchmarks/bench_cancellation.py --clients 8 --turns 10 --abandon 0.4
+A single-worker uvicorn talks to the stub provider with one slot per stage,
+so abandoned work competes with live turns. Each client sends /ask turns on
+its own session; with probability --abandon it gives up on a turn after a
+random wait, half the time by hanging up and half the time by barging in
+(starting its next turn on the same session while the first is still open).
+Reported: latency of the turns that completed, cancellations by reason,
+provider calls cancelled and the provider seconds that saved (from /metrics),
+and the upstream calls the stub saw aborted.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from benchmarks.stub_provider import StubProcess
+from benchmarks.bench_shared_cache import free_port, wait_ready
+from benchmarks.load_test import make_wav
+
+
+async def drive(base_url: str, args) -> dict:
+    import httpx
+    wav = make_wav(1.0)
+    rng = random.Random(args.seed)
+    completed, cancelled = [], []
+
+    async def ask(http, session: str, timeout: float = None):
+        files = {"file": ("audio.wav", wav, "audio/wav")}
+        return await http.post(f"{base_url}/api/voice/ask", params={"session_id": session}, files=files, timeout=timeout)
+
+    async def client(c: int):
+        async with httpx.AsyncClient(timeout=120) as http:
+            session = f"bench-{c}-{time.time_ns()}"
+            pending = None
+            for _ in range(args.turns):
+                abandon = rng.random() < args.abandon
+                wait = rng.uniform(0.2, args.patience)
+                start = time.perf_counter()
+                if abandon and rng.random() < 0.5:
+                    try:
+                        await ask(http, session, timeout=wait)
+                    except httpx.TimeoutException:
+                        pass  # hung up
+                    continue
+                turn = asyncio.create_task(ask(http, session))
+                if abandon:
+                    # Barge-in: the next turn starts while this one is still answering
+                    await asyncio.wait([turn], timeout=wait)
+                    pending = turn
+                    continue
+                response = await turn
+                if response.status_code == 200:
+                    completed.append(time.perf_counter() - start)
+                if pending is not None:
+                    cancelled.append((await pending).status_code)
+                    pending = None
+            if pending is not None:
+                cancelled.append((await pending).status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(args.clients)))
+    wall = time.perf_counter() - start
+    await asyncio.sleep(0.5)  # let the server finish its accounting for the last hang-ups
+    async with httpx.AsyncClient() as http:
+        counters = (await http.get(f"{base_url}/api/metrics", params={"format": "json"})).json()["counters"]
+    ordered = sorted(completed)
+    return {
+        "wall_s": round(wall, 2),
+        "completed": len(completed),
+        "completed_p50_ms": round(statistics.median(ordered) * 1000, 1) if ordered else None,
+        "completed_p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 1) if ordered else None,
+        "barged_in_statuses": {status: cancelled.count(status) for status in sorted(set(cancelled))},
+        "counters": {
+            name: round(value, 3) for name, value in counters.items()
+            if name.startswith(("requests_cancelled_total", "provider_cancelled_total", "provider_seconds_avoided_total"))
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=10, help="turns per client")
+    parser.add_argument("--abandon", type=float, default=0.4, help="share of turns abandoned")
+    parser.add_argument("--patience", type=float, default=2.0, help="longest wait before abandoning (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with StubProcess(latency={"stt": 0.3, "llm": 1.0, "tts": 0.5}) as stub:
+        port = free_port()
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            # Every turn reaches the provider
+            "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+            "AUDIO_POOL_WORKERS": "0",
+            **{f"PROVIDER_LIMIT_{stage}": "2" for stage in ("STT", "LLM", "TTS")},
+            **{f"PROVIDER_LIMIT_MAX_{stage}": "2" for stage in ("STT", "LLM", "TTS")},
+        }
+        env.pop("EMERGENT_LLM_KEY", None)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND, env=env, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            wait_ready(base_url)
+            results = asyncio.run(drive(base_url, args))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+        results["stub"] = stub.stats()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
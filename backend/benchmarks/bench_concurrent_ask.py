@@ -0,0 +1,81 @@
+"""Benchmark: N concurrent /api/voice/ask calls against a local stub provider
+
+Run from backend/:  python benchmarks/bench_concurrent_ask.py --concurrency 20
+With the shared async provider, N calls should finish in about the time of one.
+Caches are off and the stub numbers its transcripts and answers, so every
+call reaches the provider at every stage instead of being served from a cache
+or coalesced onto another call; an untimed first call takes connection
+setup and lazy service construction out of the single-call baseline.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_provider import StubServer, create_stub_app
+from benchmarks.load_test import make_wav
+
+
+async def run(concurrency: int, latency: float) -> dict:
+    import httpx
+    from server import app
+
+    transport = httpx.ASGITransport(app=app)
+    calls = iter(range(concurrency + 2))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        async def ask():
+            i = next(calls)
+            # A different recording and session each call
+            files = {"file": ("audio.wav", make_wav(1.0 + i / 100), "audio/wav")}
+            response = await http.post(f"/api/voice/ask?language=en&session_id=bench-ask-{i}", files=files)
+            response.raise_for_status()
+
+        await ask()
+
+        start = time.perf_counter()
+        await ask()
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await asyncio.gather(*(ask() for _ in range(concurrency)))
+        concurrent = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "stage_latency_s": latency,
+        "single_call_s": round(single, 3),
+        "concurrent_calls_s": round(concurrent, 3),
+        "serial_estimate_s": round(single * concurrency, 3),
+        "speedup_vs_serial": round(single * concurrency / concurrent, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub latency per stage (s)")
+    args = parser.parse_args()
+
+    stub = create_stub_app({"stt": args.latency, "llm": args.latency, "tts": args.latency}, distinct=True)
+    with StubServer(stub) as server:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": server.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            # Every call reaches the provider
+            "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+            "AUDIO_POOL_WORKERS": "0",
+        })
+        os.environ.pop("EMERGENT_LLM_KEY", None)
+        result = asyncio.run(run(args.concurrency, args.latency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
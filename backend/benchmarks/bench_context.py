@@ -0,0 +1,64 @@
+"""Benchmark: prompt size and context build time over a long session
+
+Run from backend/:  python benchmarks/bench_context.py --turns 200
+Uses mongomock-motor (pip install mongomock-motor) and the AIService mock, so
+it measures context assembly only. Prompt tokens should stop growing once the
+rolling summary kicks in.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.pop("EMERGENT_LLM_KEY", None)
+
+from models.conversation import StoredMessage
+from services.ai_service import AIService
+from services.conversation_store import ConversationStore
+from services.context_manager import ContextManager, message_tokens
+
+
+async def run(turns: int, report_every: int) -> list:
+    from mongomock_motor import AsyncMongoMockClient
+
+    store = ConversationStore(AsyncMongoMockClient()["smartspeak_bench"])
+    ai_service = AIService()
+    context = ContextManager(store, ai_service)
+    session_id = "bench-context"
+
+    results = []
+    for turn in range(1, turns + 1):
+        query = f"Turn {turn}: how do Docker volumes differ from bind mounts in production?"
+        start = time.perf_counter()
+        history = await context.build(session_id)
+        build_ms = (time.perf_counter() - start) * 1000
+        prompt = ai_service._build_messages(query, "en", history)
+        if turn in (1, 2) or turn % report_every == 0:
+            results.append({
+                "turn": turn,
+                "prompt_tokens": sum(message_tokens(message) for message in prompt),
+                "history_messages": len(history),
+                "build_ms": round(build_ms, 3),
+            })
+        answer = await ai_service.process_query(query, session_id, "en", history)
+        await store.append(session_id, [StoredMessage(role="user", content=query), StoredMessage(role="assistant", content=answer * 3)])
+        await context.drain()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--report-every", type=int, default=25)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.turns, args.report_every)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark: /transcribe and /speak tail latency with and without hedged provider calls
+
+Run from backend/:  python benchmarks/bench_hedging.py --requests 400 --outlier-rate 0.03
+The stub provider answers most calls in about --latency seconds but stalls
+--outlier-rate of them for --outlier-latency seconds. Each mode gets a fresh
+single-worker uvicorn: without hedging (the default) and with
+PROVIDER_HEDGE_STAGES=stt,tts. Reported per endpoint: client-side p50, p95
+and p99, plus the provider calls made per request (the extra load hedging
+costs) and the hedges sent and won, from /metrics.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from benchmarks.stub_provider import StubProcess
+from benchmarks.bench_shared_cache import free_port, wait_ready
+from benchmarks.load_test import make_wav
+
+
+def percentiles(values: list) -> dict:
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+    return {"p50_ms": round(statistics.median(ordered) * 1000, 1), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def drive(base_url: str, args, tag: str) -> dict:
+    import httpx
+    wav = make_wav(1.0)
+    latencies = {"transcribe": [], "speak": []}
+    jobs = iter([("transcribe", i) for i in range(args.requests)] + [("speak", i) for i in range(args.requests)])
+
+    async with httpx.AsyncClient(timeout=60) as http:
+        async def client():
+            for endpoint, i in jobs:
+                start = time.perf_counter()
+                if endpoint == "transcribe":
+                    response = await http.post(f"{base_url}/api/voice/transcribe", files={"file": ("audio.wav", wav, "audio/wav")})
+                else:
+                    response = await http.post(f"{base_url}/api/voice/speak", json={"text": f"Hedging check {tag} {i}"})
+                response.raise_for_status()
+                latencies[endpoint].append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        counters = (await http.get(f"{base_url}/api/metrics", params={"format": "json"})).json()["counters"]
+    return {
+        **{endpoint: percentiles(values) for endpoint, values in latencies.items()},
+        "hedging": {name: value for name, value in counters.items() if "hedge" in name},
+    }
+
+
+def run(hedged: bool, args, stub: StubProcess) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": stub.base_url,
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+        "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+        # Every request reaches the provider
+        "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+        "AUDIO_POOL_WORKERS": "0",
+        "PROVIDER_HEDGE_STAGES": "stt,tts" if hedged else "",
+        "PROVIDER_HEDGE_PERCENTILE": str(args.percentile),
+        "PROVIDER_HEDGE_BUDGET": str(args.budget),
+    }
+    env.pop("EMERGENT_LLM_KEY", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_ready(base_url)
+        before = stub.stats()["calls"]
+        result = asyncio.run(drive(base_url, args, f"{int(hedged)}-{time.time_ns()}"))
+        after = stub.stats()["calls"]
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    result["provider_calls_per_request"] = {
+        stage: round((after[stage] - before[stage]) / args.requests, 3) for stage in ("stt", "tts")
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="usual stub latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="mean exponential jitter (s)")
+    parser.add_argument("--outlier-rate", type=float, default=0.03)
+    parser.add_argument("--outlier-latency", type=float, default=1.5, help="latency of a stalled call (s)")
+    parser.add_argument("--percentile", type=float, default=0.95, help="PROVIDER_HEDGE_PERCENTILE")
+    parser.add_argument("--budget", type=float, default=0.1, help="PROVIDER_HEDGE_BUDGET")
+    args = parser.parse_args()
+
+    stages = ("stt", "tts")
+    with StubProcess(
+        latency={stage: args.latency for stage in stages},
+        jitter={stage: args.jitter for stage in stages},
+        outlier_rate={stage: args.outlier_rate for stage in stages},
+        outlier_latency={stage: args.outlier_latency for stage in stages},
+        seed=1,
+    ) as stub:
+        results = {"unhedged": run(False, args, stub), "hedged": run(True, args, stub)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark: history and context reads as a session grows
+
+Run from backend/:  python benchmarks/bench_history.py
+Uses mongomock-motor (pip install mongomock-motor) unless --mongo-url points
+at a real mongod. Compares the bucketed ConversationStore against reading a
+single Conversation document that embeds every message.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.conversation import Conversation, Message, StoredMessage
+from services.ai_service import AIService
+from services.conversation_store import ConversationStore
+from services.context_manager import ContextManager
+
+
+def make_db(mongo_url: str):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(mongo_url)["smartspeak_bench"]
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()["smartspeak_bench"]
+
+
+async def timed(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+async def run(sizes, page: int, repeat: int, mongo_url: str) -> list:
+    db = make_db(mongo_url)
+    await db.drop_collection("conversations")
+    await db.drop_collection("message_buckets")
+    await db.drop_collection("embedded_conversations")
+    store = ConversationStore(db)
+    await store.ensure_indexes()
+    context = ContextManager(store, AIService())
+    embedded = db["embedded_conversations"]
+
+    results = []
+    total = 0
+    for size in sizes:
+        session_id = f"bench-{size}"
+        # Grow the session in user/assistant turns
+        for i in range(0, size, 2):
+            await store.append(session_id, [
+                StoredMessage(role="user", content=f"Question {i}: what is Docker and how does it differ from a VM?"),
+                StoredMessage(role="assistant", content="Docker packages apps with their dependencies. " * 4),
+            ])
+        total += size
+        conversation = Conversation(session_id=session_id, messages=[
+            Message(role="user" if i % 2 == 0 else "assistant", content="Docker packages apps. " * 4)
+            for i in range(size)
+        ])
+        await embedded.insert_one(conversation.model_dump())
+
+        async def whole_document():
+            doc = await embedded.find_one({"session_id": session_id})
+            Conversation(**doc)
+
+        results.append({
+            "messages_in_session": size,
+            "messages_in_db": total,
+            "history_page_ms": await timed(lambda: store.get_history(session_id, limit=page), repeat),
+            "context_window_ms": await timed(lambda: context.build(session_id), repeat),
+            "embedded_document_ms": await timed(whole_document, repeat),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mongo-url", default=None)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(json.dumps(asyncio.run(run(sizes, args.page, args.repeat, args.mongo_url)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
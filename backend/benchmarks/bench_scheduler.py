@@ -0,0 +1,123 @@
+"""Benchmark: interactive latency while batch jobs saturate the provider, with and without the scheduler
+
+Run from backend/:  python benchmarks/bench_scheduler.py --batches 2 --items 400
+A single-worker uvicorn talks to the stub provider with the TTS stage held at
+a fixed PROVIDER_LIMIT_TTS slots. Interactive clients send /speak requests at
+a steady pace, first alone, then while --batches /speak/batch jobs (from
+another client) keep every slot busy and a backlog queued. With
+SCHEDULER_ENABLED=0 all calls share one FIFO queue and the interactive p95
+grows with the batch backlog; with the scheduler it should stay near the
+unloaded p95 (at worst, one batch call's wait for a free slot).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from benchmarks.stub_provider import StubProcess
+from benchmarks.bench_shared_cache import free_port, wait_ready
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def interactive(http, base_url: str, tag: str, clients: int, requests: int, pause: float) -> list:
+    latencies = []
+
+    async def client(c: int):
+        for i in range(requests):
+            start = time.perf_counter()
+            response = await http.post(
+                f"{base_url}/api/voice/speak",
+                json={"text": f"Interactive {tag} {c}-{i}"},
+                headers={"X-Client-Id": f"user-{c}"},
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(pause)
+
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return latencies
+
+
+async def batch(http, base_url: str, tag: str, job: int, items: int) -> float:
+    start = time.perf_counter()
+    body = {"items": [f"Batch {tag} {job}-{i}" for i in range(items)]}
+    async with http.stream("POST", f"{base_url}/api/voice/speak/batch", json=body, headers={"X-Client-Id": "exporter"}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_lines():
+            pass
+    return time.perf_counter() - start
+
+
+async def drive(base_url: str, args, tag: str) -> dict:
+    import httpx
+    async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=64)) as http:
+        alone = await interactive(http, base_url, f"{tag}-alone", args.clients, args.requests, args.pause)
+        jobs = [asyncio.create_task(batch(http, base_url, tag, job, args.items)) for job in range(args.batches)]
+        await asyncio.sleep(0.5)  # let the batch backlog build up
+        loaded = await interactive(http, base_url, f"{tag}-loaded", args.clients, args.requests, args.pause)
+        batch_s = await asyncio.gather(*jobs)
+    summary = lambda values: {
+        "p50_ms": round(statistics.median(values) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+    }
+    return {"alone": summary(alone), "under_batch": summary(loaded), "batch_s": [round(s, 2) for s in batch_s]}
+
+
+def run(enabled: bool, args, stub: StubProcess) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": stub.base_url,
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+        "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+        "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+        "AUDIO_POOL_WORKERS": "0",
+        # A fixed number of slots, so the comparison is not about the adaptive limit
+        "PROVIDER_LIMIT_TTS": str(args.slots), "PROVIDER_LIMIT_MAX_TTS": str(args.slots),
+        "SCHEDULER_ENABLED": "1" if enabled else "0",
+    }
+    env.pop("EMERGENT_LLM_KEY", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_ready(base_url)
+        return asyncio.run(drive(base_url, args, f"{int(enabled)}-{time.time_ns()}"))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=4, help="fixed TTS provider limit")
+    parser.add_argument("--batches", type=int, default=2, help="concurrent batch jobs")
+    parser.add_argument("--items", type=int, default=400, help="items per batch job")
+    parser.add_argument("--clients", type=int, default=4, help="interactive clients")
+    parser.add_argument("--requests", type=int, default=25, help="requests per interactive client")
+    parser.add_argument("--pause", type=float, default=0.05, help="interactive think time (s)")
+    parser.add_argument("--latency", type=float, default=0.1, help="stub latency per call (s)")
+    args = parser.parse_args()
+
+    with StubProcess(latency={"llm": args.latency, "tts": args.latency}) as stub:
+        results = {"fifo": run(False, args, stub), "scheduler": run(True, args, stub)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark: building and encoding a 10k-message history, Pydantic models vs compact messages
+
+Run from backend/:  python benchmarks/bench_serialization.py --messages 10000
+Compares, for one session's messages as they come out of MongoDB:
+- models: Message objects in a Conversation, encoded with model_dump_json()
+- dicts + jsonable_encoder: the raw documents through FastAPI's default
+  JSONResponse path (what the history endpoint did before)
+- compact: StoredMessage.from_doc() then orjson (ORJSONResponse), with all
+  fields or projected onto role,content
+Times are medians; memory is what tracemalloc sees allocated for the
+messages alone. The last line times GET /history?limit=N end to end on mongomock.
+"""
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from models.conversation import MESSAGE_FIELDS, Conversation, Message, StoredMessage
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def allocated(fn) -> float:
+    """MB still allocated by what fn() returns"""
+    tracemalloc.start()
+    kept = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return round(size / 1e6, 2)
+
+
+def make_docs(count: int, legacy: bool) -> list:
+    """Bucket entries as read back from MongoDB: written as Message (uuid, datetime) or as StoredMessage"""
+    docs = []
+    for seq in range(count):
+        role = "user" if seq % 2 == 0 else "assistant"
+        content = f"Question {seq}: what is Docker?" if role == "user" else "Docker packages apps with their dependencies. " * 4
+        if legacy:
+            docs.append({"seq": seq, "id": str(uuid.uuid4()), "role": role, "content": content, "timestamp": datetime.now(timezone.utc)})
+        else:
+            docs.append({"seq": seq, **StoredMessage(role=role, content=content).to_doc()})
+    return docs
+
+
+async def endpoint_ms(count: int, repeat: int) -> dict:
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+    from server import app
+    from services.container import container
+
+    container.conversation_store.attach(AsyncMongoMockClient()["smartspeak_bench"])
+    for start in range(0, count, 100):
+        await container.conversation_store.append("bench", [
+            StoredMessage(role="user", content=f"Question {start + i}: what is Docker?") for i in range(100)
+        ])
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        for label, params in (("all_fields", {}), ("role_content", {"fields": "role,content"})):
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = await http.get("/api/voice/history/bench", params={"limit": count, **params})
+                response.raise_for_status()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[label] = {"ms": round(statistics.median(samples), 1), "bytes": len(response.content)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    legacy, compact = make_docs(args.messages, legacy=True), make_docs(args.messages, legacy=False)
+    legacy_page = {"session_id": "bench", "messages": legacy, "next_before": None}
+    models = Conversation(session_id="bench", messages=[Message(**doc) for doc in legacy])
+    stored = [StoredMessage.from_doc(doc) for doc in compact]
+    projected = ("role", "content")
+
+    def compact_response(fields) -> bytes:
+        messages = [StoredMessage.from_doc(doc) for doc in compact]
+        return ORJSONResponse({"session_id": "bench", "messages": [m.project(fields) for m in messages], "next_before": None}).body
+
+    results = {
+        "messages": args.messages,
+        "build_ms": {
+            "models": timed(lambda: Conversation(session_id="bench", messages=[Message(**doc) for doc in legacy]), args.repeat),
+            "compact": timed(lambda: [StoredMessage.from_doc(doc) for doc in compact], args.repeat),
+            "compact_from_legacy_docs": timed(lambda: [StoredMessage.from_doc(doc) for doc in legacy], args.repeat),
+        },
+        "encode_ms": {
+            "models": timed(models.model_dump_json, args.repeat),
+            "dicts_jsonable_encoder": timed(lambda: JSONResponse(jsonable_encoder(legacy_page)).body, args.repeat),
+            "compact": timed(lambda: ORJSONResponse({"messages": [m.project(MESSAGE_FIELDS) for m in stored]}).body, args.repeat),
+            "compact_role_content": timed(lambda: ORJSONResponse({"messages": [m.project(projected) for m in stored]}).body, args.repeat),
+        },
+        "build_and_encode_ms": {
+            "models": timed(lambda: Conversation(session_id="bench", messages=[Message(**doc) for doc in legacy]).model_dump_json(), args.repeat),
+            "compact": timed(lambda: compact_response(MESSAGE_FIELDS), args.repeat),
+            "compact_role_content": timed(lambda: compact_response(projected), args.repeat),
+        },
+        "memory_mb": {
+            "models": allocated(lambda: [Message(**doc) for doc in legacy]),
+            "dicts": allocated(lambda: [dict(doc) for doc in legacy]),
+            "compact": allocated(lambda: [StoredMessage.from_doc(doc) for doc in compact]),
+        },
+        "bytes": {
+            "models": len(models.model_dump_json()),
+            "compact": len(compact_response(MESSAGE_FIELDS)),
+            "compact_role_content": len(compact_response(projected)),
+        },
+    }
+    results["history_endpoint"] = asyncio.run(endpoint_ms(args.messages, max(args.repeat // 2, 1)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark: cache hit rate across uvicorn workers, per shared store backend
+
+Run from backend/:  python benchmarks/bench_shared_cache.py --workers 4 --requests 600
+Each backend gets fresh workers (one single-worker uvicorn per port, with
+requests spread round-robin, as a load balancer would) against the stub
+provider, and the same skewed (Zipf) mix of /speak and /process requests;
+texts are tagged per run so no run starts warm. Hit rate is the
+share of requests that did not reach the provider: with per-worker caches
+(SHARED_STORE=memory) each worker has to miss on an item before it hits, so
+the rate drops as workers are added; with a shared store it should not.
+--redis-url adds the redis backend (a real server or any stand-in speaking the protocol).
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from benchmarks.stub_provider import StubProcess
+
+
+def make_workload(requests: int, distinct: int, skew: float, seed: int, tag: str) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** skew for rank in range(distinct)]
+    picks = rng.choices(range(distinct), weights=weights, k=requests)
+    return [
+        ("speak" if i % 2 else "process", f"Question {pick} ({tag}): what does service {pick} depend on?")
+        for i, pick in enumerate(picks)
+    ]
+
+
+async def drive(base_urls: list, workload: list, concurrency: int) -> float:
+    import httpx
+    pending = iter(enumerate(workload))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+        async def client():
+            for i, (endpoint, text) in pending:
+                if endpoint == "process":
+                    body = {"text": text, "session_id": f"bench-{i}"}
+                else:
+                    body = {"text": text}
+                response = await http.post(f"{base_urls[i % len(base_urls)]}/api/voice/{endpoint}", json=body)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_ready(base_url: str, timeout: float = 120):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{base_url} not ready")
+
+
+def run_backend(backend: str, args, stub: StubProcess, workload: list) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            "SHARED_STORE": backend,
+            "SHARED_STORE_PATH": str(Path(scratch) / "shared.db"),
+            "SHARED_STORE_URL": args.redis_url or "",
+            # No uploads here: threads instead of a process pool per worker
+            "AUDIO_POOL_WORKERS": "0",
+        }
+        env.pop("EMERGENT_LLM_KEY", None)
+        ports = [free_port() for _ in range(args.workers)]
+        servers = [
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                cwd=BACKEND, env=env, stderr=subprocess.DEVNULL,
+            )
+            for port in ports
+        ]
+        try:
+            base_urls = [f"http://127.0.0.1:{port}" for port in ports]
+            for base_url in base_urls:
+                wait_ready(base_url)
+            before = stub.stats()["calls"]
+            elapsed = asyncio.run(drive(base_urls, workload, args.concurrency))
+            after = stub.stats()["calls"]
+        finally:
+            for server in servers:
+                server.terminate()
+            for server in servers:
+                server.wait(timeout=60)
+
+    result = {"wall_s": round(elapsed, 3)}
+    for endpoint, stage in (("process", "llm"), ("speak", "tts")):
+        requests = sum(1 for kind, _ in workload if kind == endpoint)
+        calls = after[stage] - before[stage]
+        result[stage] = {"requests": requests, "provider_calls": calls, "hit_rate": round(1 - calls / requests, 4)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="server processes sharing the store")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--distinct", type=int, default=100, help="distinct texts in the workload")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of text popularity")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub latency per call (s)")
+    parser.add_argument("--backends", default="memory,sqlite")
+    parser.add_argument("--redis-url", help="also run the redis backend against this server")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    backends = args.backends.split(",") + (["redis"] if args.redis_url else [])
+    results = {"workers": args.workers}
+    with StubProcess(latency={"llm": args.latency, "tts": args.latency}) as stub:
+        for backend in backends:
+            workload = make_workload(args.requests, args.distinct, args.skew, args.seed, f"{backend}-{time.time_ns()}")
+            results[backend] = run_backend(backend, args, stub, workload)
+            results[backend]["distinct"] = {
+                stage: len({text for kind, text in workload if kind == endpoint})
+                for endpoint, stage in (("process", "llm"), ("speak", "tts"))
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: import time, time to liveness and readiness, and the first requests after start
+
+Run from backend/:  python benchmarks/bench_startup.py --runs 5
+Import time is measured in fresh interpreters. Each cold start launches
+uvicorn in a child process against the stub provider in another, polls
+/api/health/live and /api/health/ready, then times the first /speak and
+/transcribe requests (which warm-up should have made as fast as the second).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from benchmarks.stub_provider import StubProcess
+from benchmarks.load_test import make_wav
+
+
+def import_time(env: dict) -> float:
+    code = "import time; start = time.perf_counter(); import server; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def wait_for(http, path: str, started: float, timeout: float = 60) -> float:
+    """Seconds from `started` until `path` answers 200"""
+    import httpx
+    while time.perf_counter() - started < timeout:
+        try:
+            if http.get(path).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{path} not ready after {timeout}s")
+
+
+def timed(http, method: str, path: str, **kwargs) -> float:
+    start = time.perf_counter()
+    http.request(method, path, **kwargs).raise_for_status()
+    return time.perf_counter() - start
+
+
+def cold_start(env: dict) -> dict:
+    import httpx
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as http:
+            result = {
+                "live_s": wait_for(http, "/api/health/live", started),
+                "ready_s": wait_for(http, "/api/health/ready", started),
+            }
+            for attempt in ("first", "second"):
+                result[f"speak_{attempt}_ms"] = timed(http, "POST", "/api/voice/speak", json={"text": "Startup check"}) * 1000
+            for attempt in ("first", "second"):
+                files = {"file": ("audio.wav", make_wav(1.0), "audio/wav")}
+                result[f"transcribe_{attempt}_ms"] = timed(http, "POST", "/api/voice/transcribe", files=files) * 1000
+            result["warmup"] = http.get("/api/health/ready").json()["warmup"]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency per call (s)")
+    args = parser.parse_args()
+
+    with StubProcess(latency={"llm": args.latency, "tts": args.latency}) as stub:
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub.base_url,
+            # Nothing listens here: history calls fail fast, as on a start without MongoDB
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            # A cold cache on every start, so the first requests reach the provider
+            "LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none",
+        }
+        env.pop("EMERGENT_LLM_KEY", None)
+        imports = [import_time(env) for _ in range(args.runs)]
+        starts = [cold_start(env) for _ in range(args.runs)]
+
+    results = {"import_s": {"median": round(statistics.median(imports), 3), "max": round(max(imports), 3)}}
+    fields = ("live_s", "ready_s", "speak_first_ms", "speak_second_ms", "transcribe_first_ms", "transcribe_second_ms")
+    for field in fields:
+        values = [start[field] for start in starts]
+        results[field] = {"median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+    results["warmup"] = starts[-1]["warmup"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
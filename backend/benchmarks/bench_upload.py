@@ -0,0 +1,80 @@
+"""Benchmark: peak memory per in-flight upload on /api/voice/transcribe
+
+Run from backend/:  python benchmarks/bench_upload.py --sizes-mb 1,8,24 --concurrency 4
+Uploads are sent through the in-process app to a stub provider running in a
+child process, so tracemalloc only sees the app's own copies of each upload.
+Preprocessing is off unless --preprocess is given, isolating the upload path.
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_provider import StubProcess
+
+
+async def run(sizes_mb, concurrency: int) -> list:
+    import httpx
+    from server import app
+    from services.container import container
+
+    container.conversation_store.db = None
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+        async def upload(payload: bytes) -> int:
+            # A file object makes httpx send the body in 64 KB chunks, as a real client would
+            files = {"file": ("audio.webm", io.BytesIO(payload), "audio/webm")}
+            response = await http.post("/api/voice/transcribe", files=files)
+            return response.status_code
+
+        await upload(b"\x1aE\xdf\xa3" + b"\x00" * 1024)  # warm-up
+        for size_mb in sizes_mb:
+            payload = b"\x1aE\xdf\xa3" + os.urandom(int(size_mb * 1024 * 1024) - 4)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(upload(payload) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            results.append({
+                "upload_mb": size_mb,
+                "concurrency": concurrency,
+                "statuses": sorted(set(statuses)),
+                "wall_s": round(elapsed, 3),
+                "peak_bytes_per_request": peak // concurrency,
+                "peak_per_request_vs_upload": round(peak / concurrency / len(payload), 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", default="1,8,24")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--preprocess", action="store_true")
+    args = parser.parse_args()
+
+    with StubProcess(latency={"stt": 0.05}) as stub:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": stub.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_bench"),
+            "AUDIO_PREPROCESS": "1" if args.preprocess else "0",
+        })
+        os.environ.pop("EMERGENT_LLM_KEY", None)
+        tracemalloc.start()
+        results = asyncio.run(run([float(size) for size in args.sizes_mb.split(",")], args.concurrency))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
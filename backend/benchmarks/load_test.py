@@ -0,0 +1,300 @@
+"""Load test: /transcribe, /process, /speak and /ask at rising concurrency
+
+Run from backend/:  python benchmarks/load_test.py --levels 1,4,16,64 --output bench.json
+The app runs in-process (httpx ASGI transport) against a stub OpenAI-compatible
+provider in a child process with configurable latency, jitter and failure rates.
+Results are JSON with stable keys, so two runs can be diffed, or compared with
+    python benchmarks/load_test.py --compare before.json after.json
+Caches are disabled unless --cache is given, so every request reaches the stub.
+tracemalloc slows allocation-heavy code; pass --no-tracemalloc for cleaner
+throughput numbers (memory is then reported as RSS only).
+--engines stt=local,tts=local swaps stages to other engines (services/engines.py);
+stages left on "openai" keep using the stub.
+"""
+import io
+import os
+import sys
+import json
+import time
+import wave
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_provider import StubProcess, STAGES
+
+ENDPOINTS = ("transcribe", "process", "speak", "ask")
+
+
+def make_wav(seconds: float, rate: int = 16000) -> bytes:
+    """A tone with pauses, so preprocessing has speech to keep and silence to trim"""
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = (np.sin(2 * np.pi * 0.5 * t) > 0).astype(np.float32)
+    samples = 0.3 * np.sin(2 * np.pi * 220 * t) * envelope
+    padded = np.concatenate([np.zeros(rate // 2), samples, np.zeros(rate // 2)])
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((padded * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def make_request(endpoint: str, i: int, audio: bytes) -> dict:
+    """httpx.request kwargs for the i-th call; text varies so no two calls are identical"""
+    if endpoint == "transcribe":
+        return {"method": "POST", "url": "/api/voice/transcribe", "files": {"file": ("audio.wav", audio, "audio/wav")}}
+    if endpoint == "process":
+        body = {"text": f"Question {i}: what is Docker?", "session_id": f"load-{i}", "language": "en"}
+        return {"method": "POST", "url": "/api/voice/process", "json": body}
+    if endpoint == "speak":
+        body = {"text": f"Answer number {i}. Docker packages apps with their dependencies."}
+        return {"method": "POST", "url": "/api/voice/speak", "json": body, "headers": {"Accept": "audio/mpeg"}}
+    return {
+        "method": "POST",
+        "url": f"/api/voice/ask?language=en&session_id=load-ask-{i}",
+        "files": {"file": ("audio.wav", audio, "audio/wav")},
+        "headers": {"Accept": "audio/mpeg"},
+    }
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def max_rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+async def run_level(http, endpoint: str, concurrency: int, total: int, audio: bytes, trace: bool) -> dict:
+    from services.metrics import metrics
+
+    metrics.reset()
+    latencies, errors, statuses = [], 0, {}
+    pending = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                response = await http.request(**make_request(endpoint, i, audio))
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status != "200":
+                errors += 1
+
+    lags = []
+
+    async def ticker():
+        # How late a 10 ms sleep wakes up: time the event loop spent blocked
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    if trace:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    rss_before = max_rss_bytes()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    ticking = asyncio.create_task(ticker())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    ticking.cancel()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    lags.sort()
+
+    latencies.sort()
+    result = {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(total / wall, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "cpu_ms_per_request": round(cpu / total * 1000, 3),
+        "loop_lag_ms": {"p99": round(percentile(lags, 0.99) * 1000, 2), "max": round(lags[-1] * 1000, 2) if lags else 0.0},
+        "memory": {"max_rss_growth_bytes": max_rss_bytes() - rss_before},
+        "stages_ms": {
+            stage: {q: round(value * 1000, 2) for q, value in stats.items() if q in ("p50", "p95", "p99")}
+            for stage, stats in metrics.snapshot()["stages"].items()
+        },
+    }
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        # Peak over the level divided by the requests that were in flight at once
+        result["memory"]["peak_bytes_per_inflight_request"] = (peak - baseline) // concurrency
+        result["memory"]["retained_bytes_per_request"] = max(current - baseline, 0) // total
+    return result
+
+
+async def run(args, stub: StubProcess) -> dict:
+    import httpx
+    from server import app
+    from services.container import container
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        container.conversation_store.attach(AsyncIOMotorClient(args.mongo_url)["smartspeak_load"])
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+            container.conversation_store.attach(AsyncMongoMockClient()["smartspeak_load"])
+        except ImportError:
+            # Without a database the store is a no-op rather than timing out on every write
+            container.conversation_store.db = None
+
+    audio = make_wav(args.audio_seconds)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=300) as http:
+        for endpoint in args.endpoints:
+            # Warm-up: imports, connection pool and first-call setup stay out of level 1
+            await http.request(**make_request(endpoint, -1, audio))
+            results[endpoint] = []
+            for concurrency in args.levels:
+                total = max(args.requests, concurrency * args.rounds)
+                level = await run_level(http, endpoint, concurrency, total, audio, not args.no_tracemalloc)
+                results[endpoint].append(level)
+                print(
+                    f"{endpoint:<10} c={concurrency:<4} {level['throughput_rps']:>8} rps  "
+                    f"p50 {level['latency_ms']['p50']:>8} ms  p99 {level['latency_ms']['p99']:>8} ms  "
+                    f"errors {level['errors']}",
+                    file=sys.stderr,
+                )
+    await container.conversation_store.drain()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(before_path: str, after_path: str):
+    """Print throughput and p99 changes per endpoint and concurrency level"""
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    for endpoint, levels in after["results"].items():
+        old = {level["concurrency"]: level for level in before["results"].get(endpoint, [])}
+        for level in levels:
+            previous = old.get(level["concurrency"])
+            if previous is None:
+                continue
+            rps = (level["throughput_rps"] / previous["throughput_rps"] - 1) * 100 if previous["throughput_rps"] else 0.0
+            p99 = (level["latency_ms"]["p99"] / previous["latency_ms"]["p99"] - 1) * 100 if previous["latency_ms"]["p99"] else 0.0
+            print(f"{endpoint:<10} c={level['concurrency']:<4} throughput {rps:+7.1f}%  p99 {p99:+7.1f}%")
+
+
+def stage_values(text: str, cast=float) -> dict:
+    """Parse 'stt=0.2,llm=0.5' (or a single value for every stage)"""
+    if "=" not in text:
+        return {stage: cast(text) for stage in STAGES}
+    return {key: cast(value) for key, value in (pair.split("=") for pair in text.split(","))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=40, help="minimum requests per level")
+    parser.add_argument("--rounds", type=int, default=4, help="requests per worker at high concurrency")
+    parser.add_argument("--latency", default="stt=0.3,llm=0.5,tts=0.3", help="stub base latency per stage (s)")
+    parser.add_argument("--jitter", default="0.05", help="mean extra stub latency per stage (s, exponential)")
+    parser.add_argument("--failure-rate", default="0", help="fraction of stub calls that fail")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--audio-seconds", type=float, default=3.0)
+    parser.add_argument("--cache", action="store_true", help="keep the LLM and TTS caches enabled")
+    parser.add_argument("--mongo-url", default=None, help="real MongoDB; default is mongomock-motor")
+    parser.add_argument("--engines", default="", help="engine per stage, e.g. stt=local,tts=local,llm=mock")
+    parser.add_argument("--no-tracemalloc", action="store_true")
+    parser.add_argument("--output", default=None, help="write JSON here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.levels = [int(level) for level in args.levels.split(",")]
+    args.endpoints = args.endpoints.split(",")
+    stub_options = {
+        "latency": stage_values(args.latency),
+        "jitter": stage_values(args.jitter),
+        "failure_rate": stage_values(args.failure_rate),
+        "seed": args.seed,
+        "failure_status": args.failure_status,
+    }
+
+    with StubProcess(**stub_options) as stub:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-load",
+            "OPENAI_BASE_URL": stub.base_url,
+            "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"),
+            "DB_NAME": os.environ.get("DB_NAME", "smartspeak_load"),
+        })
+        os.environ.pop("EMERGENT_LLM_KEY", None)
+        engines = dict(pair.split("=") for pair in args.engines.split(",") if pair)
+        os.environ.update({f"{stage.upper()}_ENGINE": name for stage, name in engines.items()})
+        if not args.cache:
+            os.environ.update({"LLM_CACHE_SIZE": "0", "TTS_CACHE_MEMORY_MB": "0", "SHARED_STORE": "none"})
+        if not args.no_tracemalloc:
+            tracemalloc.start()
+        results = asyncio.run(run(args, stub))
+        stub_stats = stub.stats()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "stub": stub_options,
+            "cache": args.cache,
+            "engines": engines,
+            "tracemalloc": not args.no_tracemalloc,
+            "audio_seconds": args.audio_seconds,
+            "audio_pool_workers": os.environ.get("AUDIO_POOL_WORKERS", str(os.cpu_count())),
+            "provider_max_retries": os.environ.get("PROVIDER_MAX_RETRIES", "2"),
+            "stub_calls": stub_stats["calls"],
+            "stub_failures": stub_stats["failures"],
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Local OpenAI-compatible stub server for benchmarks"""
+import json
+import random
+import asyncio
+import socket
+import threading
+import multiprocessing
+import time
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+STUB_AUDIO = b"ID3" + b"\x00" * 2048
+STUB_ANSWER = "Docker packages apps with their dependencies. Containers share the host kernel."
+STAGES = ("stt", "llm", "tts")
+
+
+def create_stub_app(
+    latency: Optional[Dict[str, float]] = None,
+    jitter: Optional[Dict[str, float]] = None,
+    failure_rate: Optional[Dict[str, float]] = None,
+    seed: Optional[int] = None,
+    failure_status: int = 500,
+    outlier_rate: Optional[Dict[str, float]] = None,
+    outlier_latency: Optional[Dict[str, float]] = None,
+    distinct: bool = False,
+) -> FastAPI:
+    """
+    Build a stub exposing the transcription, chat and speech endpoints.
+    Each call waits the stage's latency plus exponentially distributed jitter
+    (mean `jitter[stage]`, giving a long tail like a real provider) and fails
+    with `failure_status` (e.g. 429 to simulate rate limiting) at
+    `failure_rate[stage]`. At `outlier_rate[stage]` a call takes
+    `outlier_latency[stage]` instead (a stalled upstream replica, the tail
+    that hedging is for). A seed makes runs repeatable. Calls whose client
+    hung up before the answer was sent are counted as aborted. With
+    `distinct`, transcripts and chat answers carry the call's number, so
+    caches and coalescing downstream see no two alike.
+    """
+    latency = {"stt": 0.2, "llm": 0.2, "tts": 0.2, **(latency or {})}
+    jitter = {**{stage: 0.0 for stage in STAGES}, **(jitter or {})}
+    failure_rate = {**{stage: 0.0 for stage in STAGES}, **(failure_rate or {})}
+    outlier_rate = {**{stage: 0.0 for stage in STAGES}, **(outlier_rate or {})}
+    outlier_latency = {**{stage: 2.0 for stage in STAGES}, **(outlier_latency or {})}
+    rng = random.Random(seed)
+    app = FastAPI()
+    app.state.calls = {stage: 0 for stage in STAGES}
+    app.state.failures = {stage: 0 for stage in STAGES}
+    app.state.aborted = {stage: 0 for stage in STAGES}
+
+    def delay(stage: str) -> float:
+        if outlier_rate[stage] > 0 and rng.random() < outlier_rate[stage]:
+            return outlier_latency[stage]
+        return latency[stage] + (rng.expovariate(1 / jitter[stage]) if jitter[stage] > 0 else 0.0)
+
+    def failure(stage: str) -> Optional[Response]:
+        """Count the call and decide whether it fails"""
+        app.state.calls[stage] += 1
+        if rng.random() >= failure_rate[stage]:
+            return None
+        app.state.failures[stage] += 1
+        return JSONResponse({"error": {"message": f"stub {stage} failure", "type": "server_error"}}, status_code=failure_status)
+
+    def numbered(text: str, stage: str) -> str:
+        return f"{text} ({app.state.calls[stage]})" if distinct else text
+
+    async def work(request: Request, stage: str):
+        await asyncio.sleep(delay(stage))
+        if await request.is_disconnected():
+            app.state.aborted[stage] += 1
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        try:
+            await request.body()
+        except ClientDisconnect:
+            # Cancelled while still uploading (e.g. a hedge that lost)
+            app.state.aborted["stt"] += 1
+            return Response(status_code=499)
+        error = failure("stt")
+        text = numbered("What is Docker?", "stt")
+        await work(request, "stt")
+        return error or {"text": text, "language": "en"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = failure("llm")
+        answer = numbered(STUB_ANSWER, "llm")
+        if body.get("stream") and error is None:
+            return StreamingResponse(_stream_chat(answer, delay("llm"), app.state.aborted), media_type="text/event-stream")
+        await work(request, "llm")
+        return error or {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+        }
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        await request.json()
+        error = failure("tts")
+        await work(request, "tts")
+        return error or Response(content=STUB_AUDIO, media_type="audio/mpeg")
+
+    @app.get("/stub/stats")
+    async def stats():
+        return {"calls": app.state.calls, "failures": app.state.failures, "aborted": app.state.aborted}
+
+    return app
+
+
+async def _stream_chat(answer: str, total_latency: float, aborted: Dict[str, int]):
+    """Emit the answer as chat.completion.chunk SSE events spread over the latency"""
+    words = answer.split(" ")
+    try:
+        for i, word in enumerate(words):
+            await asyncio.sleep(total_latency / len(words))
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+    except BaseException:
+        # Cancelled or closed before the end: the client went away
+        aborted["llm"] += 1
+        raise
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """Runs a stub app with uvicorn on a background thread"""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def _serve(port: int, options: dict):
+    uvicorn.run(create_stub_app(**options), host="127.0.0.1", port=port, log_level="warning")
+
+
+class StubProcess:
+    """
+    Runs a stub in a child process, so its CPU time and allocations stay out of
+    the benchmarked process. Takes the create_stub_app keyword arguments.
+    """
+
+    def __init__(self, **options):
+        self.port = _free_port()
+        self.process = multiprocessing.get_context("spawn").Process(target=_serve, args=(self.port, options), daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def stats(self) -> dict:
+        """Calls, injected failures and calls aborted by the client per stage so far"""
+        import httpx
+        return httpx.get(f"http://127.0.0.1:{self.port}/stub/stats").json()
+
+    def __enter__(self):
+        self.process.start()
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or not self.process.is_alive():
+                    raise RuntimeError("stub provider did not start")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
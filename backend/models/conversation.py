@@ -1,11 +1,56 @@
 from pydantic import BaseModel, Field, ConfigDict
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Sequence
+import itertools
+import time
 import uuid
+import os
+
+# Message ids: a random prefix per process plus a counter, unique across
+# workers and far cheaper to make (and to store) than a uuid4 string
+_ID_PREFIX = os.urandom(4).hex()
+_ids = itertools.count()
+
+# Fields a history request can project messages onto
+MESSAGE_FIELDS = ("seq", "id", "role", "content", "ts")
+
+
+def message_id() -> str:
+    return f"{_ID_PREFIX}{next(_ids):x}"
+
+
+@dataclass(slots=True)
+class StoredMessage:
+    """
+    A message as the conversation store writes and reads it: no validation
+    and no per-instance dict (about a third of a Message's memory), a short
+    id and a float epoch timestamp. `seq` is its position in the session,
+    set on append. Fields left out of a projection are None.
+    """
+    role: Optional[str] = None
+    content: Optional[str] = None
+    id: Optional[str] = field(default_factory=message_id)
+    ts: Optional[float] = field(default_factory=time.time)
+    seq: Optional[int] = None
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "StoredMessage":
+        """From a bucket entry, including entries written as Message (uuid id, datetime timestamp)"""
+        ts = doc.get("ts")
+        if ts is None and "timestamp" in doc:
+            ts = doc["timestamp"].replace(tzinfo=timezone.utc).timestamp()
+        return cls(doc.get("role"), doc.get("content"), doc.get("id"), ts, doc.get("seq"))
+
+    def to_doc(self) -> dict:
+        return {"seq": self.seq, "id": self.id, "role": self.role, "content": self.content, "ts": self.ts}
+
+    def project(self, fields: Sequence[str]) -> dict:
+        return {name: getattr(self, name) for name in fields}
 
 
 class Message(BaseModel):
-    """Single message in a conversation"""
+    """Single message in a conversation (validated API model; storage uses StoredMessage)"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     role: str  # 'user' or 'assistant'
     content: str
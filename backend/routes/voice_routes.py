@@ -1,23 +1,37 @@
 """API routes for voice assistant"""
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Query, Request
+from fastapi.responses import StreamingResponse, Response, ORJSONResponse
 from pydantic import BaseModel
-from services.audio_service import AudioService
-from services.ai_service import AIService
-from services.tts_service import TTSService
-from models.conversation import Message, Conversation
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.background import BackgroundTask
+from services.container import container
+from services.segmenter import SentenceBuffer
+from services.metrics import metrics, Timeline
+from services.resilience import ProviderError
+from services.uploads import AudioBuffer, UploadTooLarge, MAX_UPLOAD_BYTES, detect_container, wrap_upload
+from services.batch import run_batch
+from services.cancellation import RequestCancelled, cancellations
+from services.scheduler import client_flow, work_class
+from services.response_cache import normalize_query
+from services.audio_cache import cache_key
+from models.conversation import MESSAGE_FIELDS, StoredMessage
 from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Union
+from urllib.parse import quote
+import asyncio
+import base64
+import json
 import logging
+import math
+import orjson
+import os
+import re
 import uuid
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/voice", tags=["voice"])
 
-# Initialize services
-audio_service = AudioService()
-ai_service = AIService()
-tts_service = TTSService()
+# Services come from the container: built on first use, warmed up at startup
 
 
 class ProcessQueryRequest(BaseModel):
@@ -31,92 +45,717 @@ class SpeakRequest(BaseModel):
     voice: str = "nova"
 
 
+class ProcessBatchItem(BaseModel):
+    text: str
+    language: Optional[str] = None
+    id: Optional[str] = None
+
+
+class ProcessBatchRequest(BaseModel):
+    items: List[Union[str, ProcessBatchItem]]
+    language: str = "en"
+    concurrency: Optional[int] = None
+
+
+class SpeakBatchItem(BaseModel):
+    text: str
+    voice: Optional[str] = None
+    id: Optional[str] = None
+
+
+class SpeakBatchRequest(BaseModel):
+    items: List[Union[str, SpeakBatchItem]]
+    voice: str = "nova"
+    concurrency: Optional[int] = None
+
+
+class CancelRequest(BaseModel):
+    request_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
 class VoiceResponse(BaseModel):
     text: str
     audio: str  # base64
+    language: Optional[str] = None
+    timing: Optional[dict] = None  # ms per stage, wall and overlap
+
+
+AUDIO_MEDIA_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg", "flac": "audio/flac"}
+AUDIO_CHUNK_SIZE = 64 * 1024
+# Batch endpoints: items per request, and calls in flight per batch (about the provider's stage limit)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Largest history page; a whole long session in one request is cheap to encode
+HISTORY_MAX_PAGE = int(os.getenv("HISTORY_MAX_PAGE", "10000"))
+# Summary and history reads before a turn; past this the turn is answered without them
+CONTEXT_READ_TIMEOUT = float(os.getenv("CONTEXT_READ_TIMEOUT", "1.5"))
+
+
+def wants_binary_audio(request: Request) -> bool:
+    """Content negotiation: raw audio if the client accepts audio/* or octet-stream"""
+    accept = request.headers.get("accept", "")
+    return "audio/" in accept or "application/octet-stream" in accept
+
+
+async def read_upload(file: UploadFile) -> AudioBuffer:
+    """
+    An uploaded file as an AudioBuffer (read into memory up to UPLOAD_SPOOL_KB,
+    else read in place from its spool file; refused past UPLOAD_MAX_MB), timed
+    as the upload_read stage. Close the result.
+    """
+    with metrics.span("upload_read"):
+        audio = await wrap_upload(file)
+    metrics.add_bytes("upload_read", len(audio))
+    if audio.on_disk:
+        metrics.inc("uploads_spooled_total")
+    return audio
+
+
+def request_id(request: Request) -> str:
+    """The client's X-Request-Id (the id POST /cancel takes), else a fresh one"""
+    return request.headers.get("x-request-id") or str(uuid.uuid4())
+
+
+async def client_gone(request: Request):
+    """Return once the client has disconnected (the handler has read the body by then)"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+def ndjson(event: dict) -> bytes:
+    """One line of an NDJSON stream"""
+    return orjson.dumps(event) + b"\n"
+
+
+def audio_json_response(audio: bytes, **fields) -> ORJSONResponse:
+    """JSON fallback with base64 audio, timed as the serialization stage"""
+    with metrics.span("serialization", mode="json"):
+        response = ORJSONResponse({**fields, "audio": base64.b64encode(audio).decode("ascii")})
+    metrics.add_bytes("serialization", len(response.body), mode="json")
+    return response
+
+
+def audio_response(request: Request, audio: bytes, headers: dict = None) -> Response:
+    """Raw audio with Content-Type, Content-Length and single-range support"""
+    metrics.add_bytes("serialization", len(audio), mode="binary")
+    media_type = AUDIO_MEDIA_TYPES.get(detect_container(audio), "application/octet-stream")
+    headers = {"Accept-Ranges": "bytes", **(headers or {})}
+    start, end, status = 0, len(audio) - 1, 200
+
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", "").strip())
+    if match and (match.group(1) or match.group(2)):
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+        else:  # suffix range: last N bytes
+            start = max(len(audio) - int(match.group(2)), 0)
+        if start > end:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(audio)}"})
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+
+    body = memoryview(audio)[start:end + 1]
+    headers["Content-Length"] = str(len(body))
+
+    async def chunks():
+        for offset in range(0, len(body), AUDIO_CHUNK_SIZE):
+            yield bytes(body[offset:offset + AUDIO_CHUNK_SIZE])
+
+    return StreamingResponse(chunks(), status_code=status, media_type=media_type, headers=headers)
+
+
+def resolve_language(requested: str, detected: str = None) -> str:
+    """Pick 'en' or 'he' from the requested language, falling back to Whisper's detection"""
+    if requested and requested != "auto":
+        return requested
+    return "he" if detected in ("he", "hebrew") else "en"
+
+
+def http_error(e: Exception) -> HTTPException:
+    """503 + Retry-After while the provider is shedding load, 504 past the deadline, 413 for oversized uploads, 499 once cancelled, else 500"""
+    if isinstance(e, ProviderError):
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else None
+        return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+    if isinstance(e, (UploadTooLarge, RequestCancelled)):
+        return HTTPException(status_code=e.status_code, detail=str(e))
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def error_event(e: Exception) -> dict:
+    """Error message for streamed responses, with the status an HTTP reply would have had"""
+    error = http_error(e)
+    event = {"type": "error", "detail": error.detail, "status": error.status_code}
+    if error.headers:
+        event["retry_after"] = int(error.headers["Retry-After"])
+    return event
+
+
+async def session_context(session_id: str, language: str = "en") -> list:
+    """Summary plus recent turns for the session; answering without context beats failing"""
+    try:
+        return await asyncio.wait_for(container.context_manager.build(session_id, language), CONTEXT_READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"History lookup for {session_id} took over {CONTEXT_READ_TIMEOUT}s; answering without it")
+        metrics.inc("context_timeouts_total")
+        return []
+    except Exception as e:
+        logger.warning(f"History lookup failed for {session_id}: {str(e)}")
+        return []
+
+
+def save_turn(session_id: str, user_text: str, response_text: str, language: str = None):
+    """Persist a user/assistant exchange in the background"""
+    container.conversation_store.append_background(
+        session_id,
+        [StoredMessage(role="user", content=user_text), StoredMessage(role="assistant", content=response_text)],
+        language,
+    )
 
 
 @router.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(http_request: Request, file: UploadFile = File(...)):
     """
     Transcribe audio file to text
     """
     try:
-        audio_data = await file.read()
-        result = await audio_service.transcribe_audio(audio_data)
-        return result
+        with await read_upload(file) as audio_data:
+            return await cancellations.run(
+                container.audio_service.transcribe_audio(audio_data),
+                request_id(http_request),
+                gone=lambda: client_gone(http_request),
+            )
+    except RequestCancelled as e:
+        raise http_error(e)
     except Exception as e:
         logger.error(f"Transcription endpoint error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 
-@router.post("/process")
-async def process_query(request: ProcessQueryRequest):
+@router.post("/transcribe/stream")
+async def transcribe_audio_stream(http_request: Request, file: UploadFile = File(...), language: Optional[str] = None):
     """
-    Process user query and return AI response
+    Transcribe audio, streaming NDJSON events as segments of a long recording finish.
+    Stops with an error event (status 499) on POST /cancel with its X-Request-Id,
+    and silently when the client disconnects.
     """
     try:
-        response_text = await ai_service.process_query(
+        audio_data = await read_upload(file)
+    except Exception as e:
+        logger.error(f"Transcription stream error: {str(e)}")
+        raise http_error(e)
+    rid = request_id(http_request)
+
+    async def transcribe(queue: asyncio.Queue):
+        async for event in container.audio_service.transcribe_stream(audio_data, language):
+            queue.put_nowait(event)
+
+    async def run(queue: asyncio.Queue):
+        # The transcription runs as cancellable work; the body relays its events
+        try:
+            await cancellations.run(transcribe(queue), rid, gone=lambda: client_gone(http_request))
+        except Exception as e:
+            if not isinstance(e, RequestCancelled):
+                logger.error(f"Transcription stream error: {str(e)}")
+            queue.put_nowait(error_event(e))
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        runner = asyncio.create_task(run(queue))
+        try:
+            while (event := await queue.get()) is not None:
+                yield ndjson(event)
+        finally:
+            runner.cancel()
+
+    # Closed once the response is over, even one that never started its body
+    return StreamingResponse(
+        events(), media_type="application/x-ndjson",
+        headers={"X-Request-Id": rid}, background=BackgroundTask(audio_data.close),
+    )
+
+
+@router.post("/process")
+async def process_query(request: ProcessQueryRequest, http_request: Request):
+    """
+    Process user query and return AI response. A newer query for the same
+    session cancels this one (499).
+    """
+    async def answer() -> str:
+        return await container.ai_service.process_query(
             query=request.text,
             session_id=request.session_id,
-            language=request.language
+            language=request.language,
+            history=await session_context(request.session_id, request.language)
+        )
+
+    try:
+        response_text = await cancellations.run(
+            answer(), request_id(http_request), request.session_id,
+            gone=lambda: client_gone(http_request), supersede=True,
         )
+        save_turn(request.session_id, request.text, response_text, request.language)
         return {"response": response_text}
+    except RequestCancelled as e:
+        raise http_error(e)
     except Exception as e:
         logger.error(f"Process query error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 
 @router.post("/speak")
-async def text_to_speech(request: SpeakRequest):
+async def text_to_speech(request: SpeakRequest, http_request: Request):
     """
-    Convert text to speech audio
+    Convert text to speech audio. Send `Accept: audio/*` for raw audio bytes;
+    otherwise the audio is returned base64-encoded in JSON.
     """
     try:
-        audio_base64 = await tts_service.text_to_speech(
-            text=request.text,
-            voice=request.voice
+        audio = await cancellations.run(
+            container.tts_service.text_to_speech(text=request.text, voice=request.voice),
+            request_id(http_request),
+            gone=lambda: client_gone(http_request),
         )
-        return {"audio": audio_base64}
+        if wants_binary_audio(http_request):
+            return audio_response(http_request, audio)
+        return audio_json_response(audio)
+    except RequestCancelled as e:
+        raise http_error(e)
     except Exception as e:
         logger.error(f"TTS endpoint error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+
+@router.post("/speak/stream")
+async def text_to_speech_stream(request: SpeakRequest):
+    """
+    Convert text to speech, streaming audio sentence by sentence (chunked transfer)
+    """
+    chunks = container.tts_service.stream_audio(text=request.text, voice=request.voice)
+    try:
+        # Surface errors in the first sentence as a proper status code
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        logger.error(f"TTS stream endpoint error: {str(e)}")
+        raise http_error(e)
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(body(), media_type=AUDIO_MEDIA_TYPES.get(detect_container(first), "audio/mpeg"))
+
+
+def batch_concurrency(items: list, requested: Optional[int]) -> int:
+    """Validate the batch size and clamp the requested concurrency to BATCH_CONCURRENCY"""
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+    return max(1, min(requested or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+
+
+async def batch_events(items: list, outcomes: AsyncIterator, render) -> AsyncIterator[bytes]:
+    """
+    NDJSON lines for run_batch() outcomes in completion order: one result or
+    error per item (duplicates share the outcome), then a "done" summary
+    """
+    errors = 0
+    try:
+        async for indices, result, error in outcomes:
+            if error is None:
+                body = {"type": "result", **render(result)}
+            else:
+                logger.warning(f"Batch item failed: {str(error)}")
+                body = error_event(error)
+                errors += len(indices)
+            for index in indices:
+                yield ndjson({"type": body["type"], "index": index, "id": items[index].id, **body})
+    finally:
+        await outcomes.aclose()
+    yield ndjson({"type": "done", "items": len(items), "errors": errors})
+
+
+@router.post("/process/batch")
+async def process_query_batch(request: ProcessBatchRequest, http_request: Request):
+    """
+    Answer many independent queries (no session context, nothing saved),
+    streaming NDJSON lines as each finishes: {"type": "result", "index", "id",
+    "response"} or {"type": "error", "index", "id", "detail", "status"}.
+    Identical queries (same normalized text and language) run once.
+    """
+    items = [ProcessBatchItem(text=item) if isinstance(item, str) else item for item in request.items]
+    concurrency = batch_concurrency(items, request.concurrency)
+    for item in items:
+        item.language = item.language or request.language
+
+    outcomes = run_batch(
+        items,
+        key=lambda item: (normalize_query(item.text), item.language),
+        fn=lambda item: container.ai_service.process_query(item.text, "batch", item.language),
+        concurrency=concurrency,
+        kind="process",
+        item_timeout=getattr(http_request.state, "item_timeout", None),
+    )
+    return StreamingResponse(
+        batch_events(items, outcomes, lambda response: {"response": response}),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/speak/batch")
+async def text_to_speech_batch(request: SpeakBatchRequest, http_request: Request):
+    """
+    Synthesize many texts, streaming NDJSON lines as each finishes:
+    {"type": "result", "index", "id", "format", "audio" (base64)} or an error
+    line. Identical texts for the same voice are synthesized once.
+    """
+    items = [SpeakBatchItem(text=item) if isinstance(item, str) else item for item in request.items]
+    concurrency = batch_concurrency(items, request.concurrency)
+    for item in items:
+        item.voice = item.voice or request.voice
+
+    engine = container.tts_service.engine
+    outcomes = run_batch(
+        items,
+        key=lambda item: cache_key(item.text, item.voice, engine.model, engine.audio_format),
+        fn=lambda item: container.tts_service.text_to_speech(item.text, item.voice),
+        concurrency=concurrency,
+        kind="speak",
+        item_timeout=getattr(http_request.state, "item_timeout", None),
+    )
+
+    def render(audio: bytes) -> dict:
+        return {"format": detect_container(audio), "audio": base64.b64encode(audio).decode("ascii")}
+
+    return StreamingResponse(batch_events(items, outcomes, render), media_type="application/x-ndjson")
 
 
 @router.post("/ask", response_model=VoiceResponse)
-async def voice_ask(file: UploadFile = File(...), language: str = "auto"):
+async def voice_ask(request: Request, file: UploadFile = File(...), language: str = "auto", session_id: Optional[str] = None):
     """
-    Complete voice flow: transcribe -> process -> speak
+    Complete voice flow: transcribe -> process -> speak.
+    The session context loads while Whisper transcribes, and with `language=auto`
+    the detected language picks the system prompt and voice. Stage timings and
+    the time saved by overlapping them are in the Server-Timing header.
+    With `Accept: audio/*` the body is the raw audio and the response text is in
+    the URL-encoded X-Response-Text header.
+    The turn stops (499) when the client disconnects, when a new turn starts
+    for the same session (barge-in), or on POST /cancel with its X-Request-Id.
     """
     try:
-        session_id = str(uuid.uuid4())
+        timeline = Timeline()
+        audio_data = await read_upload(file)
+        requested = language if language != "auto" else None
+        # A new session has no history to look up
+        new_session = not session_id
+        session_id = session_id or str(uuid.uuid4())
+        rid = request_id(request)
         
-        # 1. Transcribe audio
-        audio_data = await file.read()
-        transcription = await audio_service.transcribe_audio(audio_data, language if language != "auto" else None)
-        user_text = transcription["text"]
+        # 1. Transcribe audio, fetching the session context meanwhile
+        async def transcribe():
+            with audio_data, timeline.stage("transcribe"):
+                return await container.audio_service.transcribe_audio(audio_data, requested)
         
-        # 2. Process with AI
-        response_text = await ai_service.process_query(
-            query=user_text,
-            session_id=session_id,
-            language=language if language != "auto" else "en"
-        )
+        async def load_context():
+            if new_session:
+                return []
+            with timeline.stage("context"):
+                return await session_context(session_id, requested or "en")
+        
+        async def turn():
+            transcription, history = await asyncio.gather(transcribe(), load_context())
+            user_text = transcription["text"]
+            detected = resolve_language(language, transcription.get("language"))
+            
+            # 2. Process with AI
+            with timeline.stage("llm"):
+                response_text = await container.ai_service.process_query(
+                    query=user_text,
+                    session_id=session_id,
+                    language=detected,
+                    history=history
+                )
+            save_turn(session_id, user_text, response_text, detected)
+            
+            # 3. Convert to speech
+            with timeline.stage("tts"):
+                audio = await container.tts_service.text_to_speech(response_text, container.tts_service.voice_for(detected))
+            return user_text, detected, response_text, audio
         
-        # 3. Convert to speech
-        audio_base64 = await tts_service.text_to_speech(response_text)
+        try:
+            user_text, language, response_text, audio = await cancellations.run(
+                turn(), rid, session_id, gone=lambda: client_gone(request), supersede=True,
+            )
+        finally:
+            audio_data.close()
         
-        return VoiceResponse(text=response_text, audio=audio_base64)
+        timing = timeline.report()
+        metrics.observe("ask_overlap", timing["overlap"] / 1000)
+        if wants_binary_audio(request):
+            return audio_response(request, audio, {
+                "X-Response-Text": quote(response_text),
+                "X-Transcript": quote(user_text),
+                "X-Session-Id": session_id,
+                "X-Language": language,
+                "X-Request-Id": rid,
+                "Server-Timing": timeline.server_timing(),
+            })
+        response = audio_json_response(audio, text=response_text, language=language, timing=timing)
+        response.headers["Server-Timing"] = timeline.server_timing()
+        response.headers["X-Request-Id"] = rid
+        return response
         
+    except RequestCancelled as e:
+        raise http_error(e)
     except Exception as e:
         logger.error(f"Voice ask error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+
+@router.post("/cancel")
+async def cancel_requests(request: CancelRequest):
+    """
+    Cancel in-flight work by request id (the X-Request-Id it was sent with)
+    and/or by session: its transcription, answer and speech stop at once and
+    the cancelled requests answer 499. Ids that already finished are ignored.
+    """
+    if not request.request_id and not request.session_id:
+        raise HTTPException(status_code=422, detail="request_id or session_id is required")
+    return {"cancelled": cancellations.cancel(request.request_id, request.session_id)}
+
+
+@router.get("/opener")
+async def opener_audio(request: Request, language: str = "en"):
+    """
+    Canned acknowledgement for a language, synthesized at startup; clients can
+    play it while /ask is still working
+    """
+    try:
+        audio = await container.tts_service.opener(language)
+        if wants_binary_audio(request):
+            return audio_response(request, audio)
+        return audio_json_response(audio)
+    except Exception as e:
+        logger.error(f"Opener endpoint error: {str(e)}")
+        raise http_error(e)
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters for this worker's caches and the store shared
+    by all workers, and provider calls saved by sharing identical in-flight requests
+    """
+    return {
+        "llm": container.ai_service.cache.stats(),
+        "tts": container.tts_service.cache.stats(),
+        "shared": await container.shared_store.stats(),
+        "coalescing": {"llm": container.ai_service.flights.stats(), "tts": container.tts_service.flights.stats()},
+    }
 
 
 @router.get("/history/{session_id}")
-async def get_conversation_history(session_id: str):
+async def get_conversation_history(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_PAGE),
+    before: Optional[int] = Query(None, ge=0, description="Cursor from the previous page's next_before"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of {','.join(MESSAGE_FIELDS)}"),
+):
     """
-    Get conversation history for a session
+    Get conversation history for a session, newest page first. Messages carry
+    `seq`, `id`, `role`, `content` and `ts` (epoch seconds), or only `fields`.
     """
-    # This endpoint is for future use when implementing persistent storage
-    return {"messages": [], "session_id": session_id}
+    wanted = MESSAGE_FIELDS
+    if fields:
+        wanted = tuple(name for name in MESSAGE_FIELDS if name in fields.split(","))
+        unknown = set(fields.split(",")) - set(MESSAGE_FIELDS)
+        if unknown or not wanted:
+            raise HTTPException(status_code=422, detail=f"fields must be among {','.join(MESSAGE_FIELDS)}")
+    try:
+        page = await container.conversation_store.get_history(session_id, limit=limit, before=before, fields=wanted)
+        # Encoded by orjson straight from plain dicts, without FastAPI's jsonable_encoder pass
+        with metrics.span("serialization", mode="history"):
+            response = ORJSONResponse({**page, "messages": [message.project(wanted) for message in page["messages"]]})
+        metrics.add_bytes("serialization", len(response.body), mode="history")
+        return response
+    except Exception as e:
+        logger.error(f"History endpoint error: {str(e)}")
+        raise http_error(e)
+
+
+@router.websocket("/stream")
+async def voice_stream(websocket: WebSocket):
+    """
+    Streaming voice flow over WebSocket.
+
+    Client sends an optional {"type": "start", "language", "voice", "session_id", "opener"}
+    message, binary audio chunks while recording, then {"type": "stop"}.
+    Server replies with {"type": "transcript"}, {"type": "token"} messages as the
+    model generates, and for each sentence an {"type": "audio", "index", "size"}
+    header followed by the binary audio, then {"type": "done"}. With "opener"
+    set, a pre-synthesized acknowledgement ({"type": "opener", "size"} + audio)
+    is sent as soon as the language is known. Without "voice", the language
+    picks one.
+    A "start" or "stop" while a turn is still answering (barge-in), or
+    {"type": "cancel"}, stops that turn with {"type": "cancelled", "reason"};
+    so does POST /cancel for the session, and closing the socket stops it silently.
+    """
+    await websocket.accept()
+    options = {"language": "auto", "voice": None, "opener": False, "session_id": str(uuid.uuid4())}
+    audio = bytearray()
+    oversized = False
+    turn_id = None
+    turns = set()
+    # Shared by the turns, so a header and its audio frame are never split by another message
+    send_lock = asyncio.Lock()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                # Past the limit the recording is dropped; "stop" then reports 413
+                if oversized or len(audio) + len(message["bytes"]) > MAX_UPLOAD_BYTES:
+                    oversized = True
+                    audio.clear()
+                else:
+                    audio.extend(message["bytes"])
+                continue
+
+            try:
+                event = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                event = None
+            if not isinstance(event, dict):
+                # A bad frame is the client's mistake; the session goes on
+                await _send_quietly(websocket, send_lock, {"type": "error", "detail": "Invalid control message", "status": 400})
+                continue
+            if event.get("type") in ("start", "stop", "cancel") and turn_id is not None:
+                cancellations.cancel(turn_id, reason="api" if event["type"] == "cancel" else "barge_in")
+            if event.get("type") == "start":
+                options.update({k: v for k, v in event.items() if k in options and v})
+                audio.clear()
+                oversized = False
+            elif event.get("type") == "stop":
+                # The turn runs alongside this loop, which keeps listening for a barge-in
+                turn_id = event.get("request_id") or str(uuid.uuid4())
+                recording = None if oversized else AudioBuffer.from_bytes(audio)
+                turn = asyncio.create_task(_run_turn(websocket, recording, dict(options), turn_id, send_lock))
+                turns.add(turn)
+                turn.add_done_callback(turns.discard)
+                audio.clear()
+                oversized = False
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if turn_id is not None:
+            cancellations.cancel(turn_id, reason="disconnect")
+        for turn in list(turns):
+            turn.cancel()
+        logger.info(f"Voice stream closed: {options['session_id']}")
+
+
+async def _run_turn(websocket: WebSocket, audio_data: Optional[AudioBuffer], options: dict, turn_id: str, send_lock: asyncio.Lock):
+    """One turn as cancellable work, reporting its failure or cancellation over the socket"""
+    try:
+        if audio_data is None:
+            raise UploadTooLarge(MAX_UPLOAD_BYTES)
+        with work_class("interactive", client_flow(websocket)):
+            await cancellations.run(_stream_turn(websocket, audio_data, options, send_lock), turn_id, options["session_id"], supersede=True)
+    except RequestCancelled as e:
+        if e.reason != "disconnect":
+            await _send_quietly(websocket, send_lock, {"type": "cancelled", "reason": e.reason})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Voice stream error: {str(e)}")
+        await _send_quietly(websocket, send_lock, error_event(e))
+
+
+async def _send_quietly(websocket: WebSocket, send_lock: asyncio.Lock, payload: dict):
+    """Send unless the socket has closed meanwhile"""
+    try:
+        async with send_lock:
+            await websocket.send_json(payload)
+    except Exception:
+        pass
+
+
+async def _stream_turn(websocket: WebSocket, audio_data: AudioBuffer, options: dict, send_lock: asyncio.Lock):
+    """Run one transcribe -> stream LLM -> per-sentence TTS turn over the socket"""
+
+    async def send(payload=None, data: bytes = None):
+        async with send_lock:
+            if payload is not None:
+                await websocket.send_json(payload)
+            if data is not None:
+                await websocket.send_bytes(data)
+
+    async def send_opener(language: str):
+        # Nice to have; a failure here must not fail the turn
+        try:
+            opener = await container.tts_service.opener(language, options["voice"])
+            await send({"type": "opener", "size": len(opener)}, opener)
+        except Exception as e:
+            logger.warning(f"Opener failed: {str(e)}")
+
+    requested = options["language"]
+    # The opener (when the language is known up front) and the session context
+    # are fetched while Whisper transcribes
+    opener = asyncio.create_task(send_opener(requested)) if options["opener"] and requested != "auto" else None
+    context = asyncio.create_task(session_context(options["session_id"], requested if requested != "auto" else "en"))
+    try:
+        transcription = await container.audio_service.transcribe_audio(audio_data, requested if requested != "auto" else None)
+        if opener is not None:
+            await opener
+    except BaseException:
+        context.cancel()
+        if opener is not None:
+            opener.cancel()
+        raise
+    language = resolve_language(requested, transcription.get("language"))
+    voice = options["voice"] or container.tts_service.voice_for(language)
+    await send({"type": "transcript", "text": transcription["text"], "language": language})
+    if options["opener"] and requested == "auto":
+        await send_opener(language)
+
+    # TTS runs per sentence while the model keeps generating; audio is sent in order
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def send_audio():
+        index = 0
+        while (task := await pending.get()) is not None:
+            audio_bytes = await task
+            await send({"type": "audio", "index": index, "size": len(audio_bytes)}, audio_bytes)
+            index += 1
+
+    sender = asyncio.create_task(send_audio())
+    sentences = SentenceBuffer()
+    response_text = []
+    try:
+        history = await context
+        async for token in container.ai_service.stream_query(transcription["text"], options["session_id"], language, history):
+            response_text.append(token)
+            await send({"type": "token", "text": token})
+            for sentence in sentences.feed(token):
+                pending.put_nowait(asyncio.create_task(container.tts_service.text_to_speech(sentence, voice)))
+        for sentence in sentences.flush():
+            pending.put_nowait(asyncio.create_task(container.tts_service.text_to_speech(sentence, voice)))
+        pending.put_nowait(None)
+        await sender
+    except BaseException:
+        sender.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
+        raise
+
+    save_turn(options["session_id"], transcription["text"], "".join(response_text), language)
+    await send({"type": "done", "text": "".join(response_text)})
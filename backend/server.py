@@ -1,21 +1,41 @@
-from fastapi import FastAPI, APIRouter
+from pathlib import Path
 from dotenv import load_dotenv
+
+# Before the services are imported: some of them read their settings at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from fastapi import FastAPI, APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.exceptions import HTTPException
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
+from services.container import container
+from services.metrics import metrics
+from services.profiler import profiler
+from services.resilience import deadline
+from services.scheduler import client_flow, work_class
+from services.uploads import MAX_UPLOAD_BYTES
 import os
+import time
+import asyncio
 import logging
-from pathlib import Path
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+logger = logging.getLogger(__name__)
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # MongoDB connection (Motor connects lazily, on the first operation)
+    container.attach_db(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    # Services build and warm up in the background: liveness answers at once,
+    # readiness once the provider, pools, models and openers are warm
+    warming = asyncio.create_task(container.warm_up())
+    yield
+    warming.cancel()
+    await container.close()
 
 # Create the main app
-app = FastAPI(title="SmartSpeak Voice Assistant")
+app = FastAPI(title="SmartSpeak Voice Assistant", lifespan=lifespan)
 
 # Create API router
 api_router = APIRouter(prefix="/api")
@@ -25,6 +45,30 @@ api_router = APIRouter(prefix="/api")
 async def root():
     return {"message": "SmartSpeak Voice Assistant API", "status": "online"}
 
+# Liveness: the process is up and serving. Readiness: warm-up has finished
+@api_router.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def health_ready():
+    readiness = container.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+# Metrics endpoint (Prometheus text format, or ?format=json for percentiles)
+@api_router.get("/metrics")
+async def get_metrics(format: str = "prometheus"):
+    if format == "json":
+        return metrics.snapshot()
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/metrics/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return PlainTextResponse("profile not found", status_code=404)
+    return PlainTextResponse(profile)
+
 # Import and include voice routes
 from routes.voice_routes import router as voice_router
 api_router.include_router(voice_router)
@@ -32,6 +76,92 @@ api_router.include_router(voice_router)
 # Include the router in the main app
 app.include_router(api_router)
 
+class BodySizeLimit:
+    """
+    Refuse request bodies over max_bytes before the multipart parser spools
+    them: up front from Content-Length, and for a chunked body without one by
+    counting its bytes as they are received (the read that crosses the limit
+    fails with 413).
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.detail = f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await JSONResponse({"detail": self.detail}, status_code=413)(scope, receive, send)
+        received = 0
+
+        async def counted():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, counted, send)
+
+# Added first, so it sits innermost: a 413 raised from receive() reaches the
+# endpoint as is, not wrapped by the other middlewares' task groups.
+# 64 KB of slack covers the multipart framing around the file
+app.add_middleware(BodySizeLimit, max_bytes=MAX_UPLOAD_BYTES + 64 * 1024)
+
+# Per-route latency, plus an opt-in sampling profile (PROFILING_ENABLED=1 and X-Profile: 1)
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    session = None
+    if profiler.enabled and request.headers.get("x-profile") == "1":
+        session = profiler.start()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        endpoint = request.scope.get("endpoint")
+        route = endpoint.__name__ if endpoint else "unmatched"
+        metrics.observe("request", time.perf_counter() - start, route=route)
+        if session is not None:
+            profile_id = profiler.finish(session)
+    if session is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+# Provider calls made for a request share its deadline: X-Request-Timeout (seconds) or REQUEST_TIMEOUT.
+# A batch stream may rightly outlast it, so batch endpoints apply it to each item instead (run_batch)
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", "120"))
+
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    try:
+        seconds = float(request.headers.get("x-request-timeout", REQUEST_TIMEOUT))
+    except ValueError:
+        seconds = REQUEST_TIMEOUT
+    if request.url.path.endswith("/batch"):
+        request.state.item_timeout = seconds if seconds > 0 else None
+        return await call_next(request)
+    with deadline(seconds if seconds > 0 else None):
+        return await call_next(request)
+
+# Provider calls queue by class: batch endpoints (or X-Priority: batch, for a
+# client marking its own background work) behind interactive requests, and
+# fairly between clients (X-Client-Id, else the peer address) within a class.
+# SCHEDULER_ENABLED=0 leaves every call in one FIFO queue
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") != "0"
+
+@app.middleware("http")
+async def request_class(request: Request, call_next):
+    if not SCHEDULER_ENABLED:
+        return await call_next(request)
+    batch = request.url.path.endswith("/batch") or request.headers.get("x-priority") == "batch"
+    with work_class("batch" if batch else "interactive", client_flow(request)):
+        return await call_next(request)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +169,8 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    # The audio-only /ask answer carries its text in headers the frontend's HTTP fallback reads
+    expose_headers=["X-Transcript", "X-Response-Text"],
 )
 
 # Configure logging
@@ -46,10 +178,4 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-
 logger.info("SmartSpeak Voice Assistant started successfully")
@@ -1,51 +1,129 @@
-"""AI processing service using GPT"""
+"""AI processing service over the configured LLM engine"""
 import os
+import json
+import time
+import hashlib
 import logging
-from openai import OpenAI
+from typing import AsyncIterator, List, Dict, Optional
+from services.engines import create_engine
+from services.response_cache import ResponseCache
+from services.shared_store import get_store
+from services.single_flight import SingleFlight
+from services.resilience import ProviderError
+from services.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 class AIService:
-    """Handles intelligent query processing"""
+    """Handles intelligent query processing with the configured LLM engine (LLM_ENGINE)"""
     
     def __init__(self):
-        self.api_key = os.getenv("EMERGENT_LLM_KEY") or os.getenv("OPENAI_API_KEY")
-        self.client = None
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-            logger.info("AIService: OpenAI GPT client initialized")
-        else:
-            logger.warning("AIService: No API key - using mock mode")
-    
-    async def process_query(self, query: str, session_id: str, language: str = "en") -> str:
-        """Process user query"""
-        if not self.client:
-            # MOCK MODE
-            logger.info(f"AI MOCK: {query[:30]}...")
-            mock_responses = {
-                "en": "Docker containers package apps with dependencies. Microservices = independent services via API.",
-                "he": "[translate:קונטיינרים של Docker מארזים אפליקציות עם תלויות. מיקרו-שירותים = שירותים עצמאיים דרך API. ]"
-            }
-            return mock_responses.get(language, mock_responses["en"])
+        self.engine = create_engine("llm")
+        # LLM_CACHE_SIMILARITY (e.g. 0.85) also serves near-duplicate wordings
+        similarity = os.getenv("LLM_CACHE_SIMILARITY")
+        self.cache = ResponseCache(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            similarity=float(similarity) if similarity else None,
+        )
+        # Behind the in-process cache: exact-match answers shared by every worker
+        self.shared = get_store()
+        self.shared.limit("llm", max_entries=int(os.getenv("LLM_CACHE_SHARED_SIZE", "10000")))
+        # Identical requests already in flight share one upstream call
+        self.flights = SingleFlight("llm")
+    
+    def _build_messages(self, query: str, language: str, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Build the chat messages for a query, after any prior session turns"""
+        system_message = (
+            "You are SmartSpeak, a technical voice assistant expert in programming, architecture, cloud, and cybersecurity."
+            if language == "en" else
+            "[translate:אתה SmartSpeak, עוזר קולי מומחה בתכנות, ארכיטקטורה, ענן ואבטחת מידע.]"
+        )
+        return [
+            {"role": "system", "content": system_message},
+            *(history or []),
+            {"role": "user", "content": query}
+        ]
+    
+    async def process_query(self, query: str, session_id: str, language: str = "en", history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Process user query, optionally with the session's recent turns as context"""
+        messages = self._build_messages(query, language, history)
+        # Answers that depend on earlier turns are not reusable across sessions
+        cached = None if history else self.cache.get(query, language, messages[0]["content"])
+        if cached is not None:
+            return cached
         
-        # REAL OpenAI GPT
+        key = hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return await self.flights.do(key, lambda: self._complete(messages, query, language, history))
+    
+    async def _complete(self, messages: List[Dict[str, str]], query: str, language: str, history: Optional[List[Dict[str, str]]]) -> str:
+        """One chat completion; runs once per distinct in-flight prompt, and once across workers when cacheable"""
         try:
-            system_message = (
-                "You are SmartSpeak, a technical voice assistant expert in programming, architecture, cloud, and cybersecurity."
-                if language == "en" else
-                "[translate:אתה SmartSpeak, עוזר קולי מומחה בתכנות, ארכיטקטורה, ענן ואבטחת מידע.]"
-            )
-            
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",  # or gpt-5.1 later
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": query}
-                ],
-                max_tokens=300
-            )
-            
-            return response.choices[0].message.content
+            if history:
+                return (await self._generate(messages))["response"]
+            system_prompt = messages[0]["content"]
+            entry = json.loads(await self.shared.get_or_compute(
+                "llm",
+                self.cache.key(query, language, system_prompt),
+                lambda: self._generate_encoded(messages),
+                ttl=self.cache.ttl_seconds,
+            ))
+            self.cache.put(query, language, system_prompt, entry["response"], entry["latency"])
+            return entry["response"]
+        except ProviderError:
+            raise
         except Exception as e:
-            logger.error(f"GPT failed: {str(e)}")
+            logger.error(f"LLM failed: {str(e)}")
             raise Exception(f"AI processing failed: {str(e)}")
+    
+    async def _generate(self, messages: List[Dict[str, str]]) -> Dict:
+        start = time.perf_counter()
+        content = await self.engine.complete(messages, max_tokens=300)
+        metrics.add_bytes("llm", len(content.encode("utf-8")))
+        return {"response": content, "latency": time.perf_counter() - start}
+    
+    async def _generate_encoded(self, messages: List[Dict[str, str]]) -> bytes:
+        return json.dumps(await self._generate(messages), ensure_ascii=False).encode("utf-8")
+    
+    async def stream_query(self, query: str, session_id: str, language: str = "en", history: Optional[List[Dict[str, str]]] = None) -> AsyncIterator[str]:
+        """Process user query, yielding response text as the model generates it"""
+        messages = self._build_messages(query, language, history)
+        cached = None if history else self.cache.get(query, language, messages[0]["content"])
+        if cached is None and not history:
+            # A stream cannot be shared while it runs, but another worker's finished answer can
+            shared = await self.shared.get("llm", self.cache.key(query, language, messages[0]["content"]))
+            cached = json.loads(shared)["response"] if shared is not None else None
+        if cached is not None:
+            yield cached
+            return
+        
+        try:
+            start = time.perf_counter()
+            parts = []
+            async for token in self.engine.stream(messages, max_tokens=300):
+                if not parts:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                parts.append(token)
+                yield token
+            content = "".join(parts)
+            metrics.add_bytes("llm", len(content.encode("utf-8")))
+            if not history:
+                latency = time.perf_counter() - start
+                self.cache.put(query, language, messages[0]["content"], content, latency)
+                entry = json.dumps({"response": content, "latency": latency}, ensure_ascii=False).encode("utf-8")
+                await self.shared.set("llm", self.cache.key(query, language, messages[0]["content"]), entry, ttl=self.cache.ttl_seconds)
+        except ProviderError:
+            raise
+        except Exception as e:
+            logger.error(f"LLM stream failed: {str(e)}")
+            raise Exception(f"AI processing failed: {str(e)}")
+    
+    async def summarize(self, summary: str, messages: List[Dict[str, str]], language: str = "en", max_tokens: int = 300) -> str:
+        """Fold messages into an existing conversation summary"""
+        try:
+            return await self.engine.summarize(summary, messages, language, max_tokens)
+        except ProviderError:
+            raise
+        except Exception as e:
+            logger.error(f"Summary failed: {str(e)}")
+            raise Exception(f"Summary failed: {str(e)}")
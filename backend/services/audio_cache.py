@@ -0,0 +1,66 @@
+"""Content-addressed audio cache: the in-process LRU in front of the shared store"""
+import re
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different inputs share an entry"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(text: str, voice: str, model: str, audio_format: str) -> str:
+    """Hash of everything that determines the synthesized audio"""
+    payload = "\x1f".join([normalize_text(text), voice, model, audio_format])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Size-bounded LRU in memory. Audio that survives restarts and is seen by
+    every worker lives in the shared store behind it (services/shared_store.py).
+    """
+
+    def __init__(self, max_memory_bytes: int):
+        self.max_memory_bytes = max_memory_bytes
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.counters = {
+            "memory_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+        }
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio or None"""
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return data
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """Keep audio unless it alone exceeds the budget"""
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.counters["memory_evictions"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus the current size"""
+        lookups = self.counters["memory_hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(self.counters["memory_hits"] / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+        }
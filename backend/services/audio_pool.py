@@ -0,0 +1,248 @@
+"""Process pool for CPU-bound audio work, with buffers handed over in shared memory"""
+import io
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple, Union
+
+from services.audio_preprocessor import PreparedAudio, prepare_segments
+from services.uploads import AudioBuffer
+from services.metrics import metrics
+from services.resilience import AdaptiveLimit, DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+# How a buffer crosses the process boundary: ("path", path, size) for a spool
+# file, ("shm", name, size) for a shared memory block, ("bytes", data, size)
+# when a block could not be created (e.g. /dev/shm is full) and pickling is the fallback
+Handoff = Tuple[str, Union[str, bytes], int]
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable file object over a memoryview, reading without copying the whole view"""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = max(min(len(buffer), len(self.view) - self.position), 0)
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: len(self.view)}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+class SharedAudio(AudioBuffer):
+    """
+    Audio in a shared memory block, read in place through a memoryview by
+    whichever process attaches to it. close() frees the block for good.
+    """
+
+    def __init__(self, block: SharedMemory, size: int):
+        super().__init__(size=size)
+        self.block = block
+        self.data = block.buf[:size]
+
+    @classmethod
+    def create(cls, data) -> "SharedAudio":
+        block = SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        return cls(block, len(data))
+
+    @classmethod
+    def load(cls, source: AudioBuffer) -> "SharedAudio":
+        """A copy of `source`, read straight into a new block"""
+        shared = cls(SharedMemory(create=True, size=max(len(source), 1)), len(source))
+        try:
+            filled = 0
+            with source.open() as f:
+                while filled < len(source):
+                    count = f.readinto(shared.data[filled:])
+                    if not count:
+                        raise OSError("upload shorter than its size")
+                    filled += count
+        except BaseException:
+            shared.close()
+            raise
+        return shared
+
+    @classmethod
+    def attach(cls, name: str, size: int) -> "SharedAudio":
+        return cls(SharedMemory(name=name), size)
+
+    def head(self, count: int = 16) -> bytes:
+        return bytes(self.data[:count])
+
+    def open(self) -> io.RawIOBase:
+        return MemoryReader(self.data)
+
+    def detach(self):
+        """Drop this process's mapping, leaving the block for its owner"""
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+            self.block.close()
+
+    def close(self):
+        if self.data is not None:
+            self.detach()
+            self.block.unlink()
+
+
+def _receive(handoff: Handoff) -> AudioBuffer:
+    kind, value, size = handoff
+    if kind == "path":
+        return AudioBuffer(path=value, size=size)
+    if kind == "shm":
+        return SharedAudio.attach(value, size)
+    return AudioBuffer(data=value)
+
+
+def _prepare(handoff: Handoff, segment_seconds: Optional[float], overlap_seconds: float) -> List[PreparedAudio]:
+    """
+    Runs in a pool worker. Encoded segments go back in new shared memory
+    blocks, owned from then on by the caller; a segment that is the upload
+    itself goes back with data=None, as the caller already has it.
+    """
+    source = _receive(handoff)
+    try:
+        segments = prepare_segments(source, segment_seconds, overlap_seconds)
+        for segment in segments:
+            if segment.data is source:
+                segment.data = None
+            else:
+                shared = SharedAudio.create(segment.data)
+                segment.data = ("shm", shared.block.name, len(shared))
+                shared.detach()
+        return segments
+    finally:
+        if isinstance(source, SharedAudio):
+            source.detach()
+
+
+def _warm(hold: float) -> int:
+    """Runs in a pool worker: importing this module already loaded numpy and PyAV"""
+    # Held briefly so that each warm-up job lands on a different worker
+    time.sleep(hold)
+    return os.getpid()
+
+
+def _discard(segments: List[PreparedAudio]):
+    """Free the blocks of a result nobody will read"""
+    for segment in segments:
+        if isinstance(segment.data, tuple):
+            SharedAudio.attach(*segment.data[1:]).close()
+
+
+class AudioPool:
+    """
+    Spawned worker processes (AUDIO_POOL_WORKERS, default one per core) for
+    decode, resample, VAD and encode, so they neither hold the event loop nor
+    share one GIL. At most one job per worker is handed over at a time; up to
+    AUDIO_POOL_QUEUE more wait here, and past that callers get Overloaded (503).
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.workers = workers if workers is not None else int(os.getenv("AUDIO_POOL_WORKERS", str(os.cpu_count() or 1)))
+        max_queue = max_queue if max_queue is not None else int(os.getenv("AUDIO_POOL_QUEUE", "64"))
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if self.workers > 0:
+            # spawn: forking a process that runs an event loop and threads is not safe
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # A fixed limit (no successes or overloads are reported), used for its bounded, priority-ordered queue
+        self.limit = AdaptiveLimit(max(self.workers, 1), maximum=max(self.workers, 1), max_queue=max_queue)
+        metrics.register_collector(self._gauges)
+
+    async def prepare_segments(self, data: Union[bytes, AudioBuffer], segment_seconds: Optional[float] = None, overlap_seconds: float = 1.0) -> List[PreparedAudio]:
+        """prepare_segments() in a worker; release the result with PreparedAudio.close()"""
+        if self.executor is None:
+            return await asyncio.to_thread(prepare_segments, data, segment_seconds, overlap_seconds)
+
+        source = data if isinstance(data, AudioBuffer) else AudioBuffer.from_bytes(data)
+        start = time.perf_counter()
+        try:
+            await self.limit.acquire(remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("deadline exceeded waiting for the audio pool")
+        metrics.observe("audio_pool_wait", time.perf_counter() - start)
+        shared = None
+        try:
+            if source.path is not None:
+                handoff = ("path", source.path, len(source))
+            else:
+                # An upload held by descriptor (still in the multipart spool file) is copied into the block
+                try:
+                    shared = SharedAudio.create(source.data) if source.data is not None else SharedAudio.load(source)
+                    handoff = ("shm", shared.block.name, len(shared))
+                except OSError as e:
+                    logger.warning(f"Audio pool: no shared memory ({str(e)}); pickling the upload")
+                    handoff = ("bytes", source.read(), len(source))
+            job: Future = self.executor.submit(_prepare, handoff, segment_seconds, overlap_seconds)
+            try:
+                segments = await asyncio.wrap_future(job)
+            except asyncio.CancelledError:
+                # The worker may still finish; its blocks must not outlive it
+                job.add_done_callback(lambda done: done.cancelled() or done.exception() or _discard(done.result()))
+                raise
+        finally:
+            if shared is not None:
+                shared.close()
+            self.limit.release()
+
+        for segment in segments:
+            segment.data = source if segment.data is None else SharedAudio.attach(*segment.data[1:])
+        return segments
+
+    async def warm(self):
+        """Spawn every worker ahead of the first upload"""
+        if self.executor is not None:
+            await asyncio.gather(*(asyncio.wrap_future(self.executor.submit(_warm, 0.2)) for _ in range(self.workers)))
+
+    def _gauges(self) -> dict:
+        return {
+            "audio_pool_workers": self.workers,
+            "audio_pool_inflight": self.limit.inflight,
+            "audio_pool_queued": len(self.limit.waiters),
+        }
+
+    def close(self):
+        metrics.collectors.remove(self._gauges)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[AudioPool] = None
+
+
+def get_audio_pool() -> AudioPool:
+    """Return the process-wide audio pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = AudioPool()
+    return _pool
+
+
+def close_audio_pool():
+    """Shut down the process-wide audio pool if one was created"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -0,0 +1,240 @@
+"""Audio normalization before upload: decode, mono 16 kHz, trim silence, re-encode"""
+import os
+import wave
+import logging
+from io import BytesIO
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import numpy as np
+
+from services.uploads import AudioBuffer, detect_container
+
+logger = logging.getLogger(__name__)
+
+try:
+    import av
+except ImportError:  # without PyAV only WAV uploads can be decoded
+    av = None
+
+TARGET_RATE = 16000
+FRAME_MS = 30
+# Keep a little audio around detected speech so word edges are not clipped
+PAD_MS = 200
+
+
+@dataclass
+class PreparedAudio:
+    """Audio ready for Whisper plus what preprocessing did to it"""
+    data: Union[bytes, AudioBuffer]  # the upload itself when it is sent unchanged
+    container: str
+    original_bytes: int
+    duration: float = 0.0
+    trimmed_seconds: float = 0.0
+    offset: float = 0.0  # start within the trimmed recording, for segments
+    processed: bool = False
+    notes: list = field(default_factory=list)
+
+    @property
+    def filename(self) -> str:
+        return f"audio.{self.container}"
+
+    def open(self) -> BinaryIO:
+        """A reader over the audio that does not copy it"""
+        return self.data.open() if isinstance(self.data, AudioBuffer) else BytesIO(self.data)
+
+    def close(self):
+        """Free processed audio held outside the heap (shared memory from the audio pool)"""
+        if self.processed and isinstance(self.data, AudioBuffer):
+            self.data.close()
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def report(self) -> dict:
+        return {
+            "container": self.container,
+            "original_bytes": self.original_bytes,
+            "sent_bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "duration": round(self.duration, 3),
+            "trimmed_seconds": round(self.trimmed_seconds, 3),
+        }
+
+
+def _resample(samples: np.ndarray, rate: int) -> np.ndarray:
+    """Linear-interpolation resample to TARGET_RATE (speech only needs this much)"""
+    if rate == TARGET_RATE or samples.size == 0:
+        return samples
+    duration = samples.size / rate
+    target = np.linspace(0, duration, int(duration * TARGET_RATE), endpoint=False)
+    return np.interp(target, np.arange(samples.size) / rate, samples).astype(np.float32)
+
+
+def _decode_wav(source: AudioBuffer) -> np.ndarray:
+    with source.open() as f, wave.open(f) as wav:
+        width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"unsupported WAV sample width {width}")
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    return _resample(samples, rate)
+
+
+def _decode_av(source: AudioBuffer) -> np.ndarray:
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=TARGET_RATE)
+    chunks = []
+    # A spooled upload is decoded straight from its file
+    with av.open(source.path if source.path is not None else source.open()) as container:
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):
+            chunks.append(out.to_ndarray().reshape(-1))
+    return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def decode(source: AudioBuffer, container: Optional[str]) -> np.ndarray:
+    """Decode to mono float32 samples at TARGET_RATE"""
+    if container == "wav":
+        try:
+            return _decode_wav(source)
+        except (wave.Error, ValueError):
+            pass  # e.g. float or extensible WAV; let PyAV try
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+    return _decode_av(source)
+
+
+def speech_bounds(samples: np.ndarray, threshold_db: float = -35.0, floor_db: float = -55.0) -> Tuple[int, int]:
+    """
+    Energy VAD: sample range from the first to the last frame whose RMS is within
+    threshold_db of the loudest frame (and above the absolute floor_db).
+    """
+    frame = TARGET_RATE * FRAME_MS // 1000
+    count = samples.size // frame
+    if count == 0:
+        return 0, samples.size
+    rms = np.sqrt(np.mean(samples[:count * frame].reshape(count, frame) ** 2, axis=1) + 1e-12)
+    threshold = max(rms.max() * 10 ** (threshold_db / 20), 10 ** (floor_db / 20))
+    voiced = np.flatnonzero(rms >= threshold)
+    if voiced.size == 0:
+        return 0, 0
+    pad = TARGET_RATE * PAD_MS // 1000
+    return max(voiced[0] * frame - pad, 0), min((voiced[-1] + 1) * frame + pad, samples.size)
+
+
+def encode(samples: np.ndarray) -> Tuple[bytes, str]:
+    """Encode mono TARGET_RATE samples compactly: Ogg/Opus with PyAV, else 16-bit WAV"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    if av is not None:
+        buffer = BytesIO()
+        with av.open(buffer, "w", format="ogg") as container:
+            stream = container.add_stream("libopus", rate=TARGET_RATE)
+            stream.bit_rate = int(os.getenv("AUDIO_OPUS_BITRATE", "24000"))
+            stream.layout = "mono"
+            frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+            frame.rate = TARGET_RATE
+            for packet in stream.encode(frame):
+                container.mux(packet)
+            for packet in stream.encode(None):
+                container.mux(packet)
+        return buffer.getvalue(), "ogg"
+
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(TARGET_RATE)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue(), "wav"
+
+
+def split_points(samples: np.ndarray, segment_seconds: float, overlap_seconds: float) -> List[Tuple[int, int]]:
+    """
+    Sample ranges of at most segment_seconds (plus overlap), cut at the quietest
+    frame in the last quarter of each segment so cuts land in pauses, not words.
+    """
+    # At least one frame per segment, so every cut moves start forwards
+    segment = max(int(segment_seconds * TARGET_RATE), TARGET_RATE * FRAME_MS // 1000)
+    half_overlap = int(overlap_seconds * TARGET_RATE / 2)
+    frame = TARGET_RATE * FRAME_MS // 1000
+    ranges, start = [], 0
+    while samples.size - start > segment:
+        search_from = start + segment - segment // 4
+        window = samples[search_from:start + segment]
+        count = window.size // frame
+        if count:
+            energy = np.mean(window[:count * frame].reshape(count, frame) ** 2, axis=1)
+            cut = search_from + int(np.argmin(energy)) * frame + frame // 2
+        else:
+            cut = start + segment
+        ranges.append((max(start - half_overlap, 0), cut + half_overlap))
+        start = cut
+    ranges.append((max(start - half_overlap, 0), samples.size))
+    return ranges
+
+
+def prepare_segments(data: Union[bytes, AudioBuffer], segment_seconds: Optional[float] = None, overlap_seconds: float = 1.0) -> List[PreparedAudio]:
+    """
+    Normalize an upload for transcription, split into overlapping segments when it
+    is longer than segment_seconds. Falls back to the original upload (with the
+    detected container name) whenever processing does not help.
+    """
+    source = data if isinstance(data, AudioBuffer) else AudioBuffer.from_bytes(data)
+    container = detect_container(source.head()) or "webm"
+    original = PreparedAudio(data=source, container=container, original_bytes=len(source))
+    try:
+        samples = decode(source, container)
+    except Exception as e:
+        original.notes.append(f"not decoded: {str(e)}")
+        return [original]
+
+    start, end = speech_bounds(samples, float(os.getenv("AUDIO_VAD_THRESHOLD_DB", "-35")))
+    original.duration = samples.size / TARGET_RATE
+    if end - start < TARGET_RATE // 10:
+        # No speech found (or under 0.1s); let Whisper see the original
+        original.notes.append("no speech detected")
+        return [original]
+
+    trimmed = samples[start:end]
+    trimmed_seconds = (samples.size - trimmed.size) / TARGET_RATE
+    if segment_seconds and trimmed.size > segment_seconds * TARGET_RATE:
+        segments = []
+        for seg_start, seg_end in split_points(trimmed, segment_seconds, overlap_seconds):
+            encoded, encoded_container = encode(trimmed[seg_start:seg_end])
+            segments.append(PreparedAudio(
+                data=encoded,
+                container=encoded_container,
+                original_bytes=len(data),
+                duration=(seg_end - seg_start) / TARGET_RATE,
+                trimmed_seconds=trimmed_seconds,
+                offset=seg_start / TARGET_RATE,
+                processed=True,
+            ))
+        return segments
+
+    encoded, encoded_container = encode(trimmed)
+    if len(encoded) >= len(data):
+        original.notes.append("re-encoding did not shrink the upload")
+        return [original]
+    return [PreparedAudio(
+        data=encoded,
+        container=encoded_container,
+        original_bytes=len(data),
+        duration=trimmed.size / TARGET_RATE,
+        trimmed_seconds=trimmed_seconds,
+        processed=True,
+    )]
+
+
+def prepare_audio(data: Union[bytes, AudioBuffer]) -> PreparedAudio:
+    """Normalize an upload for transcription as a single file"""
+    return prepare_segments(data)[0]
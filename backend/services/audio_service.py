@@ -1,56 +1,136 @@
-"""Speech-to-Text service using OpenAI Whisper"""
+"""Speech-to-Text service: preprocessing, segmenting and stitching around an STT engine"""
 import os
+import re
+import asyncio
 import logging
-from io import BytesIO
-from typing import Dict, Any
-from openai import OpenAI
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
+from services.engines import create_engine
+from services.audio_preprocessor import detect_container, PreparedAudio
+from services.audio_pool import get_audio_pool
+from services.uploads import AudioBuffer
+from services.metrics import metrics
+from services.resilience import ProviderError
 
 logger = logging.getLogger(__name__)
 
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word.casefold()) for word in text.split()]
+
+
+def merge_overlap(previous: str, following: str, max_words: int = 20, max_skip: int = 5) -> str:
+    """
+    Drop the start of `following` that repeats the end of `previous` (the audio
+    overlap was transcribed twice). Matches on casefolded words without punctuation.
+    """
+    prev_words, next_raw = _words(previous), following.split()
+    next_words = _words(following)
+    for size in range(min(max_words, len(prev_words), len(next_words)), 0, -1):
+        tail = prev_words[-size:]
+        # A single shared word is only trusted right at the start
+        for skip in range(min(max_skip if size > 1 else 0, len(next_words) - size) + 1):
+            if next_words[skip:skip + size] == tail:
+                return " ".join(next_raw[skip + size:])
+    return following
+
+
 class AudioService:
-    """Handles audio transcription using Whisper"""
+    """Handles audio transcription with the configured STT engine (STT_ENGINE)"""
     
     def __init__(self):
-        self.api_key = os.getenv("EMERGENT_LLM_KEY") or os.getenv("OPENAI_API_KEY")
-        self.client = None
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-            logger.info("AudioService: OpenAI Whisper client initialized")
-        else:
-            logger.warning("AudioService: No API key - using mock mode")
+        self.engine = create_engine("stt")
+        self.preprocess = os.getenv("AUDIO_PREPROCESS", "1") != "0"
+        # Recordings longer than this are split and transcribed in parallel
+        self.segment_seconds = float(os.getenv("AUDIO_SEGMENT_SECONDS", "60"))
+        self.segment_overlap = float(os.getenv("AUDIO_SEGMENT_OVERLAP", "1.0"))
+        if self.segment_seconds <= 0 or not 0 <= self.segment_overlap < self.segment_seconds:
+            raise ValueError(
+                f"AUDIO_SEGMENT_SECONDS must be positive and AUDIO_SEGMENT_OVERLAP in [0, it); "
+                f"got {self.segment_seconds} and {self.segment_overlap}"
+            )
+        self.segment_concurrency = int(os.getenv("AUDIO_SEGMENT_CONCURRENCY", "4"))
     
-    async def transcribe_audio(self, audio_data: bytes, language: str = None) -> dict:
+    async def transcribe_audio(self, audio_data: Union[bytes, AudioBuffer], language: str = None) -> dict:
         """Transcribe audio to text"""
-        if not self.client:
-            # MOCK MODE - Demo responses
-            logger.info("AudioService MOCK: Transcribing...")
-            mock_texts = {
-                "en": "What is Docker? Demo transcription.",
-                "he": "[translate:מה זה Docker? תמלול לדוגמה.]",
-                None: "Explain REST API."
-            }
-            return {
-                "text": mock_texts.get(language, mock_texts["en"]),
-                "language": language or "auto"
-            }
+        result = None
+        async for event in self.transcribe_stream(audio_data, language):
+            result = event
+        result.pop("type")
+        return result
+    
+    async def transcribe_stream(self, audio_data: Union[bytes, AudioBuffer], language: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Transcribe audio, yielding {"type": "segment"} as each segment finishes,
+        {"type": "partial"} whenever the in-order transcript grows, then {"type": "final"}
+        """
+        if self.preprocess and self.engine.preprocess:
+            # Decoding and encoding are CPU-bound; they run in the audio process pool
+            with metrics.span("audio_preprocess"):
+                segments = await get_audio_pool().prepare_segments(
+                    audio_data, self.segment_seconds, self.segment_overlap
+                )
+            metrics.inc("audio_bytes_saved_total", len(audio_data) - sum(len(segment.data) for segment in segments))
+        else:
+            source = audio_data if isinstance(audio_data, AudioBuffer) else AudioBuffer.from_bytes(audio_data)
+            container = detect_container(source.head()) or "webm"
+            segments = [PreparedAudio(data=source, container=container, original_bytes=len(source))]
+        
+        limit = asyncio.Semaphore(self.segment_concurrency)
         
-        # REAL OpenAI Whisper
+        async def transcribe(index: int, segment: PreparedAudio):
+            async with limit:
+                return index, await self._transcribe_file(segment, language)
+        
+        tasks = [asyncio.create_task(transcribe(i, segment)) for i, segment in enumerate(segments)]
+        texts: List[Optional[str]] = [None] * len(segments)
+        detected = language or "auto"
+        stitched, done = "", 0
         try:
-            audio_file = BytesIO(audio_data)
-            audio_file.name = "audio.webm"
-            
-            response = await self.client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                response_format="json",
-                language=language
-            )
-            
-            logger.info(f"Whisper transcription: {response.text[:50]}...")
-            return {
-                "text": response.text,
-                "language": getattr(response, 'language', language or "auto")
-            }
+            for next_done in asyncio.as_completed(tasks):
+                index, response = await next_done
+                texts[index] = response["text"]
+                if index == 0:
+                    detected = response["language"]
+                yield {
+                    "type": "segment",
+                    "index": index,
+                    "count": len(segments),
+                    "start": round(segments[index].offset, 3),
+                    "text": response["text"],
+                }
+                # Extend the transcript with every segment now available in order
+                grown = False
+                while done < len(texts) and texts[done] is not None:
+                    piece = merge_overlap(stitched, texts[done]) if stitched else texts[done]
+                    stitched = f"{stitched} {piece}".strip()
+                    done += 1
+                    grown = True
+                if grown and len(segments) > 1:
+                    yield {"type": "partial", "text": stitched}
+        finally:
+            for task in tasks:
+                task.cancel()
+            for segment in segments:
+                segment.close()
+        
+        sent = sum(len(segment.data) for segment in segments)
+        report = {
+            **segments[0].report(),
+            "sent_bytes": sent,
+            "bytes_saved": segments[0].original_bytes - sent,
+            "duration": round(sum(segment.duration for segment in segments), 3),
+            "segments": len(segments),
+        }
+        logger.info(f"Transcription ({self.engine.name}): {stitched[:50]}... audio={report}")
+        yield {"type": "final", "text": stitched, "language": detected, "audio": report}
+    
+    async def _transcribe_file(self, prepared: PreparedAudio, language: str = None) -> dict:
+        """Single engine request"""
+        try:
+            metrics.add_bytes("transcription", len(prepared.data))
+            return await self.engine.transcribe(prepared, language)
+        except ProviderError:
+            raise
         except Exception as e:
-            logger.error(f"Whisper failed: {str(e)}")
+            logger.error(f"Transcription failed: {str(e)}")
             raise Exception(f"Transcription failed: {str(e)}")
@@ -0,0 +1,58 @@
+"""Batch execution: duplicate items run once, on a bounded set of workers, results in completion order"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, TypeVar
+from services.metrics import metrics
+from services.resilience import deadline
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_batch(
+    items: Sequence[T],
+    key: Callable[[T], Hashable],
+    fn: Callable[[T], Awaitable[R]],
+    concurrency: int,
+    kind: str = "batch",
+    item_timeout: Optional[float] = None,
+) -> AsyncIterator[Tuple[List[int], Optional[R], Optional[Exception]]]:
+    """
+    Run fn once per distinct key, at most `concurrency` at a time, yielding
+    (indices of every item with that key, result, error) as each finishes.
+    Workers pull the next item only when free, so a large batch never queues
+    more calls on the provider than it can take. Each call has its own
+    deadline of item_timeout seconds, counted from when a worker starts it.
+    Closing the iterator (e.g. on client disconnect) cancels the calls still
+    running.
+    """
+    groups: Dict[Hashable, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(key(item), []).append(index)
+    metrics.inc("batch_items_total", len(items), kind=kind)
+    metrics.inc("batch_deduplicated_total", len(items) - len(groups), kind=kind)
+
+    pending = iter(groups.values())
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        for indices in pending:
+            try:
+                with deadline(item_timeout):
+                    result = await fn(items[indices[0]])
+                done.put_nowait((indices, result, None))
+            except Exception as e:
+                done.put_nowait((indices, None, e))
+        done.put_nowait(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(groups))))]
+    try:
+        running = len(workers)
+        while running:
+            outcome = await done.get()
+            if outcome is None:
+                running -= 1
+            else:
+                yield outcome
+    finally:
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,98 @@
+"""Cancellation of in-flight requests: on client disconnect, barge-in, or an explicit cancel"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestCancelled(Exception):
+    """The request's work was cancelled before it finished; routes answer 499"""
+    status_code = 499
+
+    def __init__(self, reason: str):
+        super().__init__(f"request cancelled ({reason})")
+        self.reason = reason
+
+
+@dataclass
+class _Running:
+    task: asyncio.Task
+    request_id: str
+    session_id: Optional[str]
+    started: float
+    reason: Optional[str] = None
+
+
+class CancelRegistry:
+    """
+    Requests whose work can be cancelled, by request id or by session id.
+    Cancelling one cancels its task, and with it every await down the chain:
+    queued provider calls leave the queue, upstream HTTP requests and streams
+    are closed and their slots released at once.
+    """
+
+    def __init__(self):
+        self.running: Dict[str, _Running] = {}
+
+    async def run(
+        self,
+        work: Awaitable[T],
+        request_id: str,
+        session_id: Optional[str] = None,
+        gone: Optional[Callable[[], Awaitable[None]]] = None,
+        supersede: bool = False,
+    ) -> T:
+        """
+        Await `work` as a cancellable task; raises RequestCancelled if it is
+        cancelled. `gone` returns once the client has disconnected, which
+        cancels it; with `supersede`, starting it cancels the session's
+        earlier work (the user barged in with a new turn).
+        """
+        if supersede and session_id:
+            self.cancel(session_id=session_id, reason="barge_in")
+        self.cancel(request_id=request_id, reason="replaced")
+        entry = _Running(asyncio.ensure_future(work), request_id, session_id, time.monotonic())
+        self.running[request_id] = entry
+        watcher = asyncio.create_task(self._watch(entry, gone)) if gone is not None else None
+        try:
+            return await entry.task
+        except asyncio.CancelledError:
+            if entry.reason is not None and not asyncio.current_task().cancelling():
+                raise RequestCancelled(entry.reason) from None
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if self.running.get(request_id) is entry:
+                del self.running[request_id]
+
+    async def _watch(self, entry: _Running, gone: Callable[[], Awaitable[None]]):
+        await gone()
+        self._cancel(entry, "disconnect")
+
+    def cancel(self, request_id: Optional[str] = None, session_id: Optional[str] = None, reason: str = "api") -> List[str]:
+        """Cancel the request with this id and/or every request of this session; returns the ids cancelled"""
+        entries = [
+            entry for entry in list(self.running.values())
+            if entry.request_id == request_id or (session_id is not None and entry.session_id == session_id)
+        ]
+        return [entry.request_id for entry in entries if self._cancel(entry, reason)]
+
+    def _cancel(self, entry: _Running, reason: str) -> bool:
+        if entry.task.done() or entry.reason is not None:
+            return False
+        entry.reason = reason
+        entry.task.cancel()
+        metrics.inc("requests_cancelled_total", reason=reason)
+        logger.info(f"Cancelled request {entry.request_id} ({reason}) after {time.monotonic() - entry.started:.2f}s")
+        return True
+
+
+cancellations = CancelRegistry()
@@ -0,0 +1,191 @@
+"""Service container: each service built once, on first use, and warmed up in the background"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from functools import cached_property
+from typing import Dict, List, Optional
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Services are imported where they are built, so importing the app does not pay
+# for openai, numpy, PyAV or Motor before the first one is needed
+
+
+class service(cached_property):
+    """
+    A cached_property built under the container's lock: warm-up builds on a
+    worker thread while a request on the loop may ask for the same service,
+    and each must be constructed once. The loop waits at most for the service
+    being built at that moment.
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with instance._building:
+            return super().__get__(instance, owner)
+
+
+class ServiceContainer:
+    """
+    Holds the process's services. Attributes build on first access, so a
+    request that arrives before warm-up simply builds what it needs. warm_up()
+    builds everything off the event loop, then opens provider connections,
+    spawns the audio pool, loads local models, synthesizes the openers and
+    creates MongoDB indexes concurrently; readiness() reports how far it got.
+    """
+
+    def __init__(self):
+        self.mongo_client = None
+        self.warmup: Dict[str, str] = {}
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.tasks: List[asyncio.Task] = []
+        # Reentrant: building one service builds the ones it depends on
+        self._building = threading.RLock()
+        metrics.register_collector(self._cache_gauges)
+
+    @service
+    def provider(self):
+        from services.provider import get_provider
+        return get_provider()
+
+    @service
+    def shared_store(self):
+        from services.shared_store import get_store
+        return get_store()
+
+    @service
+    def audio_service(self):
+        from services.audio_service import AudioService
+        return AudioService()
+
+    @service
+    def ai_service(self):
+        from services.ai_service import AIService
+        return AIService()
+
+    @service
+    def tts_service(self):
+        from services.tts_service import TTSService
+        return TTSService()
+
+    @service
+    def conversation_store(self):
+        from services.conversation_store import ConversationStore
+        return ConversationStore()
+
+    @service
+    def context_manager(self):
+        from services.context_manager import ContextManager
+        return ContextManager(self.conversation_store, self.ai_service)
+
+    @service
+    def audio_pool(self):
+        from services.audio_pool import get_audio_pool
+        return get_audio_pool()
+
+    def built(self, name: str) -> bool:
+        return name in self.__dict__
+
+    def attach_db(self, mongo_url: str, db_name: str):
+        """Open the Motor client (it connects lazily) and bind the conversation store to it"""
+        from motor.motor_asyncio import AsyncIOMotorClient
+        # Fail fast when MongoDB is unreachable instead of pymongo's 30s server selection default
+        timeout_ms = int(os.getenv("MONGO_TIMEOUT_MS", "2000"))
+        self.mongo_client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=timeout_ms, connectTimeoutMS=timeout_ms)
+        self.conversation_store.attach(self.mongo_client[db_name])
+
+    def _build(self):
+        for name in ("provider", "shared_store", "audio_service", "ai_service", "tts_service", "context_manager", "audio_pool"):
+            getattr(self, name)
+
+    async def warm_up(self):
+        """Build every service, then run the warm-up steps concurrently (WARMUP_TIMEOUT); failures are logged, not fatal"""
+        start = time.perf_counter()
+        try:
+            # Imports and constructors are synchronous; a thread keeps liveness answering meanwhile
+            await asyncio.to_thread(self._build)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {str(e)}"
+            logger.error(f"Service construction failed: {self.error}")
+            return
+        metrics.observe("startup_build", time.perf_counter() - start)
+
+        steps = {
+            "provider": self.provider.warm(),
+            "audio_pool": self.audio_pool.warm(),
+            "stt": self.audio_service.engine.warm(),
+            "llm": self.ai_service.engine.warm(),
+            "tts": self.tts_service.engine.warm(),
+            "openers": self.tts_service.warm_openers(),
+        }
+        # Not waited for: without MongoDB the app still answers, only history is lost
+        background = {"mongo_indexes": self.conversation_store.ensure_indexes()}
+        self.warmup = {name: "pending" for name in {**steps, **background}}
+
+        async def run(name: str, step):
+            step_start = time.perf_counter()
+            try:
+                await step
+                self.warmup[name] = "ok"
+            except Exception as e:
+                self.warmup[name] = f"failed: {str(e)[:200]}"
+                logger.warning(f"Warm-up step {name} failed: {str(e)}")
+            metrics.observe("startup_warmup", time.perf_counter() - step_start, step=name)
+
+        self.tasks = [asyncio.create_task(run(name, step)) for name, step in {**background, **steps}.items()]
+        # Past the budget, report ready anyway; slow steps finish in the background
+        await asyncio.wait(self.tasks[len(background):], timeout=float(os.getenv("WARMUP_TIMEOUT", "15")))
+        self.ready_at = time.monotonic()
+        metrics.observe("startup_ready", self.ready_at - self.started_at)
+        logger.info(f"Ready after {time.perf_counter() - start:.2f}s of warm-up: {self.warmup}")
+
+    def readiness(self) -> dict:
+        """Ready once warm-up has finished or run out of time; failed steps are reported but do not hold traffic back"""
+        return {
+            "ready": self.ready_at is not None,
+            "error": self.error,
+            "uptime_s": round(time.monotonic() - self.started_at, 3),
+            "ready_after_s": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "warmup": self.warmup,
+        }
+
+    def _cache_gauges(self) -> Dict[str, float]:
+        gauges = {}
+        if self.built("ai_service"):
+            gauges.update({f"llm_cache_{name}": value for name, value in self.ai_service.cache.stats().items()})
+        if self.built("tts_service"):
+            gauges.update({f"tts_cache_{name}": value for name, value in self.tts_service.cache.stats().items()})
+        return gauges
+
+    async def close(self):
+        """Flush background writes and release pools, clients and worker processes"""
+        for task in self.tasks:
+            task.cancel()
+        if self.built("context_manager"):
+            await self.context_manager.drain()
+        if self.built("conversation_store"):
+            await self.conversation_store.drain()
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+        for name in ("audio_service", "ai_service", "tts_service"):
+            if self.built(name):
+                await getattr(self, name).engine.close()
+        if self.built("provider"):
+            from services.provider import close_provider
+            await close_provider()
+        if self.built("shared_store"):
+            from services.shared_store import close_store
+            await close_store()
+        if self.built("audio_pool"):
+            from services.audio_pool import close_audio_pool
+            close_audio_pool()
+
+
+container = ServiceContainer()
@@ -0,0 +1,135 @@
+"""Token-budgeted session context: recent turns verbatim plus a rolling summary"""
+import os
+import json
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+from services.shared_store import get_store
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character-based estimate
+    tiktoken = None
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text, using tiktoken's o200k_base encoding when it is available"""
+    global _encoding, tiktoken
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The encoding file is fetched on first use; offline hosts use the estimate
+            logger.warning(f"tiktoken unavailable, estimating tokens: {str(e)}")
+            tiktoken = None
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """Tokens a chat message costs, including per-message overhead"""
+    return count_tokens(message["content"]) + 4
+
+
+@dataclass
+class SessionSummary:
+    text: str = ""
+    covered_seq: int = 0  # messages with seq below this are folded into text
+
+
+class ContextManager:
+    """Builds a capped prompt context per session and folds old turns into a summary"""
+
+    def __init__(self, store, ai_service):
+        self.store = store
+        self.ai_service = ai_service
+        self.keep_messages = int(os.getenv("CONTEXT_KEEP_TURNS", "6")) * 2
+        # Summarize in batches so the extra LLM call happens every few turns, not every turn
+        self.fold_batch = int(os.getenv("CONTEXT_FOLD_TURNS", "3")) * 2
+        self.max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+        self.summary_tokens = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+        # Summaries live in the shared store, so every worker builds a session's context from the same one
+        self.shared = get_store()
+        self.shared.limit("context", max_entries=int(os.getenv("CONTEXT_CACHE_SESSIONS", "10000")))
+        self._folding: Dict[str, asyncio.Task] = {}
+
+    async def build(self, session_id: str, language: str = "en") -> List[Dict[str, str]]:
+        """Chat messages to place before the user's query"""
+        summary = await self._summary(session_id)
+        page = await self.store.get_history(session_id, limit=self.keep_messages + self.fold_batch, fields=("role", "content"))
+        recent = [m for m in page["messages"] if m.seq >= summary.covered_seq]
+
+        # Unfolded turns can reach back past this page; the fold reads them from covered_seq itself
+        if recent and recent[-1].seq + 1 - summary.covered_seq >= self.keep_messages + self.fold_batch:
+            self._schedule_fold(session_id, language)
+
+        context, budget = [], self.max_tokens
+        if summary.text:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation: {summary.text}"})
+            budget -= message_tokens(context[0])
+        turns = []
+        for message in reversed(recent):
+            turn = {"role": message.role, "content": message.content}
+            cost = message_tokens(turn)
+            if cost > budget:
+                break
+            budget -= cost
+            turns.append(turn)
+        context.extend(reversed(turns))
+        return context
+
+    async def _summary(self, session_id: str) -> SessionSummary:
+        async def load() -> bytes:
+            stored = await self.store.get_summary(session_id)
+            return json.dumps(stored or asdict(SessionSummary()), ensure_ascii=False).encode("utf-8")
+
+        # MongoDB is read once per session across workers, not once per worker
+        return SessionSummary(**json.loads(await self.shared.get_or_compute("context", session_id, load)))
+
+    async def _remember(self, session_id: str, summary: SessionSummary):
+        await self.shared.set("context", session_id, json.dumps(asdict(summary), ensure_ascii=False).encode("utf-8"))
+
+    def _schedule_fold(self, session_id: str, language: str):
+        if session_id in self._folding:
+            return
+        task = asyncio.create_task(self._fold(session_id, language))
+        self._folding[session_id] = task
+        task.add_done_callback(lambda _: self._folding.pop(session_id, None))
+
+    async def _fold(self, session_id: str, language: str):
+        """Merge the oldest unfolded turns into the session's summary, a batch at a time, until only the kept ones remain"""
+        # One worker folds a session at a time; the others keep the verbatim turns meanwhile
+        token = await self.shared.lease("context-fold", session_id, self.shared.lease_seconds)
+        if token is None:
+            return
+        try:
+            summary = await self._summary(session_id)
+            while True:
+                # Read forwards from the summary's edge so no turn between it and the newest page is skipped
+                page = await self.store.get_history(
+                    session_id, limit=self.keep_messages + self.fold_batch,
+                    after_seq=summary.covered_seq - 1, fields=("role", "content"),
+                )
+                if len(page["messages"]) < self.keep_messages + self.fold_batch:
+                    return
+                messages = page["messages"][:self.fold_batch]
+                turns = [{"role": message.role, "content": message.content} for message in messages]
+                text = await self.ai_service.summarize(summary.text, turns, language, self.summary_tokens)
+                summary = SessionSummary(text=text, covered_seq=messages[-1].seq + 1)
+                await self._remember(session_id, summary)
+                await self.store.save_summary(session_id, summary.text, summary.covered_seq)
+        except Exception as e:
+            logger.error(f"Context summary failed for {session_id}: {str(e)}")
+        finally:
+            await self.shared.release("context-fold", session_id, token)
+
+    async def drain(self):
+        """Wait for in-flight summaries (used on shutdown)"""
+        if self._folding:
+            await asyncio.gather(*self._folding.values(), return_exceptions=True)
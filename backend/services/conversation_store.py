@@ -0,0 +1,143 @@
+"""Conversation persistence in MongoDB (Motor) with bucketed, append-only messages"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Any, Sequence
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from models.conversation import MESSAGE_FIELDS, StoredMessage
+
+logger = logging.getLogger(__name__)
+
+# Messages are $push-ed into fixed-size bucket documents so that a session never
+# outgrows the 16MB document limit and a page read touches at most two buckets.
+BUCKET_SIZE = 100
+
+
+class ConversationStore:
+    """Stores sessions in `conversations` and their messages in `message_buckets`"""
+
+    def __init__(self, db=None):
+        self.db = None
+        self._pending = set()
+        if db is not None:
+            self.attach(db)
+
+    def attach(self, db):
+        """Bind to a Motor database; until then the store is a no-op"""
+        self.db = db
+        self.conversations = db["conversations"]
+        self.buckets = db["message_buckets"]
+
+    async def ensure_indexes(self):
+        """Create the indexes the read and write paths rely on"""
+        if self.db is None:
+            return
+        await self.conversations.create_index([("session_id", ASCENDING)], unique=True)
+        await self.conversations.create_index([("updated_at", DESCENDING)])
+        await self.buckets.create_index([("session_id", ASCENDING), ("bucket", DESCENDING)], unique=True)
+
+    async def append(self, session_id: str, messages: List[StoredMessage], language: Optional[str] = None):
+        """Append messages to a session without rewriting earlier ones"""
+        if self.db is None or not messages:
+            return
+        now = datetime.now(timezone.utc)
+        # Reserve a contiguous range of sequence numbers for these messages
+        conversation = await self.conversations.find_one_and_update(
+            {"session_id": session_id},
+            {
+                "$inc": {"message_count": len(messages)},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"session_id": session_id, "language": language, "created_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        first_seq = conversation["message_count"] - len(messages)
+
+        by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for offset, message in enumerate(messages):
+            message.seq = first_seq + offset
+            by_bucket.setdefault(message.seq // BUCKET_SIZE, []).append(message.to_doc())
+        for bucket, docs in by_bucket.items():
+            await self.buckets.update_one(
+                {"session_id": session_id, "bucket": bucket},
+                {"$push": {"messages": {"$each": docs}}, "$inc": {"count": len(docs)}},
+                upsert=True,
+            )
+
+    def append_background(self, session_id: str, messages: List[StoredMessage], language: Optional[str] = None):
+        """Schedule an append without making the caller wait for MongoDB"""
+        if self.db is None:
+            return
+        task = asyncio.create_task(self.append(session_id, messages, language))
+        self._pending.add(task)
+        task.add_done_callback(self._on_append_done)
+
+    def _on_append_done(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Conversation write failed: {str(task.exception())}")
+
+    async def drain(self):
+        """Wait for scheduled writes (used on shutdown)"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def get_history(
+        self, session_id: str, limit: int = 50, before: Optional[int] = None, fields: Sequence[str] = MESSAGE_FIELDS,
+        after_seq: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of StoredMessages in chronological order, newest page first.
+        Pass the returned `next_before` as `before` to fetch the previous page,
+        or `after_seq` to read forwards from the oldest messages after that seq.
+        Only `fields` are read from MongoDB (seq always is); the rest are None.
+        """
+        if self.db is None:
+            return {"session_id": session_id, "messages": [], "next_before": None}
+        if after_seq is not None:
+            start = after_seq + 1
+            before = start + limit
+        else:
+            if before is None:
+                conversation = await self.conversations.find_one({"session_id": session_id}, {"message_count": 1})
+                before = conversation["message_count"] if conversation else 0
+            start = max(before - limit, 0)
+
+        projection = {"_id": 0, "messages.seq": 1, **{f"messages.{name}": 1 for name in fields}}
+        if "ts" in fields:
+            projection["messages.timestamp"] = 1  # messages written before epoch timestamps
+        cursor = self.buckets.find(
+            {"session_id": session_id, "bucket": {"$gte": start // BUCKET_SIZE, "$lte": max(before - 1, 0) // BUCKET_SIZE}},
+            projection,
+        )
+        messages = [
+            StoredMessage.from_doc(message)
+            async for bucket in cursor
+            for message in bucket["messages"]
+            if start <= message["seq"] < before
+        ]
+        messages.sort(key=lambda message: message.seq)
+        return {
+            "session_id": session_id,
+            "messages": messages,
+            "next_before": start if start > 0 else None,
+        }
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Rolling summary saved by the context manager, if any"""
+        if self.db is None:
+            return None
+        doc = await self.conversations.find_one({"session_id": session_id}, {"summary": 1, "summary_seq": 1})
+        if not doc or "summary" not in doc:
+            return None
+        return {"text": doc["summary"], "covered_seq": doc["summary_seq"]}
+
+    async def save_summary(self, session_id: str, text: str, covered_seq: int):
+        """Store the rolling summary alongside the session metadata"""
+        if self.db is None:
+            return
+        await self.conversations.update_one(
+            {"session_id": session_id},
+            {"$set": {"summary": text, "summary_seq": covered_seq}},
+        )
@@ -0,0 +1,277 @@
+"""Pluggable STT, LLM and TTS backends, selected per stage by STT_ENGINE, LLM_ENGINE and TTS_ENGINE"""
+import os
+import re
+import wave
+import logging
+from io import BytesIO
+from typing import AsyncIterator, Dict, List
+
+from services.provider import get_provider
+from services.audio_preprocessor import PreparedAudio
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _silent_wav(seconds: float = 1.0, rate: int = 8000) -> bytes:
+    """Build a mono 8-bit PCM WAV of silence"""
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(rate)
+        wav.writeframes(b"\x80" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+MOCK_AUDIO = _silent_wav()
+# Voice per conversation language (OpenAI voices speak both; this is a preference)
+VOICES = {
+    "en": os.getenv("TTS_VOICE_EN", "nova"),
+    "he": os.getenv("TTS_VOICE_HE", "shimmer"),
+}
+SUMMARY_PROMPT = (
+    "Update the running summary of a voice assistant conversation with the new turns. "
+    "Keep facts, names and open questions; drop pleasantries. "
+    "Reply with the summary only, in the conversation's language ({language})."
+)
+
+
+class STTEngine:
+    """Speech to text for one prepared file"""
+    name = "base"
+    # Whether uploads are trimmed, re-encoded and split before reaching the engine
+    preprocess = True
+
+    async def transcribe(self, prepared: PreparedAudio, language: str = None) -> dict:
+        """{"text", "language"} for the audio; language None means detect it"""
+        raise NotImplementedError
+
+    async def warm(self):
+        """Load whatever the first call would otherwise wait for"""
+
+    async def close(self):
+        pass
+
+
+class LLMEngine:
+    """Chat completion over OpenAI-style messages"""
+    name = "base"
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> AsyncIterator[str]:
+        """Response text as it is generated; by default the whole completion at once"""
+        yield await self.complete(messages, max_tokens)
+
+    async def summarize(self, summary: str, messages: List[Dict[str, str]], language: str = "en", max_tokens: int = 300) -> str:
+        """Fold messages into an existing conversation summary"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        return await self.complete([
+            {"role": "system", "content": SUMMARY_PROMPT.format(language=language)},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ], max_tokens)
+
+    async def warm(self):
+        """Load whatever the first call would otherwise wait for"""
+
+    async def close(self):
+        pass
+
+
+class TTSEngine:
+    """Text to speech for at most MAX_SEGMENT_CHARS of text"""
+    name = "base"
+    model = "base"
+    audio_format = "mp3"
+    voices = VOICES
+    # Whether synthesized audio is worth keeping in the TTS cache
+    cacheable = True
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+    async def warm(self):
+        """Load whatever the first call would otherwise wait for"""
+
+    async def close(self):
+        pass
+
+
+class OpenAISTTEngine(STTEngine):
+    """Whisper through the shared provider (limits, retries, breaker)"""
+    name = "openai"
+
+    def __init__(self):
+        self.provider = get_provider()
+        if not self.provider.client:
+            raise RuntimeError("STT_ENGINE=openai needs OPENAI_API_KEY")
+        self.client = self.provider.client
+
+    async def transcribe(self, prepared: PreparedAudio, language: str = None) -> dict:
+        kwargs = {"language": language} if language else {}
+
+        async def request(timeout: float):
+            # A fresh reader per attempt, since a failed upload consumed the last one
+            with prepared.open() as audio_file, metrics.span("transcription"):
+                return await self.client.audio.transcriptions.create(
+                    file=(prepared.filename, audio_file),
+                    model="whisper-1",
+                    # verbose_json is what carries the detected language
+                    response_format="json" if language else "verbose_json",
+                    timeout=timeout,
+                    **kwargs
+                )
+
+        response = await self.provider.call("stt", request)
+        return {
+            "text": response.text,
+            "language": getattr(response, 'language', language or "auto")
+        }
+
+
+class OpenAILLMEngine(LLMEngine):
+    """Chat completions through the shared provider; LLM_MODEL picks the model"""
+    name = "openai"
+
+    def __init__(self):
+        self.provider = get_provider()
+        if not self.provider.client:
+            raise RuntimeError("LLM_ENGINE=openai needs OPENAI_API_KEY")
+        self.client = self.provider.client
+        self.model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> str:
+        async def request(timeout: float):
+            with metrics.span("llm"):
+                return await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    timeout=timeout
+                )
+
+        response = await self.provider.call("llm", request)
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> AsyncIterator[str]:
+        # Not retried: tokens already yielded cannot be taken back
+        async with self.provider.limit("llm") as timeout:
+            with metrics.span("llm", mode="stream"):
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    timeout=timeout
+                )
+                # Closed however the consumer stops, so an abandoned answer ends upstream too
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+
+
+class OpenAITTSEngine(TTSEngine):
+    """OpenAI speech through the shared provider"""
+    name = "openai"
+    model = "tts-1"
+    audio_format = "mp3"
+
+    def __init__(self):
+        self.provider = get_provider()
+        if not self.provider.client:
+            raise RuntimeError("TTS_ENGINE=openai needs OPENAI_API_KEY")
+        self.client = self.provider.client
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        async def request(timeout: float):
+            with metrics.span("tts"):
+                return await self.client.audio.speech.create(
+                    model=self.model,
+                    voice=voice,
+                    input=text,
+                    response_format=self.audio_format,
+                    timeout=timeout
+                )
+
+        response = await self.provider.call("tts", request)
+        return response.content
+
+
+class MockSTTEngine(STTEngine):
+    """Canned transcripts, for demos without an API key"""
+    name = "mock"
+    preprocess = False
+    texts = {
+        "en": "What is Docker? Demo transcription.",
+        "he": "[translate:מה זה Docker? תמלול לדוגמה.]",
+        None: "Explain REST API."
+    }
+
+    async def transcribe(self, prepared: PreparedAudio, language: str = None) -> dict:
+        logger.info("STT MOCK: Transcribing...")
+        return {"text": self.texts.get(language, self.texts["en"]), "language": language or "auto"}
+
+
+class MockLLMEngine(LLMEngine):
+    """Canned answers (Hebrew when the system prompt is), streamed word by word"""
+    name = "mock"
+    responses = {
+        "en": "Docker containers package apps with dependencies. Microservices = independent services via API.",
+        "he": "[translate:קונטיינרים של Docker מארזים אפליקציות עם תלויות. מיקרו-שירותים = שירותים עצמאיים דרך API. ]"
+    }
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> str:
+        logger.info(f"LLM MOCK: {messages[-1]['content'][:30]}...")
+        hebrew = re.search(r"[\u0590-\u05ff]", messages[0]["content"]) is not None
+        return self.responses["he" if hebrew else "en"]
+
+    async def stream(self, messages: List[Dict[str, str]], max_tokens: int = 300) -> AsyncIterator[str]:
+        for token in re.findall(r"\S+\s*", await self.complete(messages, max_tokens)):
+            yield token
+
+    async def summarize(self, summary: str, messages: List[Dict[str, str]], language: str = "en", max_tokens: int = 300) -> str:
+        # Keep the opening of each user turn
+        asked = "; ".join(m["content"][:60] for m in messages if m["role"] == "user")
+        return f"{summary} The user asked: {asked}.".strip()[-max_tokens * 4:]
+
+
+class MockTTSEngine(TTSEngine):
+    """One second of silence as WAV"""
+    name = "mock"
+    model = "mock"
+    audio_format = "wav"
+    cacheable = False
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        logger.info(f"TTS MOCK: {text[:50]}...")
+        return MOCK_AUDIO
+
+
+def _local(kind: str):
+    # Imported on demand so the optional local dependencies only matter when chosen
+    from services import local_engines
+    return {"stt": local_engines.LocalSTTEngine, "tts": local_engines.LocalTTSEngine}[kind]()
+
+
+ENGINES = {
+    "stt": {"openai": OpenAISTTEngine, "mock": MockSTTEngine, "local": lambda: _local("stt")},
+    "llm": {"openai": OpenAILLMEngine, "mock": MockLLMEngine},
+    "tts": {"openai": OpenAITTSEngine, "mock": MockTTSEngine, "local": lambda: _local("tts")},
+}
+
+
+def create_engine(stage: str):
+    """
+    The engine configured for a stage ("stt", "llm" or "tts") by <STAGE>_ENGINE;
+    by default "openai" with an API key and "mock" without one.
+    """
+    name = os.getenv(f"{stage.upper()}_ENGINE") or ("openai" if get_provider().client else "mock")
+    factory = ENGINES[stage].get(name)
+    if factory is None:
+        raise ValueError(f"Unknown {stage.upper()}_ENGINE {name!r}; choose one of {', '.join(ENGINES[stage])}")
+    engine = factory()
+    logger.info(f"{stage.upper()} engine: {engine.name}")
+    return engine
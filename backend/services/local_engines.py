@@ -0,0 +1,158 @@
+"""CPU-only offline engines: faster-whisper transcription in a process pool, espeak-ng speech"""
+import os
+import time
+import shutil
+import struct
+import asyncio
+import logging
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Union
+
+from services.engines import STTEngine, TTSEngine
+from services.audio_preprocessor import PreparedAudio, decode
+from services.uploads import AudioBuffer
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Voice names the OpenAI engine understands; the local engine maps them to its own default
+OPENAI_VOICES = {"alloy", "ash", "coral", "echo", "fable", "nova", "onyx", "sage", "shimmer"}
+
+# Loaded once per pool worker, on its first task
+_model = None
+
+
+def _load(options: tuple, hold: float = 0.0):
+    """
+    Load the model in this worker if it is not loaded yet. Loading on a task
+    rather than in a pool initializer means a failed load (e.g. no network for
+    the download) fails that call instead of breaking the whole pool.
+    """
+    global _model
+    if _model is None:
+        from faster_whisper import WhisperModel
+        name, compute_type, threads = options
+        _model = WhisperModel(name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+    # Warm-up holds each worker briefly so that every job lands on a different one
+    time.sleep(hold)
+
+
+def _transcribe(options: tuple, data: Union[bytes, AudioBuffer], container: str, language: str = None) -> dict:
+    """Runs in a pool worker: decode to 16 kHz mono and transcribe"""
+    _load(options)
+    source = data if isinstance(data, AudioBuffer) else AudioBuffer(data=data)
+    samples = decode(source, container)
+    # faster-whisper's own VAD drops the silence the preprocessor would have trimmed
+    segments, info = _model.transcribe(samples, language=language, beam_size=1, vad_filter=True)
+    return {
+        "text": " ".join(segment.text.strip() for segment in segments).strip(),
+        "language": language or info.language,
+    }
+
+
+class LocalSTTEngine(STTEngine):
+    """
+    faster-whisper (CTranslate2, int8 on CPU) in a pool of worker processes, so
+    inference never runs on the event loop. Each worker loads the model once;
+    LOCAL_STT_MODEL is a model size (downloaded on first use) or the path of a
+    converted model, for machines without network access. An upload in a
+    named file reaches the worker as a path, any other as bytes.
+    """
+    name = "local"
+    # The worker decodes the upload itself; re-encoding it first would only add work
+    preprocess = False
+
+    def __init__(self):
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError("STT_ENGINE=local needs faster-whisper (pip install faster-whisper)")
+        self.model = os.getenv("LOCAL_STT_MODEL", "base")
+        self.workers = int(os.getenv("LOCAL_STT_WORKERS", "1"))
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.options = (self.model, os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8"), threads)
+        self.pool = self._new_pool()
+        # Callers beyond the pool wait here rather than queueing pickled audio in the pool
+        self.limit = asyncio.Semaphore(self.workers)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs an event loop and threads is not safe
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def warm(self):
+        """Spawn every worker and load the model in each"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.pool, _load, self.options, 0.2) for _ in range(self.workers)
+        ))
+
+    async def transcribe(self, prepared: PreparedAudio, language: str = None) -> dict:
+        async with self.limit:
+            pool = self.pool
+            try:
+                with metrics.span("transcription", engine=self.name):
+                    return await asyncio.get_running_loop().run_in_executor(
+                        pool, _transcribe, self.options, prepared.data, prepared.container, language
+                    )
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); later calls get a fresh pool
+                if self.pool is pool:
+                    logger.error("Local STT worker died; restarting the pool")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._new_pool()
+                raise
+
+    async def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _fix_wav_sizes(audio: bytes) -> bytes:
+    """espeak-ng cannot seek stdout, so fill in the RIFF and data sizes it left open"""
+    if audio[:4] != b"RIFF" or audio[36:40] != b"data":
+        return audio
+    return audio[:4] + struct.pack("<I", len(audio) - 8) + audio[8:40] + struct.pack("<I", len(audio) - 44) + audio[44:]
+
+
+class LocalTTSEngine(TTSEngine):
+    """
+    espeak-ng, one short-lived process per segment (at most LOCAL_TTS_WORKERS
+    at once), returning WAV. Formant synthesis: robotic, but instant and offline.
+    """
+    name = "local"
+    model = "espeak-ng"
+    audio_format = "wav"
+    voices = {
+        "en": os.getenv("LOCAL_TTS_VOICE_EN", "en-us"),
+        "he": os.getenv("LOCAL_TTS_VOICE_HE", "he"),
+    }
+
+    def __init__(self):
+        self.binary = shutil.which(os.getenv("LOCAL_TTS_BINARY", "espeak-ng"))
+        if self.binary is None:
+            raise RuntimeError("TTS_ENGINE=local needs espeak-ng on PATH")
+        self.rate = os.getenv("LOCAL_TTS_RATE", "175")  # words per minute
+        self.limit = asyncio.Semaphore(int(os.getenv("LOCAL_TTS_WORKERS", str(os.cpu_count() or 1))))
+
+    async def synthesize(self, text: str, voice: str) -> bytes:
+        if voice in OPENAI_VOICES:
+            voice = self.voices["en"]
+        async with self.limit:
+            with metrics.span("tts", engine=self.name):
+                # Text goes in on stdin, so nothing in it is read as an option
+                process = await asyncio.create_subprocess_exec(
+                    self.binary, "-v", voice, "-s", self.rate, "--stdin", "--stdout",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    audio, errors = await process.communicate(text.encode("utf-8"))
+                except asyncio.CancelledError:
+                    # Nobody wants the audio any more: free the CPU (and the slot) now
+                    process.kill()
+                    await process.wait()
+                    raise
+        if process.returncode != 0:
+            raise RuntimeError(f"espeak-ng exited with {process.returncode}: {errors.decode(errors='replace').strip()}")
+        return _fix_wav_sizes(audio)
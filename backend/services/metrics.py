@@ -0,0 +1,189 @@
+"""In-process latency histograms and counters, rendered in Prometheus text format"""
+import time
+import bisect
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# Seconds; covers sub-millisecond cache hits up to slow provider calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent samples kept per series for percentile estimates
+RESERVOIR_SIZE = 2048
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative buckets for Prometheus plus a window of recent samples for percentiles"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Metrics:
+    """Registry of stage latencies, byte counters and plain counters"""
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.collectors: List[Callable[[], Dict[str, float]]] = []
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _series(name: str, labels: Labels) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+    def observe(self, stage: str, seconds: float, /, **labels):
+        """Record one latency sample for a stage"""
+        if "stage" in labels:
+            raise ValueError("the stage label is the histogram's own; name the extra label differently")
+        key = (stage, self._labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, /, **labels):
+        """Add to a counter"""
+        key = (name, self._labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_bytes(self, stage: str, count: int, **labels):
+        """Count bytes moved by a stage"""
+        self.inc("stage_bytes_total", count, stage=stage, **labels)
+
+    @contextmanager
+    def span(self, stage: str, /, **labels):
+        """Time the enclosed block (works around awaits too)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """Drop recorded samples and counters; collectors stay registered"""
+        self.histograms.clear()
+        self.counters.clear()
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """Add a callable whose {name: value} gauges are read at scrape time"""
+        self.collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Percentiles per stage, counters and collected gauges as plain JSON"""
+        stages = {}
+        for (stage, labels), histogram in sorted(self.histograms.items()):
+            stages[self._series(stage, labels)] = {
+                "count": histogram.count,
+                "mean": round(histogram.sum / histogram.count, 6) if histogram.count else 0.0,
+                "p50": round(histogram.percentile(0.50), 6),
+                "p95": round(histogram.percentile(0.95), 6),
+                "p99": round(histogram.percentile(0.99), 6),
+            }
+        counters = {
+            self._series(name, labels): value
+            for (name, labels), value in sorted(self.counters.items())
+        }
+        gauges = {}
+        for collector in self.collectors:
+            gauges.update(collector())
+        return {"stages": stages, "counters": counters, "gauges": gauges}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        def fmt(labels: Labels, extra: Dict[str, str] = None) -> str:
+            pairs = list(labels) + list((extra or {}).items())
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = ["# TYPE smartspeak_stage_seconds histogram"]
+        for (stage, labels), histogram in sorted(self.histograms.items()):
+            series = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"smartspeak_stage_seconds_bucket{fmt(series, {'le': le})} {cumulative}")
+            lines.append(f"smartspeak_stage_seconds_sum{fmt(series)} {histogram.sum}")
+            lines.append(f"smartspeak_stage_seconds_count{fmt(series)} {histogram.count}")
+
+        lines.append("# TYPE smartspeak_stage_seconds_recent gauge")
+        for (stage, labels), histogram in sorted(self.histograms.items()):
+            series = (("stage", stage),) + labels
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f"smartspeak_stage_seconds_recent{fmt(series, {'quantile': str(q)})} {histogram.percentile(q)}")
+
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f"# TYPE smartspeak_{name} counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f"smartspeak_{name}{fmt(labels)} {value}")
+
+        for collector in self.collectors:
+            for name, value in collector().items():
+                lines.append(f"# TYPE smartspeak_{name} gauge")
+                lines.append(f"smartspeak_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Timeline:
+    """
+    Start and end of each stage of one request. A stage entered more than once
+    (e.g. per-sentence TTS) counts from its first start to its last end.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Tuple[float, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            first, last = self.stages.get(name, (start, end))
+            self.stages[name] = (min(first, start), max(last, end))
+
+    def report(self) -> Dict[str, float]:
+        """Milliseconds per stage, the wall time they spanned, and the time saved by overlapping"""
+        if not self.stages:
+            return {}
+        durations = {name: end - start for name, (start, end) in self.stages.items()}
+        wall = max(end for _, end in self.stages.values()) - min(start for start, _ in self.stages.values())
+        overlap = max(sum(durations.values()) - wall, 0.0)
+        return {
+            **{name: round(seconds * 1000, 1) for name, seconds in durations.items()},
+            "wall": round(wall * 1000, 1),
+            "overlap": round(overlap * 1000, 1),
+        }
+
+    def server_timing(self) -> str:
+        """The report as a Server-Timing header value"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.report().items())
+
+
+metrics = Metrics()
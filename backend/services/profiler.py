@@ -0,0 +1,72 @@
+"""Opt-in sampling profiler for individual requests"""
+import os
+import sys
+import time
+import uuid
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+# Keep the most recent profiles for retrieval by id
+MAX_PROFILES = 50
+
+
+class SamplingProfiler:
+    """
+    Samples the event-loop thread's stack from a background thread and
+    aggregates collapsed stacks (flamegraph.pl / speedscope input). Because
+    every request shares the loop, samples include concurrent requests too.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.enabled = os.getenv("PROFILING_ENABLED", "0") == "1"
+        self.profiles: "OrderedDict[str, str]" = OrderedDict()
+
+    def start(self) -> "ProfileSession":
+        session = ProfileSession(threading.get_ident(), self.interval)
+        session.thread.start()
+        return session
+
+    def finish(self, session: "ProfileSession") -> str:
+        """Stop sampling and store the result; returns its id"""
+        session.stop()
+        profile_id = uuid.uuid4().hex[:12]
+        self.profiles[profile_id] = session.collapsed()
+        while len(self.profiles) > MAX_PROFILES:
+            self.profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[str]:
+        return self.profiles.get(profile_id)
+
+
+class ProfileSession:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,309 @@
+"""Shared async OpenAI provider with a pooled HTTP transport"""
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+from openai import APIStatusError, AsyncOpenAI
+
+from services.metrics import metrics
+from services.resilience import (
+    AdaptiveLimit, CircuitBreaker, DeadlineExceeded, HedgePolicy, ProviderUnavailable,
+    backoff, is_overload, is_retryable, remaining, retry_after,
+)
+from services.scheduler import PRIORITIES, current_work
+
+logger = logging.getLogger(__name__)
+
+# Starting in-flight limits per stage; override with e.g. PROVIDER_LIMIT_TTS=4.
+# The limits then adapt between 1 and PROVIDER_LIMIT_MAX_<STAGE> (default 4x).
+DEFAULT_LIMITS = {"stt": 8, "llm": 16, "tts": 8}
+
+T = TypeVar("T")
+
+
+class _Attempt:
+    """One copy of a hedged call; `lost` once the other copy has won"""
+    __slots__ = ("lost",)
+
+    def __init__(self):
+        self.lost = False
+
+
+# The hedged attempt running in this context: a loser's cancellation is not a client giving up
+_attempt: ContextVar[Optional[_Attempt]] = ContextVar("provider_attempt", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class Provider:
+    """One AsyncOpenAI client over a keep-alive connection pool, shared by all services"""
+
+    def __init__(self):
+        self.api_key = os.getenv("EMERGENT_LLM_KEY") or os.getenv("OPENAI_API_KEY")
+        self.base_url = os.getenv("OPENAI_BASE_URL") or None
+        self.client: Optional[AsyncOpenAI] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.timeout = _env_float("PROVIDER_TIMEOUT", 60.0)
+        self.max_retries = _env_int("PROVIDER_MAX_RETRIES", 2)
+        self.retry_base = _env_float("PROVIDER_RETRY_BASE", 0.25)
+        self.retry_cap = _env_float("PROVIDER_RETRY_CAP", 4.0)
+        self.limits: Dict[str, AdaptiveLimit] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # Moving average of completed call durations, to price the calls that get cancelled
+        self.durations: Dict[str, float] = {}
+        for stage, default in DEFAULT_LIMITS.items():
+            initial = _env_int(f"PROVIDER_LIMIT_{stage.upper()}", default)
+            self.limits[stage] = AdaptiveLimit(
+                initial,
+                maximum=_env_int(f"PROVIDER_LIMIT_MAX_{stage.upper()}", initial * 4),
+                max_queue=_env_int("PROVIDER_QUEUE_LIMIT", 256),
+            )
+            self.breakers[stage] = CircuitBreaker(
+                stage,
+                threshold=_env_int("PROVIDER_BREAKER_FAILURES", 5),
+                cooldown=_env_float("PROVIDER_BREAKER_COOLDOWN", 10.0),
+            )
+        # Hedged stages (PROVIDER_HEDGE_STAGES, e.g. "stt,tts"; none by default)
+        self.hedges: Dict[str, HedgePolicy] = {
+            stage: HedgePolicy(
+                percentile=_env_float("PROVIDER_HEDGE_PERCENTILE", 0.95),
+                budget=_env_float("PROVIDER_HEDGE_BUDGET", 0.05),
+                window=_env_int("PROVIDER_HEDGE_WINDOW", 200),
+            )
+            for stage in filter(None, os.getenv("PROVIDER_HEDGE_STAGES", "").split(","))
+            if stage in DEFAULT_LIMITS
+        }
+        metrics.register_collector(self._gauges)
+
+        if self.api_key:
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=_env_int("PROVIDER_MAX_CONNECTIONS", 64),
+                    max_keepalive_connections=_env_int("PROVIDER_MAX_KEEPALIVE", 32),
+                    keepalive_expiry=_env_float("PROVIDER_KEEPALIVE_EXPIRY", 30.0),
+                ),
+                timeout=httpx.Timeout(
+                    self.timeout,
+                    connect=_env_float("PROVIDER_CONNECT_TIMEOUT", 5.0),
+                ),
+            )
+            self.client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.http_client,
+                # Retries happen in call(), where they respect deadlines and limits
+                max_retries=0,
+            )
+            logger.info("Provider: async OpenAI client initialized")
+        else:
+            logger.warning("Provider: No API key - engines default to mock mode")
+
+    @asynccontextmanager
+    async def limit(self, stage: str) -> AsyncIterator[float]:
+        """
+        Hold one of the stage's adaptive slots for the duration of a call.
+        Yields the timeout to give the upstream request: the time left before
+        the request deadline, capped at PROVIDER_TIMEOUT. Raises CircuitOpen,
+        Overloaded or DeadlineExceeded instead of queueing hopelessly. A call
+        cancelled on the way (client gone, barge-in) frees its slot at once and
+        counts the provider time it would have gone on using.
+        """
+        breaker, limiter = self.breakers[stage], self.limits[stage]
+        breaker.check()
+        left = remaining()
+        if left is not None and left <= 0:
+            breaker.record()
+            raise DeadlineExceeded(f"{stage} deadline exceeded")
+        start = time.perf_counter()
+        try:
+            await limiter.acquire(left)
+        except asyncio.TimeoutError:
+            breaker.record()
+            raise DeadlineExceeded(f"{stage} deadline exceeded while queued")
+        except asyncio.CancelledError:
+            breaker.record()
+            self._cancelled(stage, 0.0)
+            raise
+        except BaseException:
+            breaker.record()
+            raise
+        metrics.observe("provider_queue_wait", time.perf_counter() - start, provider_stage=stage, priority=current_work()[0])
+
+        left = remaining()
+        start = time.perf_counter()
+        success = overload = failure = False
+        try:
+            yield self.timeout if left is None else max(min(left, self.timeout), 0.001)
+            success = True
+        except (asyncio.CancelledError, GeneratorExit):
+            # GeneratorExit: a stream whose consumer stopped reading it
+            self._cancelled(stage, time.perf_counter() - start)
+            raise
+        except Exception as e:
+            overload = is_overload(e)
+            failure = is_retryable(e)
+            raise
+        finally:
+            limiter.release(success=success, overload=overload)
+            breaker.record(success=success, failure=failure)
+            if success:
+                elapsed = time.perf_counter() - start
+                average = self.durations.get(stage)
+                self.durations[stage] = elapsed if average is None else 0.9 * average + 0.1 * elapsed
+
+    def _cancelled(self, stage: str, elapsed: float):
+        """A call abandoned after `elapsed` seconds in flight: the rest of a typical call was avoided"""
+        attempt = _attempt.get()
+        if attempt is not None and attempt.lost:
+            metrics.inc("provider_hedge_losers_total", stage=stage)
+            return
+        metrics.inc("provider_cancelled_total", stage=stage)
+        avoided = max(self.durations.get(stage, 0.0) - elapsed, 0.0)
+        if avoided:
+            metrics.inc("provider_seconds_avoided_total", avoided, stage=stage)
+
+    async def call(self, stage: str, request: Callable[[float], Awaitable[T]]) -> T:
+        """
+        Run `request(timeout)` under limit(), retrying retryable errors with
+        jittered exponential backoff while the deadline allows; hedged for the
+        stages in PROVIDER_HEDGE_STAGES.
+        """
+        hedge = self.hedges.get(stage)
+        if hedge is None:
+            return await self._call(stage, request)
+        return await self._hedged(stage, request, hedge)
+
+    async def _hedged(self, stage: str, request: Callable[[float], Awaitable[T]], hedge: HedgePolicy) -> T:
+        """
+        The call, plus a second copy if the first is still running after the
+        stage's hedge delay and the budget allows. The first success wins and
+        the other copy is cancelled; a failure waits for the other copy.
+        """
+        hedge.earn()
+        attempts: Dict[asyncio.Task, Tuple[_Attempt, float]] = {}
+
+        def launch() -> asyncio.Task:
+            marker = _Attempt()
+
+            async def attempt():
+                _attempt.set(marker)
+                return await self._call(stage, request)
+
+            task = asyncio.ensure_future(attempt())
+            attempts[task] = (marker, time.perf_counter())
+            return task
+
+        primary = launch()
+        pending = {primary}
+        winner = None
+        try:
+            delay = hedge.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and hedge.spend():
+                    metrics.inc("provider_hedges_total", stage=stage)
+                    pending.add(launch())
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        hedge.record(time.perf_counter() - attempts[task][1])
+                        if task is not primary:
+                            metrics.inc("provider_hedge_wins_total", stage=stage)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task, (marker, started) in attempts.items():
+                if not task.done():
+                    if winner is not None:
+                        marker.lost = True
+                        hedge.record(time.perf_counter() - started)
+                    task.cancel()
+
+    async def _call(self, stage: str, request: Callable[[float], Awaitable[T]]) -> T:
+        """One call, retried"""
+        attempt = 0
+        while True:
+            try:
+                async with self.limit(stage) as timeout:
+                    return await request(timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                hint = retry_after(e)
+                if attempt >= self.max_retries:
+                    raise ProviderUnavailable(f"{stage} provider failed: {str(e)}", retry_after=hint) from e
+                delay = backoff(attempt, self.retry_base, self.retry_cap, hint)
+                left = remaining()
+                if left is not None and delay >= left:
+                    raise DeadlineExceeded(f"{stage} deadline exceeded after {attempt + 1} attempts") from e
+                metrics.inc("provider_retries_total", stage=stage)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def warm(self):
+        """Open PROVIDER_WARM_CONNECTIONS keep-alive connections before the first request needs them"""
+        if not self.client:
+            return
+
+        async def touch():
+            try:
+                await self.client.models.list(timeout=_env_float("PROVIDER_CONNECT_TIMEOUT", 5.0))
+            except APIStatusError:
+                pass  # any HTTP answer means the connection is open
+
+        await asyncio.gather(*(touch() for _ in range(_env_int("PROVIDER_WARM_CONNECTIONS", 2))))
+
+    def _gauges(self) -> Dict[str, float]:
+        gauges = {}
+        for stage, limiter in self.limits.items():
+            gauges[f"provider_limit_{stage}"] = round(limiter.limit, 2)
+            gauges[f"provider_inflight_{stage}"] = limiter.inflight
+            gauges[f"provider_queued_{stage}"] = len(limiter.waiters)
+            for priority in PRIORITIES:
+                gauges[f"provider_queued_{stage}_{priority}"] = limiter.waiters.queued(priority)
+            gauges[f"provider_breaker_open_{stage}"] = int(self.breakers[stage].is_open)
+        for stage, hedge in self.hedges.items():
+            gauges[f"provider_hedge_delay_{stage}"] = round(hedge.delay() or 0.0, 4)
+        return gauges
+
+    async def close(self):
+        """Release pooled connections"""
+        metrics.collectors.remove(self._gauges)
+        if self.client:
+            await self.client.close()
+
+
+_provider: Optional[Provider] = None
+
+
+def get_provider() -> Provider:
+    """Return the process-wide provider, creating it on first use"""
+    global _provider
+    if _provider is None:
+        _provider = Provider()
+    return _provider
+
+
+async def close_provider():
+    """Close the process-wide provider if one was created"""
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+        _provider = None
@@ -0,0 +1,235 @@
+"""Load shedding for provider calls: adaptive limits, retries, deadlines and circuit breakers"""
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Optional
+
+import httpx
+
+from services.metrics import metrics
+from services.scheduler import PRIORITIES, FairQueue, running_work
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("provider_deadline", default=None)
+
+
+class ProviderError(Exception):
+    """A provider call that was refused or gave up; routes map it to status_code"""
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderUnavailable(ProviderError):
+    """Retryable upstream failures persisted through every retry"""
+
+
+class Overloaded(ProviderError):
+    """Too many calls already waiting for a stage"""
+
+
+class CircuitOpen(ProviderError):
+    """The stage's breaker is open after repeated upstream failures"""
+
+
+class DeadlineExceeded(ProviderError):
+    """The incoming request's deadline passed before the provider answered"""
+    status_code = 504
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Bound provider calls made within the block (nested deadlines keep the earlier one)"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx; never our own 4xx"""
+    import openai  # here rather than at the top: it is slow to import and only engines need it loaded
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def is_overload(error: Exception) -> bool:
+    """Errors that mean the provider wants less traffic"""
+    import openai
+    if isinstance(error, openai.APITimeoutError) or isinstance(error, httpx.TimeoutException):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (429, 503, 504)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The provider's Retry-After hint in seconds, if it sent one"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+def backoff(attempt: int, base: float, cap: float, hint: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's hint"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, hint or 0.0)
+
+
+class AdaptiveLimit:
+    """
+    AIMD in-flight limit: each success raises the limit by 1/limit (about +1
+    per round of calls), each overload signal halves it. Callers beyond the
+    limit wait in a FairQueue: interactive before batch, and fairly between
+    flows within each class. Past max_queue waiters of their class they are
+    refused at once, so a batch backlog never refuses an interactive call.
+    """
+
+    def __init__(self, initial: int, maximum: int, max_queue: int, minimum: int = 1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.waiters = FairQueue()
+
+    async def acquire(self, timeout: Optional[float] = None):
+        if self.inflight < int(self.limit) and not self.waiters:
+            self.inflight += 1
+            return
+        work = running_work()
+        if self.waiters.queued(work.priority) >= self.max_queue:
+            raise Overloaded("too many provider calls queued", retry_after=1.0)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.push(future, work.priority, work.flow)
+        if work.priority != PRIORITIES[0]:
+            work.queued[future] = self.waiters  # may be promoted while it waits
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot arrived just as we gave up
+            else:
+                future.cancel()
+                self.waiters.remove(future)
+            raise
+        finally:
+            work.queued.pop(future, None)
+
+    def release(self, success: bool = False, overload: bool = False):
+        self.inflight -= 1
+        if overload:
+            self.limit = max(self.minimum, self.limit / 2)
+        elif success:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        while self.waiters and self.inflight < int(self.limit):
+            future = self.waiters.popleft()
+            if not future.done():
+                self.inflight += 1
+                future.set_result(None)
+
+
+class HedgePolicy:
+    """
+    When to send a second copy of a call that is running late: once it has
+    taken longer than the `percentile` of the stage's last `window` call
+    latencies, and only while hedges stay within `budget` (a fraction) of all
+    calls: each call earns `budget` of a token, each hedge spends a whole one,
+    and at most `burst` tokens are banked for a run of slow calls.
+    """
+
+    def __init__(self, percentile: float, budget: float, window: int = 200, min_samples: int = 20, burst: float = 5.0):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.tokens = 0.0
+        self._threshold: Optional[float] = None
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging a call starting now, or None until enough latencies are known"""
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._threshold is None:
+            ordered = sorted(self.samples)
+            self._threshold = ordered[min(int(self.percentile * len(ordered)), len(ordered) - 1)]
+        return self._threshold
+
+    def record(self, seconds: float):
+        """Latency of one call (for a cancelled loser, how long it had run: a lower bound)"""
+        self.samples.append(seconds)
+        self._threshold = None
+
+    def earn(self):
+        self.tokens = min(self.tokens + self.budget, self.burst)
+
+    def spend(self) -> bool:
+        """Take a token for one hedge; False once the budget is used up"""
+        if self.tokens < 1 - 1e-9:  # ten earns of 0.1 sum to just under 1.0
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive retryable failures and refuses calls
+    for `cooldown` seconds; then lets a single probe through (half-open),
+    which closes it on success or reopens it on failure.
+    """
+
+    def __init__(self, stage: str, threshold: int, cooldown: float):
+        self.stage = stage
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go ahead"""
+        if self.opened_at is None:
+            return
+        wait = self.opened_at + self.cooldown - time.monotonic()
+        if wait > 0 or self.probing:
+            raise CircuitOpen(f"{self.stage} provider unavailable", retry_after=max(wait, 1.0))
+        self.probing = True
+
+    def record(self, success: bool = False, failure: bool = False):
+        """Outcome of a call let through by check(); neither flag means no signal"""
+        if success:
+            self.failures = 0
+            self.opened_at = None
+        elif failure:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None or self.probing:
+                    metrics.inc("provider_breaker_trips_total", stage=self.stage)
+                self.opened_at = time.monotonic()
+        self.probing = False
@@ -0,0 +1,139 @@
+"""LLM response cache keyed on normalized query text, with optional near-duplicate matching"""
+import re
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict, Counter
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """Casefold, drop punctuation and collapse whitespace (works for Hebrew too)"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def ngrams(text: str, n: int = 3) -> Set[str]:
+    """Character n-grams of the normalized text, padded at word edges"""
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+@dataclass
+class _Entry:
+    response: str
+    expires_at: float
+    latency: float
+    scope: str
+    grams: Set[str]
+
+
+class ResponseCache:
+    """TTL + LRU cache of LLM responses, scoped by language and system prompt"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # None disables near-duplicate lookups; otherwise a Jaccard threshold in (0, 1]
+        self.similarity = similarity
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.index: Dict[Tuple[str, str], Set[str]] = {}
+        self.counters = {
+            "hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+        }
+        self.latency_saved = 0.0
+
+    @staticmethod
+    def _scope(language: str, system_prompt: str) -> str:
+        return hashlib.sha256(f"{language}\x1f{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+    def _key(self, normalized: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+    def key(self, query: str, language: str, system_prompt: str) -> str:
+        """The exact-match key of a query, also used for it in the shared store"""
+        return self._key(normalize_query(query), self._scope(language, system_prompt))
+
+    def get(self, query: str, language: str, system_prompt: str) -> Optional[str]:
+        """Return a cached response for this query, or None"""
+        normalized = normalize_query(query)
+        scope = self._scope(language, system_prompt)
+        key = self._key(normalized, scope)
+
+        entry = self._live(key)
+        if entry is not None:
+            self.counters["hits"] += 1
+        elif self.similarity:
+            key = self._nearest(normalized, scope)
+            entry = self._live(key) if key else None
+            if entry is not None:
+                self.counters["near_hits"] += 1
+
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.latency_saved += entry.latency
+        return entry.response
+
+    def put(self, query: str, language: str, system_prompt: str, response: str, latency: float = 0.0):
+        """Store a response along with how long the LLM took to produce it"""
+        normalized = normalize_query(query)
+        scope = self._scope(language, system_prompt)
+        key = self._key(normalized, scope)
+        if key in self.entries:
+            self._remove(key)
+        grams = ngrams(normalized) if self.similarity else set()
+        self.entries[key] = _Entry(response, time.monotonic() + self.ttl_seconds, latency, scope, grams)
+        for gram in grams:
+            self.index.setdefault((scope, gram), set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.counters["evictions"] += 1
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.counters["expirations"] += 1
+            return None
+        return entry
+
+    def _nearest(self, normalized: str, scope: str) -> Optional[str]:
+        """Best cached key by n-gram Jaccard similarity, if above the threshold"""
+        grams = ngrams(normalized)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.index.get((scope, gram), ()))
+        best, best_score = None, 0.0
+        for key, shared in overlap.items():
+            score = shared / (len(grams) + len(self.entries[key].grams) - shared)
+            if score > best_score:
+                best, best_score = key, score
+        return best if best_score >= self.similarity else None
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        for gram in entry.grams:
+            keys = self.index.get((entry.scope, gram))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.index[(entry.scope, gram)]
+
+    def stats(self) -> Dict[str, float]:
+        """Counters, hit ratio and total LLM latency avoided"""
+        hits = self.counters["hits"] + self.counters["near_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,188 @@
+"""Priority classes and weighted fair queuing for calls waiting on a limited resource"""
+import os
+import heapq
+import asyncio
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Served in this order: a waiting interactive call always goes before any batch call
+PRIORITIES = ("interactive", "batch")
+
+
+class Work:
+    """
+    The priority class and flow of the work running in a context; a flow is
+    whoever the queue is fair between: a client, or a session without one.
+    Shared with the tasks the work starts, so promote() reaches the calls
+    they have queued.
+    """
+    __slots__ = ("priority", "flow", "queued")
+
+    def __init__(self, priority: str, flow: str):
+        self.priority = priority
+        self.flow = flow
+        # Futures of this work's calls waiting in a FairQueue, while it can still be promoted
+        self.queued: Dict[asyncio.Future, "FairQueue"] = {}
+
+    def promote(self, priority: str):
+        """Raise the work to `priority` if that is higher, moving its queued calls along"""
+        if PRIORITIES.index(priority) >= PRIORITIES.index(self.priority):
+            return
+        self.priority = priority
+        for future, queue in list(self.queued.items()):
+            queue.reprioritize(future, priority)
+
+
+_work: ContextVar[Work] = ContextVar("scheduler_work", default=Work("interactive", "anonymous"))
+
+
+def _weights() -> Dict[str, float]:
+    """SCHEDULER_WEIGHTS, e.g. "kiosk=4,nightly-export=0.5"; unlisted flows weigh 1"""
+    weights = {}
+    for entry in os.getenv("SCHEDULER_WEIGHTS", "").split(","):
+        flow, _, weight = entry.partition("=")
+        try:
+            if flow.strip() and float(weight) > 0:
+                weights[flow.strip()] = float(weight)
+        except ValueError:
+            pass
+    return weights
+
+
+@contextmanager
+def work_class(priority: str, flow: Optional[str] = None):
+    """Queue calls made within the block under `priority`, fairly against other flows"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"unknown priority {priority!r}")
+    token = _work.set(Work(priority, flow or "anonymous"))
+    try:
+        yield
+    finally:
+        _work.reset(token)
+
+
+def current_work() -> Tuple[str, str]:
+    """(priority class, flow) of the calling context"""
+    work = _work.get()
+    return work.priority, work.flow
+
+
+def running_work() -> Work:
+    """The Work of the calling context itself, for queues that let it be promoted"""
+    return _work.get()
+
+
+def start_shared(fn: Callable[[], Awaitable[T]]) -> Tuple[Work, "asyncio.Task[T]"]:
+    """
+    Start fn() as a task shared by several callers, under its own copy of the
+    caller's Work: a caller of a higher class that joins it later promotes
+    the copy (and the calls it has queued), not the first caller's own work.
+    """
+    work = Work(*current_work())
+
+    async def run() -> T:
+        _work.set(work)
+        return await fn()
+
+    return work, asyncio.ensure_future(run())
+
+
+def client_flow(connection) -> str:
+    """The flow of an HTTP request or WebSocket: X-Client-Id, else the peer address"""
+    client_id = connection.headers.get("x-client-id")
+    if client_id:
+        return client_id[:128]
+    return connection.client.host if connection.client else "anonymous"
+
+
+@dataclass(order=True)
+class _Waiter:
+    start: float
+    sequence: int
+    future: asyncio.Future = field(compare=False)
+    priority: str = field(compare=False)
+    flow: str = field(compare=False)
+    removed: bool = field(default=False, compare=False)
+
+
+class FairQueue:
+    """
+    Waiters by strict priority class, and within a class by start-time fair
+    queuing over flows: a waiter's start tag is the later of the class's
+    virtual time and the finish tag of its flow's previous waiter, and each
+    waiter adds 1/weight to its flow's finish tag. Lowest start tag goes
+    first, so a flow with a hundred waiters takes turns with one that has a
+    single waiter instead of being ahead of it, and a flow of weight 2 gets
+    two turns for each of a weight-1 flow's.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        # Read here rather than at import, so SCHEDULER_WEIGHTS from backend/.env applies
+        self.weights = _weights() if weights is None else weights
+        self.heaps: Dict[str, List[_Waiter]] = {priority: [] for priority in PRIORITIES}
+        self.clock: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self.counts: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        # Finish tag and waiter count of each flow that has waiters; an idle flow
+        # starts again at the class clock, without credit for the time it was away
+        self.flows: Dict[Tuple[str, str], List[float]] = {}
+        self.entries: Dict[asyncio.Future, _Waiter] = {}
+        self.sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def queued(self, priority: str) -> int:
+        return self.counts[priority]
+
+    def push(self, future: asyncio.Future, priority: str, flow: str):
+        state = self.flows.setdefault((priority, flow), [0.0, 0])
+        start = max(self.clock[priority], state[0])
+        state[0] = start + 1 / self.weights.get(flow, 1.0)
+        state[1] += 1
+        waiter = _Waiter(start, next(self.sequence), future, priority, flow)
+        heapq.heappush(self.heaps[priority], waiter)
+        self.counts[priority] += 1
+        self.entries[future] = waiter
+
+    def popleft(self) -> asyncio.Future:
+        """The next future to serve; raises IndexError when empty"""
+        for priority in PRIORITIES:
+            heap = self.heaps[priority]
+            while heap:
+                waiter = heapq.heappop(heap)
+                if waiter.removed:
+                    continue
+                self.clock[priority] = waiter.start
+                self._forget(waiter)
+                return waiter.future
+        raise IndexError("pop from an empty FairQueue")
+
+    def reprioritize(self, future: asyncio.Future, priority: str):
+        """Move a waiter to another class, queued as a new arrival of its flow there"""
+        waiter = self.entries.get(future)
+        if waiter is not None and waiter.priority != priority:
+            self.remove(future)
+            self.push(future, priority, waiter.flow)
+
+    def remove(self, future: asyncio.Future):
+        """Drop a waiter that gave up (it is skipped when its turn comes)"""
+        waiter = self.entries.get(future)
+        if waiter is not None:
+            waiter.removed = True
+            self._forget(waiter)
+
+    def _forget(self, waiter: _Waiter):
+        del self.entries[waiter.future]
+        self.counts[waiter.priority] -= 1
+        key = (waiter.priority, waiter.flow)
+        state = self.flows[key]
+        state[1] -= 1
+        if state[1] == 0:
+            del self.flows[key]
+        if not self.counts[waiter.priority]:
+            self.heaps[waiter.priority].clear()
@@ -0,0 +1,108 @@
+"""Sentence and clause segmentation for incremental TTS (English and Hebrew)"""
+import re
+from typing import List
+
+# Provider limit for a single TTS request is 4096 characters
+MAX_SEGMENT_CHARS = 4000
+
+# Terminal punctuation: . ! ? ellipsis and Hebrew sof pasuq, plus any closing quotes/brackets
+SENTENCE_END = re.compile(r"[.!?…׃]+[\"'”’״)\]]*(?=\s)")
+# Clause boundaries used to break up sentences that are still too long
+CLAUSE_END = re.compile(r"[,;:–—]+(?=\s)")
+ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "dr.", "prof.", "st."}
+
+
+def _boundaries(pattern: re.Pattern, text: str) -> List[int]:
+    """Offsets just past each match of pattern, skipping common abbreviations"""
+    ends = []
+    for match in pattern.finditer(text):
+        word = text[:match.end()].rsplit(None, 1)[-1].lower()
+        if word not in ABBREVIATIONS:
+            ends.append(match.end())
+    return ends
+
+
+def _split_at(pattern: re.Pattern, text: str) -> List[str]:
+    """Split text after each match of pattern, keeping the punctuation"""
+    parts, start = [], 0
+    for end in _boundaries(pattern, text):
+        parts.append(text[start:end].strip())
+        start = end
+    parts.append(text[start:].strip())
+    return [part for part in parts if part]
+
+
+def _pack(pieces: List[str], max_chars: int) -> List[str]:
+    """Greedily join pieces into chunks of at most max_chars"""
+    chunks, current = [], ""
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            if current:
+                chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break an over-long sentence at clause boundaries, then at whitespace"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    for clause in _split_at(CLAUSE_END, sentence):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+            continue
+        for word in clause.split():
+            # A single unbroken run longer than max_chars is hard-wrapped
+            pieces.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+    return _pack(pieces, max_chars)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences on English and Hebrew terminal punctuation"""
+    return _split_at(SENTENCE_END, text)
+
+
+def segment_text(text: str, max_chars: int = MAX_SEGMENT_CHARS) -> List[str]:
+    """Split text into sentence chunks, none longer than max_chars"""
+    segments = []
+    for sentence in split_sentences(text):
+        segments.extend(_split_long(sentence, max_chars))
+    return segments
+
+
+def group_segments(segments: List[str], target_chars: int) -> List[str]:
+    """Merge consecutive short segments into chunks of about target_chars"""
+    return _pack(segments, target_chars)
+
+
+class SentenceBuffer:
+    """Accumulates streamed text and releases complete sentences"""
+
+    def __init__(self, max_chars: int = MAX_SEGMENT_CHARS):
+        self.buffer = ""
+        self.max_chars = max_chars
+
+    def feed(self, text: str) -> List[str]:
+        """Add text and return any sentences it completed"""
+        self.buffer += text
+        # A sentence is complete once whitespace follows its punctuation
+        ends = _boundaries(SENTENCE_END, self.buffer)
+        complete = []
+        if ends:
+            done, self.buffer = self.buffer[:ends[-1]], self.buffer[ends[-1]:].lstrip()
+            complete = segment_text(done, self.max_chars)
+        if len(self.buffer) > self.max_chars:
+            *ready, self.buffer = _split_long(self.buffer, self.max_chars)
+            complete.extend(ready)
+        return complete
+
+    def flush(self) -> List[str]:
+        """Return whatever text is left as a final sentence"""
+        rest, self.buffer = self.buffer.strip(), ""
+        return _split_long(rest, self.max_chars) if rest else []
@@ -0,0 +1,487 @@
+"""Key-value store shared by the workers on a node: SQLite in WAL mode by default, Redis optionally"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from services.metrics import metrics
+from services.resilience import DeadlineExceeded, remaining
+from services.scheduler import PRIORITIES, current_work
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path(__file__).parent.parent / ".cache" / "shared.db"
+# A waiter polls for another worker's result from POLL_START, doubling up to POLL_MAX
+POLL_START = 0.005
+POLL_MAX = 0.1
+
+
+class SharedStore:
+    """
+    Bytes by (namespace, key), visible to every worker using the same backend.
+    get_or_compute() computes a missing value once across all of them: the
+    first caller takes a lease and computes, the others wait for its value.
+    A lease expires after SHARED_STORE_LEASE_SECONDS, so a worker that dies
+    mid-compute holds the others up for at most that long. Its token names
+    the holder's priority class: interactive work does not wait behind a
+    batch job's compute, it computes the value itself.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.lease_seconds = float(os.getenv("SHARED_STORE_LEASE_SECONDS", "60"))
+        self.limits: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def limit(self, namespace: str, max_bytes: Optional[int] = None, max_entries: Optional[int] = None):
+        """Evict a namespace's least recently used entries past these bounds"""
+        self.limits[namespace] = (max_bytes, max_entries)
+
+    def _count(self, namespace: str, outcome: str):
+        counters = self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "computed": 0, "waited": 0})
+        counters[outcome] += 1
+        metrics.inc("shared_store_total", namespace=namespace, outcome=outcome)
+
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        value = await self._get(namespace, key)
+        self._count(namespace, "hits" if value is not None else "misses")
+        return value
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store a value, expiring after ttl seconds if given"""
+        await self._set(namespace, key, value, ttl)
+
+    async def get_or_compute(
+        self, namespace: str, key: str, compute: Callable[[], Awaitable[bytes]], ttl: Optional[float] = None,
+    ) -> bytes:
+        """The stored value, or compute() run by exactly one worker and stored for all"""
+        value = await self.get(namespace, key)
+        if value is not None:
+            return value
+        while True:
+            token = await self._acquire(namespace, key, self.lease_seconds)
+            if token is not None:
+                try:
+                    # The previous lease holder may have stored it since our miss
+                    value = await self._get(namespace, key)
+                    if value is None:
+                        value = await compute()
+                        await self._set(namespace, key, value, ttl)
+                        self._count(namespace, "computed")
+                    return value
+                finally:
+                    await self._release(namespace, key, token)
+
+            # Another worker is computing it: wait for its value rather than computing it again
+            delay = POLL_START
+            value, holder = await self._probe(namespace, key)
+            while value is None and holder is not None and not self._outranks(holder):
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded("deadline exceeded waiting for another worker")
+                await asyncio.sleep(delay if left is None else min(delay, left))
+                delay = min(delay * 2, POLL_MAX)
+                value, holder = await self._probe(namespace, key)
+            if value is not None:
+                self._count(namespace, "waited")
+                return value
+            if holder is not None:
+                # Held for a batch job: interactive work computes it itself rather than queue behind it
+                value = await compute()
+                await self._set(namespace, key, value, ttl)
+                self._count(namespace, "computed")
+                return value
+            # The lease ended without a value (that compute failed or its worker died): take it over
+
+    @staticmethod
+    def _token() -> str:
+        """A lease token, prefixed with the caller's priority class"""
+        return f"{current_work()[0]}:{uuid.uuid4().hex}"
+
+    @staticmethod
+    def _outranks(holder: str) -> bool:
+        """Whether the caller is of a higher class than the lease holder, and should not wait on it"""
+        held = holder.partition(":")[0]
+        return held in PRIORITIES and PRIORITIES.index(current_work()[0]) < PRIORITIES.index(held)
+
+    async def lease(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        """A token if this caller now holds the lease on key, else None"""
+        return await self._acquire(namespace, key, seconds)
+
+    async def release(self, namespace: str, key: str, token: str):
+        await self._release(namespace, key, token)
+
+    async def stats(self) -> Dict:
+        """Counters of this worker per namespace, plus what the backend knows of the shared contents"""
+        usage = await self._usage()
+        return {
+            "backend": self.name,
+            "namespaces": {
+                namespace: {**self.counters.get(namespace, {}), **usage.get(namespace, {})}
+                for namespace in sorted({*self.counters, *usage})
+            },
+        }
+
+    # Backend primitives
+
+    async def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        raise NotImplementedError
+
+    async def _acquire(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        raise NotImplementedError
+
+    async def _release(self, namespace: str, key: str, token: str):
+        raise NotImplementedError
+
+    async def _probe(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """(value or None, token of the live lease on the key or None)"""
+        raise NotImplementedError
+
+    async def _usage(self) -> Dict[str, Dict[str, int]]:
+        return {}
+
+    async def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, used_at);
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS usage (
+    namespace TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    entries INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries BEGIN
+    INSERT OR IGNORE INTO usage (namespace) VALUES (NEW.namespace);
+    UPDATE usage SET bytes = bytes + NEW.size, entries = entries + 1 WHERE namespace = NEW.namespace;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries BEGIN
+    UPDATE usage SET bytes = bytes - OLD.size, entries = entries - 1 WHERE namespace = OLD.namespace;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_resized AFTER UPDATE OF size ON entries BEGIN
+    UPDATE usage SET bytes = bytes - OLD.size + NEW.size WHERE namespace = NEW.namespace;
+END;
+"""
+
+# Reads refresh an entry's LRU position at most this often, so most reads write nothing
+TOUCH_INTERVAL = 60.0
+
+
+class SQLiteStore(SharedStore):
+    """
+    One SQLite file per node (SHARED_STORE_PATH). WAL lets every worker read
+    while one writes; each worker's calls run on one thread of its own, off the
+    event loop. Sizes per namespace are kept by triggers, so limits hold across
+    workers. Times are wall-clock, which all processes agree on.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-store")
+        # Autocommit: each statement is its own transaction, holding the write lock only briefly
+        self.db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # A cache, not a ledger: losing the last writes on power loss is acceptable
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _read(self, namespace: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        row = self.db.execute(
+            "SELECT rowid, value, expires_at, used_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        rowid, value, expires_at, used_at = row
+        if expires_at is not None and expires_at <= now:
+            self.db.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+            return None
+        if now - used_at > TOUCH_INTERVAL:
+            self.db.execute("UPDATE entries SET used_at = ? WHERE rowid = ?", (now, rowid))
+        return value
+
+    def _write(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO entries (namespace, key, value, size, expires_at, used_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "expires_at = excluded.expires_at, used_at = excluded.used_at",
+            (namespace, key, value, len(value), now + ttl if ttl else None, now),
+        )
+        self._evict(namespace, now)
+
+    def _usage_of(self, namespace: str) -> Tuple[int, int]:
+        row = self.db.execute("SELECT bytes, entries FROM usage WHERE namespace = ?", (namespace,)).fetchone()
+        return row or (0, 0)
+
+    def _evict(self, namespace: str, now: float):
+        max_bytes, max_entries = self.limits.get(namespace, (None, None))
+        size, count = self._usage_of(namespace)
+        if (max_bytes is None or size <= max_bytes) and (max_entries is None or count <= max_entries):
+            return
+        self.db.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+        # Down to 90% of the bounds, so the next few writes do not each evict
+        max_bytes = int(max_bytes * 0.9) if max_bytes is not None else None
+        max_entries = int(max_entries * 0.9) if max_entries is not None else None
+        size, count = self._usage_of(namespace)
+        while count and ((max_bytes is not None and size > max_bytes) or (max_entries is not None and count > max_entries)):
+            batch = count - max_entries if max_entries is not None and count > max_entries else 16
+            self.db.execute(
+                "DELETE FROM entries WHERE rowid IN "
+                "(SELECT rowid FROM entries WHERE namespace = ? ORDER BY used_at LIMIT ?)",
+                (namespace, batch),
+            )
+            size, count = self._usage_of(namespace)
+
+    def _take(self, namespace: str, key: str, seconds: float, token: str) -> Optional[str]:
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT INTO leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at <= ?",
+            (namespace, key, token, now + seconds, now),
+        )
+        return token if cursor.rowcount == 1 else None
+
+    def _drop(self, namespace: str, key: str, token: str):
+        self.db.execute("DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?", (namespace, key, token))
+
+    def _look(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        value = self._read(namespace, key)
+        if value is not None:
+            return value, None
+        lease = self.db.execute(
+            "SELECT owner FROM leases WHERE namespace = ? AND key = ? AND expires_at > ?", (namespace, key, time.time())
+        ).fetchone()
+        return None, lease[0] if lease is not None else None
+
+    def _sizes(self) -> Dict[str, Dict[str, int]]:
+        rows = self.db.execute("SELECT namespace, bytes, entries FROM usage WHERE entries > 0").fetchall()
+        return {namespace: {"bytes": size, "entries": count} for namespace, size, count in rows}
+
+    async def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        return await self._run(self._read, namespace, key)
+
+    async def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        await self._run(self._write, namespace, key, value, ttl)
+
+    async def _acquire(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        return await self._run(self._take, namespace, key, seconds, self._token())
+
+    async def _release(self, namespace: str, key: str, token: str):
+        await self._run(self._drop, namespace, key, token)
+
+    async def _probe(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        return await self._run(self._look, namespace, key)
+
+    async def _usage(self) -> Dict[str, Dict[str, int]]:
+        return await self._run(self._sizes)
+
+    async def close(self):
+        await self._run(self.db.close)
+        self.executor.shutdown(wait=False)
+
+
+class RedisStore(SharedStore):
+    """
+    Redis, or anything speaking its protocol (SHARED_STORE_URL), for state
+    shared beyond one node. Redis bounds its own memory (maxmemory with an
+    allkeys-lru policy), so namespace limits are not applied here.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "smartspeak:"):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("SHARED_STORE=redis needs the redis package (pip install redis)")
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.watch_error = redis.WatchError
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _lease_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}lease:{namespace}:{key}"
+
+    async def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        return await self.client.get(self._key(namespace, key))
+
+    async def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        await self.client.set(self._key(namespace, key), value, px=int(ttl * 1000) if ttl else None)
+
+    async def _acquire(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        token = self._token()
+        taken = await self.client.set(self._lease_key(namespace, key), token, nx=True, px=int(seconds * 1000))
+        return token if taken else None
+
+    async def _release(self, namespace: str, key: str, token: str):
+        # Delete only our own lease: it may have expired and been taken by another worker
+        lease = self._lease_key(namespace, key)
+        async with self.client.pipeline() as pipe:
+            try:
+                await pipe.watch(lease)
+                if await pipe.get(lease) == token.encode():
+                    pipe.multi()
+                    pipe.delete(lease)
+                    await pipe.execute()
+            except self.watch_error:
+                pass
+
+    async def _probe(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self._key(namespace, key))
+            pipe.get(self._lease_key(namespace, key))
+            value, holder = await pipe.execute()
+        return value, holder.decode() if holder is not None else None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class MemoryStore(SharedStore):
+    """This process only: for a single worker, or to compare against the shared backends"""
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.entries: Dict[str, "OrderedDict[str, Tuple[bytes, Optional[float]]]"] = {}
+        self.sizes: Dict[str, int] = {}
+        self.leases: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+    async def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        entries = self.entries.get(namespace, {})
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            self.sizes[namespace] -= len(entries.pop(key)[0])
+            return None
+        entries.move_to_end(key)
+        return entry[0]
+
+    async def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        entries = self.entries.setdefault(namespace, OrderedDict())
+        if key in entries:
+            self.sizes[namespace] -= len(entries.pop(key)[0])
+        entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self.sizes[namespace] = self.sizes.get(namespace, 0) + len(value)
+        max_bytes, max_entries = self.limits.get(namespace, (None, None))
+        while entries and (
+            (max_entries is not None and len(entries) > max_entries)
+            or (max_bytes is not None and self.sizes[namespace] > max_bytes)
+        ):
+            _, (evicted, _) = entries.popitem(last=False)
+            self.sizes[namespace] -= len(evicted)
+
+    async def _acquire(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        held = self.leases.get((namespace, key))
+        if held is not None and held[1] > time.monotonic():
+            return None
+        token = self._token()
+        self.leases[(namespace, key)] = (token, time.monotonic() + seconds)
+        return token
+
+    async def _release(self, namespace: str, key: str, token: str):
+        held = self.leases.get((namespace, key))
+        if held is not None and held[0] == token:
+            del self.leases[(namespace, key)]
+
+    async def _probe(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        held = self.leases.get((namespace, key))
+        return await self._get(namespace, key), held[0] if held is not None and held[1] > time.monotonic() else None
+
+    async def _usage(self) -> Dict[str, Dict[str, int]]:
+        return {
+            namespace: {"bytes": self.sizes.get(namespace, 0), "entries": len(entries)}
+            for namespace, entries in self.entries.items()
+        }
+
+
+class NullStore(SharedStore):
+    """Stores nothing: every get_or_compute() computes (benchmarks measuring uncached paths)"""
+    name = "none"
+
+    async def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        return None
+
+    async def _set(self, namespace: str, key: str, value: bytes, ttl: Optional[float]):
+        pass
+
+    async def _acquire(self, namespace: str, key: str, seconds: float) -> Optional[str]:
+        return "none"
+
+    async def _release(self, namespace: str, key: str, token: str):
+        pass
+
+    async def _probe(self, namespace: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        return None, None
+
+
+def create_store() -> SharedStore:
+    """The store chosen by SHARED_STORE: sqlite (default), redis, memory or none"""
+    backend = os.getenv("SHARED_STORE", "sqlite")
+    if backend == "sqlite":
+        store = SQLiteStore(os.getenv("SHARED_STORE_PATH") or str(DEFAULT_PATH))
+    elif backend == "redis":
+        store = RedisStore(os.getenv("SHARED_STORE_URL", "redis://localhost:6379/0"))
+    elif backend == "memory":
+        store = MemoryStore()
+    elif backend == "none":
+        store = NullStore()
+    else:
+        raise ValueError(f"Unknown SHARED_STORE {backend!r}; choose one of sqlite, redis, memory, none")
+    logger.info(f"Shared store: {store.name}")
+    return store
+
+
+_store: Optional[SharedStore] = None
+
+
+def get_store() -> SharedStore:
+    """Return the process-wide shared store, creating it on first use"""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+
+async def close_store():
+    """Close the process-wide shared store if one was created"""
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
@@ -0,0 +1,64 @@
+"""Coalescing of identical in-flight calls (single-flight)"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+from services.metrics import metrics
+from services.scheduler import Work, current_work, start_shared
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one call and all receive its
+    result or exception. The call runs as its own task, so a caller that is
+    cancelled (e.g. a client disconnect) does not cancel it for the others;
+    once every caller is gone, it is cancelled too. The call queues under
+    the highest priority class among its callers: an interactive caller
+    joining a call a batch job started promotes it.
+    Nothing is kept once the call finishes; caching stays the caches' job.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.callers: Dict[asyncio.Task, int] = {}
+        self.works: Dict[asyncio.Task, Work] = {}
+        self.counters = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.inflight.get(key)
+        if task is None:
+            work, task = start_shared(fn)
+            self.inflight[key] = task
+            self.works[task] = work
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.counters["calls"] += 1
+        else:
+            self.counters["coalesced"] += 1
+            self.works[task].promote(current_work()[0])
+            metrics.inc("singleflight_saved_total", stage=self.stage)
+        self.callers[task] = self.callers.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.callers[task] == 1:
+                # Unlisted now, not when the cancellation lands, so the next caller starts afresh
+                if self.inflight.get(key) is task:
+                    del self.inflight[key]
+                task.cancel()
+            raise
+        finally:
+            self.callers[task] -= 1
+            if not self.callers[task]:
+                del self.callers[task]
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        self.works.pop(task, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here so an unawaited failure is not logged as lost
+
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls made, calls saved by sharing, and calls in flight now"""
+        return {**self.counters, "inflight": len(self.inflight)}
@@ -1,40 +1,167 @@
-"""Text-to-Speech service using OpenAI TTS"""
+"""Text-to-Speech service: caching, coalescing and sentence streaming around a TTS engine"""
+import io
 import os
+import wave
+import struct
+import asyncio
 import logging
-import base64
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from services.engines import create_engine
+from services.audio_cache import AudioCache, cache_key
+from services.shared_store import get_store
+from services.metrics import metrics
+from services.single_flight import SingleFlight
+from services.resilience import ProviderError
+from services.segmenter import segment_text, group_segments, MAX_SEGMENT_CHARS
 
 logger = logging.getLogger(__name__)
 
+# Short acknowledgements synthesized at startup, to play while an answer is computed
+OPENERS = {
+    "en": "One moment.",
+    "he": "רגע אחד.",
+}
+
+# RIFF and data sizes of a WAV streamed before its length is known
+STREAMING_SIZE = 0xFFFFFFFF
+
+
+def join_wav(segments: List[bytes], streaming: bool = False) -> bytes:
+    """
+    The frames of several WAVs under the first one's header: concatenated
+    WAVs would stop a player at the end of the first. With `streaming` the
+    header's sizes are left open, for the start of a stream more frames follow.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        for i, segment in enumerate(segments):
+            with wave.open(io.BytesIO(segment)) as part:
+                if i == 0:
+                    out.setparams(part.getparams())
+                out.writeframes(part.readframes(part.getnframes()))
+    audio = buffer.getvalue()
+    if streaming:
+        audio = audio[:4] + struct.pack("<I", STREAMING_SIZE) + audio[8:40] + struct.pack("<I", STREAMING_SIZE) + audio[44:]
+    return audio
+
+
+def wav_frames(audio: bytes) -> bytes:
+    """The PCM frames of a WAV, without its header"""
+    with wave.open(io.BytesIO(audio)) as part:
+        return part.readframes(part.getnframes())
+
+
 class TTSService:
-    """Handles text-to-speech conversion"""
+    """Handles text-to-speech conversion with the configured TTS engine (TTS_ENGINE)"""
     
     def __init__(self):
-        self.api_key = os.getenv("EMERGENT_LLM_KEY") or os.getenv("OPENAI_API_KEY")
-        self.client = None
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-            logger.info("TTSService: OpenAI TTS client initialized")
-        else:
-            logger.warning("TTSService: No API key - using mock mode")
+        self.engine = create_engine("tts")
+        self.segment_concurrency = int(os.getenv("TTS_SEGMENT_CONCURRENCY", "4"))
+        self.segment_chars = int(os.getenv("TTS_SEGMENT_CHARS", "400"))
+        self.cache = AudioCache(max_memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_MB", "64")) * 1024 * 1024)
+        # Behind the in-process LRU: audio shared by every worker and kept across restarts
+        self.shared = get_store()
+        self.shared.limit("tts", max_bytes=int(os.getenv("TTS_CACHE_SHARED_MB", "512")) * 1024 * 1024)
+        self.flights = SingleFlight("tts")
+        # Opener audio is pinned here rather than left to the LRU
+        self.openers: Dict[Tuple[str, str], bytes] = {}
     
     async def text_to_speech(self, text: str, voice: str = "nova") -> bytes:
         """Convert text to speech audio"""
-        if not self.client:
-            # MOCK MODE - 1 second silence WAV
-            logger.info(f"TTS MOCK: {text[:50]}...")
-            # Valid WAV base64 (silence)
-            return base64.b64decode("UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAo")
+        if len(text) <= MAX_SEGMENT_CHARS:
+            return await self._synthesize(text, voice)
+        # Longer than one provider request allows - synthesize by sentence
+        segments = [chunk async for chunk in self.stream_speech(text, voice)]
+        if self.engine.audio_format == "wav":
+            return join_wav(segments)
+        # MP3 frames play back to back
+        return b"".join(segments)
+    
+    def voice_for(self, language: str) -> str:
+        """Voice to use for a conversation language"""
+        return self.engine.voices.get(language, self.engine.voices["en"])
+    
+    async def opener(self, language: str, voice: Optional[str] = None) -> bytes:
+        """Audio of the canned opener for a language"""
+        voice = voice or self.voice_for(language)
+        key = (language if language in OPENERS else "en", voice)
+        audio = self.openers.get(key)
+        if audio is None:
+            audio = self.openers[key] = await self._synthesize(OPENERS[key[0]], voice)
+        return audio
+    
+    async def warm_openers(self):
+        """Synthesize every language's opener ahead of the first request"""
+        for language in OPENERS:
+            try:
+                await self.opener(language)
+            except Exception as e:
+                logger.warning(f"Opener warm-up failed for {language}: {str(e)}")
+    
+    async def stream_speech(self, text: str, voice: str = "nova", concurrency: int = None) -> AsyncIterator[bytes]:
+        """Synthesize text sentence by sentence, yielding audio chunks in order"""
+        # First sentence alone so playback can start early; the rest in larger chunks
+        segments = segment_text(text)
+        segments = segments[:1] + group_segments(segments[1:], self.segment_chars)
+        limit = asyncio.Semaphore(concurrency or self.segment_concurrency)
+        
+        async def synthesize(segment: str) -> bytes:
+            async with limit:
+                return await self._synthesize(segment, voice)
+        
+        tasks = [asyncio.create_task(synthesize(segment)) for segment in segments]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def stream_audio(self, text: str, voice: str = "nova") -> AsyncIterator[bytes]:
+        """
+        stream_speech() as one continuous audio stream: WAV segments after the
+        first lose their headers, and the first header leaves its sizes open
+        """
+        segments = self.stream_speech(text, voice)
+        try:
+            first = True
+            async for segment in segments:
+                if self.engine.audio_format != "wav":
+                    yield segment
+                elif first:
+                    yield join_wav([segment], streaming=True)
+                else:
+                    yield wav_frames(segment)
+                first = False
+        finally:
+            await segments.aclose()
+
+    async def _synthesize(self, text: str, voice: str) -> bytes:
+        """Single TTS request for at most MAX_SEGMENT_CHARS of text"""
+        if not self.engine.cacheable:
+            return await self.engine.synthesize(text, voice)
+        
+        key = cache_key(text, voice, self.engine.model, self.engine.audio_format)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         
-        # REAL OpenAI TTS
+        # Concurrent requests for the same audio share one engine call, in this worker and across workers
+        return await self.flights.do(key, lambda: self._fetch(key, text, voice))
+    
+    async def _fetch(self, key: str, text: str, voice: str) -> bytes:
         try:
-            response = await self.client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text[:4000]  # Max length
-            )
-            logger.info(f"TTS generated {len(response.content)} bytes")
-            return response.content
+            audio = await self.shared.get_or_compute("tts", key, lambda: self._generate(text, voice))
+            self.cache.put(key, audio)
+            return audio
+        except ProviderError:
+            raise
         except Exception as e:
             logger.error(f"TTS failed: {str(e)}")
             raise Exception(f"TTS failed: {str(e)}")
+    
+    async def _generate(self, text: str, voice: str) -> bytes:
+        audio = await self.engine.synthesize(text, voice)
+        logger.info(f"TTS generated {len(audio)} bytes")
+        metrics.add_bytes("tts", len(audio))
+        return audio
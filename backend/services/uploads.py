@@ -0,0 +1,174 @@
+"""Uploaded audio, kept in memory when small and read in place from the parser's spool file when not"""
+import io
+import os
+import asyncio
+from io import BytesIO
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+
+# Whisper rejects files over 25 MB, so there is no point accepting more
+MAX_UPLOAD_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "25")) * 1024 * 1024)
+SPOOL_BYTES = int(float(os.getenv("UPLOAD_SPOOL_KB", "1024")) * 1024)
+
+
+def detect_container(data: bytes) -> Optional[str]:
+    """Identify the container from magic bytes; returns a Whisper-accepted extension"""
+    if data[:4] == b"\x1aE\xdf\xa3":
+        return "webm"
+    if data[:4] == b"OggS":
+        return "ogg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "wav"
+    if data[:4] == b"fLaC":
+        return "flac"
+    if data[4:8] == b"ftyp":
+        return "m4a"
+    if data[:3] == b"ID3" or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+class UploadTooLarge(Exception):
+    """The upload is over the configured maximum"""
+    status_code = 413
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds {limit // (1024 * 1024)} MB")
+
+
+class _FileReader(io.RawIOBase):
+    """
+    Reads a descriptor of its own (closed with the reader) at its own position
+    (pread), so neither other readers nor closing the AudioBuffer disturb it
+    """
+
+    def __init__(self, fd: int, size: int):
+        self.fd = fd
+        self.size = size
+        self.position = 0
+
+    def close(self):
+        if not self.closed:
+            os.close(self.fd)
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = os.pread(self.fd, min(len(buffer), max(self.size - self.position, 0)), self.position)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+class AudioBuffer:
+    """
+    Upload bytes, held in memory, in a file on disk, or in an open (possibly
+    unnamed) file given as a descriptor the buffer owns. open() returns an
+    independent reader without copying the data, for decoders and for the
+    provider client (retries get a fresh one).
+    """
+
+    def __init__(self, data: Optional[bytes] = None, path: Optional[str] = None, size: int = 0, fd: Optional[int] = None):
+        self.data = data
+        self.path = path
+        self.fd = fd
+        self.size = len(data) if data is not None else size
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "AudioBuffer":
+        return cls(data=bytes(data))
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None or self.fd is not None
+
+    def head(self, count: int = 16) -> bytes:
+        """The first bytes, for container detection"""
+        if self.data is not None:
+            return self.data[:count]
+        with self.open() as f:
+            return f.read(count)
+
+    def open(self) -> BinaryIO:
+        # BytesIO over immutable bytes shares the buffer instead of copying it
+        if self.data is not None:
+            return BytesIO(self.data)
+        if self.fd is not None:
+            return io.BufferedReader(_FileReader(os.dup(self.fd), self.size))
+        return open(self.path, "rb")
+
+    def read(self) -> bytes:
+        """All of it, as bytes (a copy unless it is already in memory)"""
+        if self.data is not None:
+            return self.data
+        with self.open() as f:
+            return f.read()
+
+    def __getstate__(self) -> dict:
+        # A descriptor means nothing in another process: the bytes travel instead
+        if self.fd is None:
+            return self.__dict__
+        return {**self.__dict__, "data": self.read(), "fd": None}
+
+    def close(self):
+        """Release the descriptor or remove the file on disk, if any"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def wrap_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES, spool_bytes: int = SPOOL_BYTES) -> AudioBuffer:
+    """
+    The upload as an AudioBuffer, without writing it out a second time: the
+    multipart parser has already spooled it (in memory up to 1 MB, then to a
+    temp file). Up to spool_bytes it is read into memory; past that it is read
+    in place through a duplicate of the spool file's descriptor, which keeps
+    the file alive after the UploadFile is closed (once the endpoint returns,
+    before a streamed body is sent) until the buffer is closed.
+    """
+    spooled = file.file
+    size = file.size
+    if size is None:
+        size = await asyncio.to_thread(spooled.seek, 0, os.SEEK_END)
+    if size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+    if size <= spool_bytes:
+        await file.seek(0)
+        return AudioBuffer(data=await file.read())
+
+    def duplicate() -> int:
+        # fileno() first moves a part the parser still held in memory to disk
+        fd = spooled.fileno()
+        spooled.flush()
+        return os.dup(fd)
+
+    return AudioBuffer(fd=await asyncio.to_thread(duplicate), size=size)
@@ -1,12 +1,22 @@
 import React, { useState, useRef, useEffect } from 'react';
+import axios from 'axios';
 import { Mic, MicOff, Volume2, Loader2 } from 'lucide-react';
 import { Button } from './ui/button';
 import { Card } from './ui/card';
-import axios from 'axios';
 import { toast } from 'sonner';
 
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
-const API = `${BACKEND_URL}/api`;
+// Resolved on use so a build without REACT_APP_BACKEND_URL talks to the origin that served it
+const backendUrl = () => process.env.REACT_APP_BACKEND_URL || window.location.origin;
+const apiUrl = () => `${backendUrl()}/api/voice`;
+const streamUrl = () => `${backendUrl().replace(/^http/, 'ws')}/api/voice/stream`;
+
+// crypto.randomUUID needs a secure context; plain http on a LAN address falls back
+const newSessionId = () =>
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+const releaseTracks = (stream) => stream.getTracks().forEach(track => track.stop());
 
 const VoiceAssistant = () => {
   const [isRecording, setIsRecording] = useState(false);
@@ -15,93 +25,190 @@ const VoiceAssistant = () => {
   const [language, setLanguage] = useState('auto');
   
   const mediaRecorderRef = useRef(null);
-  const audioChunksRef = useRef([]);
+  const socketRef = useRef(null);
+  const requestRef = useRef(null);
+  // Set once the stream endpoint cannot be reached; later turns go straight to HTTP
+  const httpOnlyRef = useRef(false);
   const audioRef = useRef(null);
+  const audioQueueRef = useRef([]);
+  // One conversation per tab: its history and context are stored under this id
+  const sessionIdRef = useRef(null);
+  if (sessionIdRef.current === null) sessionIdRef.current = newSessionId();
+
+  useEffect(() => {
+    return () => socketRef.current && socketRef.current.close();
+  }, []);
+
+  const dropQueuedAudio = () => {
+    audioQueueRef.current.forEach(src => URL.revokeObjectURL(src));
+    audioQueueRef.current = [];
+  };
+
+  // Play streamed audio chunks back to back, in arrival order
+  const playNextChunk = () => {
+    const audio = audioRef.current;
+    if (!audio || !audio.paused || audioQueueRef.current.length === 0) return;
+    const src = audioQueueRef.current.shift();
+    audio.src = src;
+    audio.onended = () => {
+      URL.revokeObjectURL(src);
+      playNextChunk();
+    };
+    audio.play().catch((error) => {
+      // Autoplay policy or an undecodable chunk: nothing after it would play either
+      console.error('Audio playback failed:', error);
+      URL.revokeObjectURL(src);
+      dropQueuedAudio();
+      setIsProcessing(false);
+      if (error.name !== 'AbortError') toast.error('Failed to play response');
+    });
+  };
+
+  const handleStreamMessage = (event) => {
+    if (event.data instanceof Blob) {
+      audioQueueRef.current.push(URL.createObjectURL(event.data));
+      playNextChunk();
+      return;
+    }
+
+    const message = JSON.parse(event.data);
+    if (message.type === 'transcript') {
+      setConversation(prev => [...prev, { role: 'user', content: message.text }, { role: 'assistant', content: '' }]);
+    } else if (message.type === 'token') {
+      setConversation(prev => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, content: last.content + message.text }];
+      });
+    } else if (message.type === 'done' || message.type === 'cancelled') {
+      // cancelled: the turn was superseded or cancelled from elsewhere, so nothing more is coming
+      setIsProcessing(false);
+      socketRef.current.close();
+    } else if (message.type === 'error') {
+      console.error('Voice processing error:', message.detail);
+      toast.error('Failed to process voice');
+      setIsProcessing(false);
+      socketRef.current.close();
+    }
+  };
+
+  // Fallback when the stream endpoint is unreachable: one request, answer as a single audio file
+  const askOverHttp = async (audioBlob) => {
+    const controller = new AbortController();
+    requestRef.current = controller;
+    setIsProcessing(true);
+    try {
+      const formData = new FormData();
+      formData.append('file', audioBlob, 'audio.webm');
+      const response = await axios.post(`${apiUrl()}/ask`, formData, {
+        params: { language, session_id: sessionIdRef.current },
+        headers: { Accept: 'audio/mpeg' },
+        responseType: 'blob',
+        signal: controller.signal,
+      });
+      const header = (name) => decodeURIComponent(response.headers[name] || '');
+      setConversation(prev => [
+        ...prev,
+        { role: 'user', content: header('x-transcript') },
+        { role: 'assistant', content: header('x-response-text') },
+      ]);
+      audioQueueRef.current.push(URL.createObjectURL(response.data));
+      playNextChunk();
+    } catch (error) {
+      if (axios.isCancel(error)) return;
+      console.error('Error processing voice:', error);
+      toast.error('Failed to process voice');
+    } finally {
+      if (requestRef.current === controller) {
+        requestRef.current = null;
+        setIsProcessing(false);
+      }
+    }
+  };
+
+  // Barge-in: drop the answer still playing or on its way; closing its socket stops it server-side
+  const interrupt = () => {
+    if (socketRef.current) socketRef.current.close();
+    if (requestRef.current) requestRef.current.abort();
+    requestRef.current = null;
+    dropQueuedAudio();
+    if (audioRef.current) audioRef.current.pause();
+    setIsProcessing(false);
+  };
 
   const startRecording = async () => {
+    interrupt();
+    let stream;
+    try {
+      stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    } catch (error) {
+      console.error('Error accessing microphone:', error);
+      toast.error('Failed to access microphone');
+      return;
+    }
+
     try {
-      const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
       const mediaRecorder = new MediaRecorder(stream);
-      
+      // Everything recorded so far: replayed to a socket that opens late, or posted over HTTP
+      const chunks = [];
+
+      // Stream audio to the backend while the user is still speaking
+      const socket = httpOnlyRef.current ? null : new WebSocket(streamUrl());
+      if (socket) {
+        let opened = false;
+        socket.onmessage = (event) => socketRef.current === socket && handleStreamMessage(event);
+        socket.onerror = () => {
+          if (!opened) {
+            httpOnlyRef.current = true;
+            return;
+          }
+          toast.error('Connection to voice service failed');
+          setIsProcessing(false);
+        };
+        socket.onopen = () => {
+          opened = true;
+          socket.send(JSON.stringify({ type: 'start', language, opener: true, session_id: sessionIdRef.current }));
+          chunks.forEach(chunk => socket.send(chunk));
+        };
+      }
+      socketRef.current = socket;
       mediaRecorderRef.current = mediaRecorder;
-      audioChunksRef.current = [];
       
       mediaRecorder.ondataavailable = (event) => {
-        if (event.data.size > 0) {
-          audioChunksRef.current.push(event.data);
+        if (event.data.size === 0) return;
+        chunks.push(event.data);
+        if (socket && socket.readyState === WebSocket.OPEN) {
+          socket.send(event.data);
         }
       };
       
-      mediaRecorder.onstop = async () => {
-        const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
-        await processVoice(audioBlob);
-        stream.getTracks().forEach(track => track.stop());
+      mediaRecorder.onstop = () => {
+        releaseTracks(stream);
+        if (socket && socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ type: 'stop' }));
+          setIsProcessing(true);
+          return;
+        }
+        if (socket) socket.close();
+        if (chunks.length > 0) askOverHttp(new Blob(chunks, { type: mediaRecorder.mimeType || 'audio/webm' }));
       };
       
-      mediaRecorder.start();
+      mediaRecorder.start(250);
       setIsRecording(true);
       
     } catch (error) {
-      console.error('Error accessing microphone:', error);
-      toast.error('Failed to access microphone');
+      console.error('Error starting recorder:', error);
+      toast.error('Failed to start recording');
+      if (socketRef.current) socketRef.current.close();
+      releaseTracks(stream);
     }
   };
 
   const stopRecording = () => {
-    if (mediaRecorderRef.current && isRecording) {
-      mediaRecorderRef.current.stop();
-      setIsRecording(false);
-    }
-  };
-
-  const processVoice = async (audioBlob) => {
-    setIsProcessing(true);
-    
-    try {
-      // Step 1: Transcribe
-      const formData = new FormData();
-      formData.append('file', audioBlob, 'audio.webm');
-      
-      const transcribeRes = await axios.post(`${API}/voice/transcribe`, formData, {
-        headers: { 'Content-Type': 'multipart/form-data' }
-      });
-      
-      const userText = transcribeRes.data.text;
-      
-      // Add user message to conversation
-      setConversation(prev => [...prev, { role: 'user', content: userText }]);
-      
-      // Step 2: Process with AI
-      const processRes = await axios.post(`${API}/voice/process`, {
-        text: userText,
-        session_id: 'demo-session',
-        language: language === 'auto' ? 'en' : language
-      });
-      
-      const assistantText = processRes.data.response;
-      
-      // Add assistant message to conversation
-      setConversation(prev => [...prev, { role: 'assistant', content: assistantText }]);
-      
-      // Step 3: Text-to-Speech
-      const ttsRes = await axios.post(`${API}/voice/speak`, {
-        text: assistantText,
-        voice: 'nova'
-      });
-      
-      // Play audio
-      const audioSrc = `data:audio/mp3;base64,${ttsRes.data.audio}`;
-      if (audioRef.current) {
-        audioRef.current.src = audioSrc;
-        audioRef.current.play();
-      }
-      
-    } catch (error) {
-      console.error('Voice processing error:', error);
-      toast.error('Failed to process voice');
-    } finally {
-      setIsProcessing(false);
+    const mediaRecorder = mediaRecorderRef.current;
+    if (mediaRecorder && mediaRecorder.state !== 'inactive') {
+      mediaRecorder.stop();
     }
+    setIsRecording(false);
   };
 
   return (
@@ -171,7 +278,7 @@ const VoiceAssistant = () => {
             data-testid="processing-btn"
             className="mic-button processing" 
             size="lg" 
-            disabled
+            onClick={startRecording}
           >
             <Loader2 className="animate-spin" size={32} />
           </Button>
@@ -0,0 +1,31 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.container import service
+
+
+class Services:
+    def __init__(self):
+        self._building = threading.RLock()
+        self.builds = {"slow": 0, "dependent": 0}
+
+    @service
+    def slow(self):
+        self.builds["slow"] += 1
+        time.sleep(0.05)
+        return object()
+
+    @service
+    def dependent(self):
+        self.builds["dependent"] += 1
+        return (self.slow,)
+
+
+def test_concurrent_first_access_builds_each_service_once():
+    services = Services()
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda name: getattr(services, name), ["slow", "dependent", "slow", "dependent"]))
+
+    assert services.builds == {"slow": 1, "dependent": 1}
+    assert results[0] is results[2] is results[1][0]
@@ -0,0 +1,45 @@
+import re
+
+import pytest
+
+from services.metrics import Metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """(name, labels, value) per sample line; fails on anything Prometheus would reject"""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, body, value = match.groups()
+        pairs = LABEL.findall(body or "")
+        assert ",".join(f'{k}="{v}"' for k, v in pairs) == (body or ""), line
+        names = [k for k, _ in pairs]
+        assert len(names) == len(set(names)), f"duplicate label in {line}"
+        samples.append((name, dict(pairs), float(value)))
+    return samples
+
+
+def test_prometheus_output_parses_with_extra_labels():
+    metrics = Metrics()
+    metrics.observe("provider_queue_wait", 0.02, provider_stage="llm", priority="interactive")
+    metrics.observe("stt", 0.5)
+    metrics.inc("provider_hedges_total", stage="llm")
+    metrics.register_collector(lambda: {"provider_queued_llm_batch": 3})
+
+    samples = parse(metrics.render_prometheus())
+
+    count = [s for s in samples if s[0] == "smartspeak_stage_seconds_count" and s[1]["stage"] == "provider_queue_wait"]
+    assert count == [("smartspeak_stage_seconds_count", {"stage": "provider_queue_wait", "priority": "interactive", "provider_stage": "llm"}, 1.0)]
+    assert ("smartspeak_provider_hedges_total", {"stage": "llm"}, 1.0) in samples
+    assert ("smartspeak_provider_queued_llm_batch", {}, 3.0) in samples
+
+
+def test_histogram_rejects_a_second_stage_label():
+    with pytest.raises(ValueError):
+        Metrics().observe("provider_queue_wait", 0.02, stage="llm")
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from services.resilience import AdaptiveLimit, CircuitBreaker, CircuitOpen, HedgePolicy, Overloaded
+from services.scheduler import work_class
+
+
+def test_breaker_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker("test", threshold=3, cooldown=30)
+    for _ in range(2):
+        breaker.check()
+        breaker.record(failure=True)
+    breaker.record(success=True)  # a success in between starts the count again
+    for _ in range(2):
+        breaker.check()
+        breaker.record(failure=True)
+    assert not breaker.is_open
+
+    breaker.check()
+    breaker.record(failure=True)
+    assert breaker.is_open
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+
+def test_breaker_half_opens_for_one_probe_then_closes():
+    breaker = CircuitBreaker("test", threshold=1, cooldown=30)
+    breaker.record(failure=True)
+    breaker.opened_at -= 30  # the cooldown has passed
+
+    breaker.check()  # the probe goes through
+    with pytest.raises(CircuitOpen):
+        breaker.check()  # and nothing else while it runs
+    breaker.record(success=True)
+
+    assert not breaker.is_open
+    breaker.check()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker("test", threshold=1, cooldown=30)
+    breaker.record(failure=True)
+    breaker.opened_at -= 30
+
+    breaker.check()
+    breaker.record(failure=True)
+
+    assert breaker.is_open
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+
+def test_limit_halves_on_overload_and_recovers_with_successes():
+    async def main():
+        limit = AdaptiveLimit(initial=4, maximum=4, max_queue=10)
+        for _ in range(4):
+            await limit.acquire()
+        waiter = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        limit.release(overload=True)
+        assert limit.limit == 2
+        limit.release(success=True)
+        await asyncio.sleep(0)
+        assert not waiter.done()  # 2 in flight is the new limit
+        limit.release(success=True)
+        await asyncio.wait_for(waiter, 1)
+        assert limit.inflight == 2
+
+        limit.release(success=True)
+        limit.release(success=True)
+        rounds = 0
+        while limit.limit < limit.maximum:
+            await limit.acquire()
+            limit.release(success=True)
+            rounds += 1
+        return limit, rounds
+
+    limit, rounds = asyncio.run(main())
+    assert limit.limit == 4
+    assert limit.inflight == 0
+    assert rounds < 10  # additive increase: about +1 per limit's worth of successes
+
+
+def test_limit_refuses_past_max_queue_per_class():
+    async def main():
+        limit = AdaptiveLimit(initial=1, maximum=1, max_queue=1)
+        await limit.acquire()
+
+        async def call(priority):
+            with work_class(priority, priority):
+                await limit.acquire()
+
+        batch = asyncio.create_task(call("batch"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await call("batch")
+        interactive = asyncio.create_task(call("interactive"))  # a batch backlog does not refuse it
+        await asyncio.sleep(0)
+        assert not interactive.done()
+
+        limit.release(success=True)
+        await asyncio.wait_for(interactive, 1)
+        assert not batch.done()
+        batch.cancel()
+
+    asyncio.run(main())
+
+
+def test_hedge_waits_for_enough_samples_then_uses_the_percentile():
+    policy = HedgePolicy(percentile=0.9, budget=0.1, window=100, min_samples=20)
+    for n in range(19):
+        policy.record(n / 100)
+    assert policy.delay() is None
+
+    for n in range(19, 100):
+        policy.record(n / 100)
+    assert policy.delay() == 0.9
+
+    for _ in range(100):
+        policy.record(0.01)  # the window keeps only the latest latencies
+    assert policy.delay() == 0.01
+
+
+def test_hedges_stay_within_budget():
+    policy = HedgePolicy(percentile=0.9, budget=0.1, burst=5.0)
+    hedges = 0
+    for _ in range(200):
+        policy.earn()
+        hedges += policy.spend()
+    assert hedges == 20
+
+
+def test_hedge_tokens_bank_up_to_burst():
+    policy = HedgePolicy(percentile=0.9, budget=0.5, burst=3.0)
+    for _ in range(100):
+        policy.earn()
+    assert policy.tokens == 3.0
+
+    assert [policy.spend() for _ in range(4)] == [True, True, True, False]
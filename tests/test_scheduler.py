@@ -0,0 +1,94 @@
+import asyncio
+
+from services.resilience import AdaptiveLimit
+from services.scheduler import FairQueue, Work, running_work, work_class
+
+
+def drain(queue):
+    order = []
+    while queue:
+        order.append(queue.popleft())
+    return order
+
+
+def test_heavy_flow_takes_turns_with_a_light_one():
+    queue = FairQueue(weights={})
+    for n in range(6):
+        queue.push(f"heavy-{n}", "interactive", "heavy")
+    queue.push("light-0", "interactive", "light")
+    queue.push("light-1", "interactive", "light")
+
+    order = drain(queue)
+
+    # The light flow is served within its first turns, not behind the heavy burst
+    assert order.index("light-0") <= 1
+    assert order.index("light-1") <= 3
+    assert [item for item in order if item.startswith("heavy")] == [f"heavy-{n}" for n in range(6)]
+
+
+def test_weights_give_proportional_turns():
+    queue = FairQueue(weights={"kiosk": 2})
+    for n in range(4):
+        queue.push(f"kiosk-{n}", "interactive", "kiosk")
+        queue.push(f"other-{n}", "interactive", "other")
+
+    first = drain(queue)[:6]
+
+    assert sum(item.startswith("kiosk") for item in first) == 4
+
+
+def test_interactive_goes_before_batch():
+    queue = FairQueue(weights={})
+    queue.push("batch-0", "batch", "nightly")
+    queue.push("batch-1", "batch", "nightly")
+    queue.push("interactive-0", "interactive", "user")
+    queue.push("batch-2", "batch", "other")
+    queue.push("interactive-1", "interactive", "user")
+
+    assert drain(queue) == ["interactive-0", "interactive-1", "batch-0", "batch-2", "batch-1"]
+
+
+def test_removed_waiters_are_skipped():
+    queue = FairQueue(weights={})
+    for name in ("a", "b", "c"):
+        queue.push(name, "interactive", name)
+    queue.remove("b")
+
+    assert len(queue) == 2
+    assert drain(queue) == ["a", "c"]
+
+
+def test_promotion_moves_queued_futures_ahead_of_batch():
+    async def main():
+        limit = AdaptiveLimit(initial=1, maximum=1, max_queue=10)
+        await limit.acquire()
+        served = []
+        works = {}
+
+        async def call(name, priority):
+            with work_class(priority, name):
+                works[name] = running_work()
+                await limit.acquire()
+                served.append(name)
+
+        tasks = [asyncio.create_task(call(name, "batch")) for name in ("first", "second", "third")]
+        await asyncio.sleep(0)
+        assert limit.waiters.queued("batch") == 3
+
+        works["third"].promote("interactive")
+        assert limit.waiters.queued("interactive") == 1
+        assert works["third"].priority == "interactive"
+
+        for _ in tasks:
+            limit.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return served
+
+    assert asyncio.run(main()) == ["third", "first", "second"]
+
+
+def test_promotion_never_demotes():
+    work = Work("interactive", "user")
+    work.promote("batch")
+    assert work.priority == "interactive"
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from services.scheduler import work_class
+from services.shared_store import MemoryStore, SQLiteStore
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def workers(request, tmp_path):
+    """Two workers' views of one store: two connections to one SQLite file, or one in-process store"""
+    def make():
+        if request.param == "sqlite":
+            path = str(tmp_path / "shared.db")
+            return SQLiteStore(path), SQLiteStore(path)
+        store = MemoryStore()
+        return store, store
+    return make
+
+
+def run(make, scenario):
+    async def main():
+        first, second = make()
+        try:
+            await scenario(first, second)
+        finally:
+            await first.close()
+            if second is not first:
+                await second.close()
+    asyncio.run(main())
+
+
+def test_lease_expires_for_other_workers(workers):
+    async def scenario(first, second):
+        token = await first.lease("ns", "key", 0.05)
+        assert token is not None
+        assert await second.lease("ns", "key", 0.05) is None
+        await asyncio.sleep(0.1)  # the holder died without releasing
+        assert await second.lease("ns", "key", 60) is not None
+        assert await first.lease("ns", "key", 60) is None
+
+    run(workers, scenario)
+
+
+def test_only_the_holder_releases(workers):
+    async def scenario(first, second):
+        token = await first.lease("ns", "key", 60)
+        await second.release("ns", "key", "interactive:not-the-holder")
+        assert await second.lease("ns", "key", 60) is None
+
+        await first.release("ns", "key", token)
+        assert await second.lease("ns", "key", 60) is not None
+
+    run(workers, scenario)
+
+
+def test_lease_token_names_the_holder_class(workers):
+    async def scenario(first, second):
+        with work_class("batch"):
+            token = await first.lease("ns", "key", 60)
+        assert token.startswith("batch:")
+        assert await second._probe("ns", "key") == (None, token)
+
+    run(workers, scenario)
+
+
+def test_interactive_does_not_wait_on_a_batch_compute(workers):
+    async def scenario(first, second):
+        with work_class("batch"):
+            await first.lease("ns", "key", 60)
+
+        async def compute():
+            return b"interactive"
+
+        with work_class("interactive"):
+            value = await asyncio.wait_for(second.get_or_compute("ns", "key", compute), 1)
+        assert value == b"interactive"
+
+    run(workers, scenario)
+
+
+def test_batch_waits_for_the_holders_value(workers):
+    async def scenario(first, second):
+        token = await first.lease("ns", "key", 60)
+        computed = []
+
+        async def compute():
+            computed.append(1)
+            return b"again"
+
+        with work_class("batch"):
+            waiting = asyncio.create_task(second.get_or_compute("ns", "key", compute))
+        await asyncio.sleep(0.02)
+        assert not waiting.done()
+
+        await first.set("ns", "key", b"shared")
+        await first.release("ns", "key", token)
+        assert await asyncio.wait_for(waiting, 1) == b"shared"
+        assert not computed
+
+    run(workers, scenario)
@@ -0,0 +1,43 @@
+import asyncio
+
+from services.single_flight import SingleFlight
+
+
+def test_callers_share_one_call():
+    async def main():
+        flight, calls = SingleFlight("test"), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("key", fn) for _ in range(3)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(main())
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+    assert stats == {"calls": 1, "coalesced": 2, "inflight": 0}
+
+
+def test_caller_after_last_cancellation_starts_a_fresh_call():
+    async def main():
+        flight, started = SingleFlight("test"), []
+
+        async def fn():
+            started.append(1)
+            await asyncio.sleep(0.05)
+            return len(started)
+
+        first = asyncio.create_task(flight.do("key", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        # No await between the cancellation and the next caller: it must not join the dying call
+        second = asyncio.create_task(flight.do("key", fn))
+        await asyncio.gather(first, return_exceptions=True)
+        return await second, started
+
+    result, started = asyncio.run(main())
+    assert result == 2
+    assert len(started) == 2